@@ -2,12 +2,22 @@
 """Helper utilities only requiring the standard library."""
 from __future__ import annotations
 
+from . import asyncio_utils
 from . import checksum
 from . import loggers
+from . import memory_monitoring
+from . import metrics_exporter
 from . import misc
 from . import parallelism_utils
+from . import performance_tracking
 from . import ports
+from . import process_pool
+from . import profiling
 from . import queue_utils
+from . import supervision
+from . import tracing
+from . import watchdog
+from .asyncio_utils import InfiniteTask
 from .checksum import compute_crc32_and_write_to_file_head
 from .checksum import compute_crc32_bytes_of_large_file
 from .checksum import compute_crc32_hex_of_large_file
@@ -19,8 +29,10 @@ from .constants import UnionOfThreadingAndMultiprocessingQueue
 from .exceptions import BlankAbsoluteResourcePathError
 from .exceptions import Crc32ChecksumValidationFailureError
 from .exceptions import Crc32InFileHeadDoesNotMatchExpectedValueError
+from .exceptions import EventDrivenWakeupNotEnabledError
 from .exceptions import LogFolderDoesNotExistError
 from .exceptions import LogFolderGivenWithoutFilePrefixError
+from .exceptions import MemoryGrowthWarning
 from .exceptions import MultipleMatchingXmlElementsError
 from .exceptions import NoMatchingXmlElementError
 from .exceptions import ParallelFrameworkStillNotStoppedError
@@ -29,8 +41,18 @@ from .exceptions import PortUnavailableError
 from .exceptions import QueueNotEmptyError
 from .exceptions import QueueNotExpectedSizeError
 from .exceptions import QueueStillEmptyError
+from .exceptions import SharedPerformanceCountersNotEnabledError
+from .exceptions import SupervisorRestartLimitExceededError
+from .exceptions import UnrecognizedFixedRateOverrunPolicyError
 from .exceptions import UnrecognizedLoggingFormatError
+from .exceptions import UnrecognizedRestartStrategyError
+from .exceptions import UnrecognizedSchedulingPolicyError
+from .exceptions import UnrecognizedWaitStrategyError
+from .exceptions import UnrecognizedWorkDistributionStrategyError
 from .loggers import configure_logging
+from .memory_monitoring import get_rss_bytes
+from .memory_monitoring import MemoryMonitor
+from .metrics_exporter import MetricsExporter
 from .misc import create_directory_if_not_exists
 from .misc import get_current_file_abs_directory
 from .misc import get_current_file_abs_path
@@ -41,13 +63,25 @@ from .misc import is_system_windows
 from .misc import print_exception
 from .misc import resource_path
 from .multiprocessing_utils import InfiniteProcess
+from .multiprocessing_utils import ProcessLauncher
 from .parallelism_framework import InfiniteLoopingParallelismMixIn
+from .parallelism_framework import SharedControlFlags
 from .parallelism_utils import confirm_parallelism_is_stopped
 from .parallelism_utils import invoke_process_run_and_check_errors
 from .parallelism_utils import put_log_message_into_queue
+from .performance_tracking import get_thread_resource_usage
+from .performance_tracking import get_thread_scheduler_stats
+from .performance_tracking import LogBucketedHistogram
+from .performance_tracking import RunningStatistics
+from .performance_tracking import SharedPerformanceCounters
 from .ports import confirm_port_available
 from .ports import confirm_port_in_use
 from .ports import is_port_in_use
+from .process_pool import InfiniteProcessPool
+from .profiling import StackSampleAggregator
+from .profiling import ThreadStackSampler
+from .profiling import write_folded_stacks_file
+from .queue_utils import bulk_drain_queues
 from .queue_utils import confirm_queue_is_eventually_empty
 from .queue_utils import confirm_queue_is_eventually_of_size
 from .queue_utils import drain_queue
@@ -57,7 +91,12 @@ from .queue_utils import is_queue_eventually_of_size
 from .queue_utils import put_object_into_queue_and_raise_error_if_eventually_still_empty
 from .queue_utils import safe_get
 from .queue_utils import SimpleMultiprocessingQueue
+from .supervision import Supervisor
+from .threading_utils import CooperativeLoopScheduler
 from .threading_utils import InfiniteThread
+from .tracing import merge_trace_events
+from .tracing import write_chrome_trace_file
+from .watchdog import Watchdog
 from .xml import find_exactly_one_xml_element
 
 __all__ = [
@@ -119,4 +158,43 @@ __all__ = [
     "UnionOfThreadingAndMultiprocessingQueue",
     "QUEUE_CHECK_TIMEOUT_SECONDS",
     "NANOSECONDS_PER_CENTIMILLISECOND",
+    "EventDrivenWakeupNotEnabledError",
+    "UnrecognizedFixedRateOverrunPolicyError",
+    "performance_tracking",
+    "LogBucketedHistogram",
+    "RunningStatistics",
+    "SharedPerformanceCounters",
+    "SharedPerformanceCountersNotEnabledError",
+    "bulk_drain_queues",
+    "CooperativeLoopScheduler",
+    "asyncio_utils",
+    "InfiniteTask",
+    "process_pool",
+    "InfiniteProcessPool",
+    "UnrecognizedWorkDistributionStrategyError",
+    "supervision",
+    "Supervisor",
+    "UnrecognizedRestartStrategyError",
+    "SupervisorRestartLimitExceededError",
+    "SharedControlFlags",
+    "UnrecognizedSchedulingPolicyError",
+    "ProcessLauncher",
+    "watchdog",
+    "Watchdog",
+    "UnrecognizedWaitStrategyError",
+    "tracing",
+    "merge_trace_events",
+    "write_chrome_trace_file",
+    "metrics_exporter",
+    "MetricsExporter",
+    "profiling",
+    "StackSampleAggregator",
+    "ThreadStackSampler",
+    "write_folded_stacks_file",
+    "memory_monitoring",
+    "MemoryMonitor",
+    "MemoryGrowthWarning",
+    "get_rss_bytes",
+    "get_thread_resource_usage",
+    "get_thread_scheduler_stats",
 ]
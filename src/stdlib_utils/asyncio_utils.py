@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Utilities for asyncio."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Optional
+from typing import Union
+
+from .misc import print_exception
+from .parallelism_framework import calculate_iteration_time_ns
+from .parallelism_framework import InfiniteLoopingParallelismMixIn
+
+
+class InfiniteTask(InfiniteLoopingParallelismMixIn):
+    """asyncio Task for running infinitely in an event loop.
+
+    Has the same lifecycle as InfiniteThread, but _commands_for_each_run_iteration must be a coroutine function, and the idle period of each iteration is an awaited deadline instead of a blocking sleep. Calling stop/soft_stop/pause/resume (from any thread) ends the idle period immediately, and a paused task awaits resume/stop/soft_stop without waking up every iteration.
+
+    _setup_before_loop and _teardown_after_loop are still regular methods, since hard_stop calls _teardown_after_loop directly.
+
+    Args:
+        fatal_error_reporter: set up as a queue to be thread safe. If any error is unhandled during run, it is fed into this queue so that calling code can know the full details about the problem in this task.
+    """
+
+    def __init__(
+        self,
+        fatal_error_reporter: queue.Queue,  # type: ignore[type-arg] # noqa: F821 # Eli (3/10/20) can't figure out why queue.Queue doesn't have type arguments defined in the stdlib(?)
+        logging_level: int = logging.INFO,
+        minimum_iteration_duration_seconds: Union[float, int] = 0.01,
+        fixed_rate_overrun_policy: Optional[str] = None,
+        use_shared_performance_counters: bool = False,
+        use_adaptive_iteration_duration: bool = False,
+        max_input_items_per_iteration: int = 100,
+        max_input_item_handling_seconds_per_iteration: Optional[float] = None,
+        use_tracing: bool = False,
+        use_cpu_time_tracking: bool = False,
+    ) -> None:
+        super().__init__(
+            fatal_error_reporter,
+            logging_level,
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+            fixed_rate_overrun_policy=fixed_rate_overrun_policy,
+            use_shared_performance_counters=use_shared_performance_counters,
+            use_adaptive_iteration_duration=use_adaptive_iteration_duration,
+            max_input_items_per_iteration=max_input_items_per_iteration,
+            max_input_item_handling_seconds_per_iteration=max_input_item_handling_seconds_per_iteration,
+            use_tracing=use_tracing,
+            use_cpu_time_tracking=use_cpu_time_tracking,
+        )
+        self._task: Optional[asyncio.Task[None]] = None
+        self._event_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._idle_wakeup_event: Optional[asyncio.Event] = None
+
+    def start(self) -> asyncio.Task[None]:
+        """Schedule the task to run in the currently running event loop."""
+        self._task = asyncio.ensure_future(self.run())
+        return self._task
+
+    def is_alive(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def join(self) -> None:
+        """Wait for the task to exit."""
+        if self._task is not None:
+            await self._task
+
+    async def run(  # type: ignore[override] # the task runs as a coroutine in an event loop, so this intentionally replaces the blocking version
+        self,
+        num_iterations: Optional[int] = None,
+        perform_setup_before_loop: bool = True,
+        perform_teardown_after_loop: bool = True,
+    ) -> None:
+        """Run the task.
+
+        Args:
+            num_iterations: typically used for unit testing to just execute one or a few cycles. if left as None will loop infinitely
+            perform_setup_before_loop: this can be disabled when needed during unit testing
+            perform_teardown_after_loop: this can be disabled when needed during unit testing
+        """
+        idle_wakeup_event = asyncio.Event()
+        self._idle_wakeup_event = idle_wakeup_event
+        self._event_loop = asyncio.get_running_loop()
+        if num_iterations is None:
+            num_iterations = -1
+        completed_iterations = 0
+        if not self._start_running(perform_setup_before_loop=perform_setup_before_loop):
+            return
+        while True:
+            start_timepoint_of_iteration = time.perf_counter_ns()
+            self._begin_iteration(start_timepoint_of_iteration)
+            if not await self._run_one_iteration_async():
+                break
+            completed_iterations += 1
+            if completed_iterations == num_iterations:
+                break
+            await self._sleep_for_idle_time_during_iteration_async(
+                start_timepoint_of_iteration, idle_wakeup_event
+            )
+        if perform_teardown_after_loop:
+            self._finish_running()
+
+    async def _run_one_iteration_async(self) -> bool:
+        """Execute a single iteration of the loop.
+
+        Returns False if the loop has been stopped and should be exited.
+        """
+        self._process_can_be_soft_stopped = True
+        if not self._is_pause_event_set():
+            try:
+                if self._input_item_handlers:
+                    self._handle_items_from_input_queues()
+                await self._commands_for_each_run_iteration()
+            except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
+                print_exception(e, "1d3fbe4c-7b49-45a0-9b67-6a2dbd1e3a3e")
+                self._report_fatal_error(e)
+                self.stop()
+        if self._is_soft_stop_event_set() and self._process_can_be_soft_stopped:
+            self.stop()
+        return not self._is_stop_event_set()
+
+    async def _sleep_for_idle_time_during_iteration_async(
+        self, start_timepoint_of_iteration: int, idle_wakeup_event: asyncio.Event
+    ) -> None:
+        iteration_time_ns = calculate_iteration_time_ns(start_timepoint_of_iteration)
+        if self._is_pause_event_set():
+            self._record_iteration_performance(
+                iteration_time_ns, 0, start_timepoint_of_iteration + iteration_time_ns
+            )
+            start_timepoint_of_pause = time.perf_counter_ns()
+            while self._is_waiting_for_resume():
+                await idle_wakeup_event.wait()
+                idle_wakeup_event.clear()
+            self._finish_waiting_while_paused(start_timepoint_of_pause)
+            return
+        idle_time_ns = self._calculate_idle_time_ns(
+            start_timepoint_of_iteration, iteration_time_ns
+        )
+        end_timepoint_of_iteration = start_timepoint_of_iteration + iteration_time_ns
+        if idle_time_ns > 0:
+            deadline_handle = asyncio.get_running_loop().call_later(
+                idle_time_ns / 10 ** 9, idle_wakeup_event.set
+            )
+            await idle_wakeup_event.wait()
+            deadline_handle.cancel()
+            idle_wakeup_event.clear()
+            idle_time_ns = min(
+                idle_time_ns, time.perf_counter_ns() - end_timepoint_of_iteration
+            )
+        else:
+            idle_time_ns = 0
+        self._record_iteration_performance(
+            iteration_time_ns, idle_time_ns, end_timepoint_of_iteration
+        )
+
+    def _send_wakeup(self) -> None:
+        event_loop = self._event_loop
+        wakeup_event = self._idle_wakeup_event
+        if event_loop is None or wakeup_event is None or event_loop.is_closed():
+            return
+        # asyncio.Event is not thread safe, so it must be set from within the event loop
+        event_loop.call_soon_threadsafe(wakeup_event.set)
+
+    async def _commands_for_each_run_iteration(self) -> None:  # type: ignore[override] # iterations of a task are coroutines
+        """Execute additional commands inside the run loop."""
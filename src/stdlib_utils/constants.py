@@ -13,6 +13,9 @@ NANOSECONDS_PER_CENTIMILLISECOND = 10 ** 4
 SECONDS_TO_SLEEP_BETWEEN_CHECKING_QUEUE_SIZE = 0.05
 QUEUE_CHECK_TIMEOUT_SECONDS = 0.2
 
+# later than any perf_counter_ns timepoint, for deadlines that should never be reached
+NEVER_DUE_TIMEPOINT_NS = 2 ** 63 - 1
+
 # Eli (11/12/20): not sure why this is needed even though __annotations__ is being imported everywhere, but unresolvable errors were occurring during importing of the package
 if TYPE_CHECKING:
     UnionOfThreadingAndMultiprocessingQueue = Union[
@@ -55,6 +55,10 @@ class UnrecognizedLoggingFormatError(Exception):
     pass
 
 
+class UnrecognizedFixedRateOverrunPolicyError(Exception):
+    pass
+
+
 class Crc32InFileHeadDoesNotMatchExpectedValueError(Exception):
     pass
 
@@ -98,3 +102,44 @@ class QueueStillEmptyError(Exception):
 
 class ParallelFrameworkStillNotStoppedError(Exception):
     pass
+
+
+class EventDrivenWakeupNotEnabledError(Exception):
+    def __init__(self) -> None:
+        super().__init__(
+            "Queues can only be registered for wakeup when use_event_driven_wakeup was set to True during initialization."
+        )
+
+
+class UnrecognizedWorkDistributionStrategyError(Exception):
+    pass
+
+
+class UnrecognizedSchedulingPolicyError(Exception):
+    pass
+
+
+class UnrecognizedRestartStrategyError(Exception):
+    pass
+
+
+class SupervisorRestartLimitExceededError(Exception):
+    def __init__(self, name_of_crashed_child: str) -> None:
+        super().__init__(
+            f"The maximum number of restarts was exceeded when the child '{name_of_crashed_child}' crashed."
+        )
+
+
+class SharedPerformanceCountersNotEnabledError(Exception):
+    def __init__(self) -> None:
+        super().__init__(
+            "Shared performance counters are only available when use_shared_performance_counters was set to True during initialization."
+        )
+
+
+class UnrecognizedWaitStrategyError(Exception):
+    pass
+
+
+class MemoryGrowthWarning(UserWarning):
+    pass
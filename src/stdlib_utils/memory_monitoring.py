@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Tracking the memory growth of long running loops."""
+from __future__ import annotations
+
+import mmap
+import tracemalloc
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+import warnings
+
+from .exceptions import MemoryGrowthWarning
+
+# allocations made by tracemalloc itself and by importing modules are not leaks of the loop
+TRACEMALLOC_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def get_rss_bytes() -> Optional[int]:
+    """Get the resident set size of the current process.
+
+    Returns None if it cannot be determined on this platform (only Linux provides the current rather than the peak value through the standard library).
+    """
+    try:
+        with open("/proc/self/statm") as statm_file:
+            num_resident_pages = int(statm_file.read().split()[1])
+    except OSError:
+        return None
+    return num_resident_pages * mmap.PAGESIZE
+
+
+class MemoryMonitor:
+    """Measure memory growth between periodic measurements.
+
+    Each measurement reads the RSS of the process and, if tracemalloc is used, diffs a snapshot of the traced allocations against the one taken by the previous measurement to find the allocation sites that grew the most. Taking a snapshot takes time proportional to the number of live allocations, and tracing makes every allocation slower, so measurements should be infrequent and tracemalloc only used while hunting a leak.
+
+    tracemalloc traces every thread of the process, so when monitoring an InfiniteThread the allocation sites are not limited to that thread.
+
+    Args:
+        num_top_allocation_sites: how many of the allocation sites whose size changed the most to include in each measurement.
+        growth_warning_threshold_bytes_per_second: if the RSS or the traced memory grows faster than this between two measurements, a MemoryGrowthWarning is issued.
+        use_tracemalloc: trace allocations to find the allocation sites that grew. If False, only the RSS is measured, which has practically no overhead.
+        num_traceback_frames: how many frames tracemalloc stores for each allocation. Ignored if tracemalloc is already tracing.
+    """
+
+    def __init__(
+        self,
+        num_top_allocation_sites: int = 10,
+        growth_warning_threshold_bytes_per_second: Optional[Union[float, int]] = None,
+        use_tracemalloc: bool = True,
+        num_traceback_frames: int = 1,
+    ) -> None:
+        self._num_top_allocation_sites = num_top_allocation_sites
+        self._growth_warning_threshold_bytes_per_second = (
+            growth_warning_threshold_bytes_per_second
+        )
+        self._use_tracemalloc = use_tracemalloc
+        self._num_traceback_frames = num_traceback_frames
+        self._started_tracemalloc = False
+        self._previous_timepoint_ns: Optional[int] = None
+        self._previous_rss_bytes: Optional[int] = None
+        self._previous_traced_bytes: Optional[int] = None
+        self._previous_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._num_growth_warnings = 0
+        self._latest_measurement: Optional[Dict[str, Any]] = None
+
+    def start(self, timepoint_ns: int) -> None:
+        """Start tracing if needed and take the baseline to measure growth from."""
+        if self._use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start(self._num_traceback_frames)
+            self._started_tracemalloc = True
+        self._previous_timepoint_ns = timepoint_ns
+        self._previous_rss_bytes = get_rss_bytes()
+        self._previous_traced_bytes = None
+        self._previous_snapshot = None
+        if self._use_tracemalloc:
+            self._previous_traced_bytes = tracemalloc.get_traced_memory()[0]
+            self._previous_snapshot = self._take_snapshot()
+
+    def stop(self) -> None:
+        """Stop tracing if it was started by this monitor."""
+        self._previous_snapshot = None
+        self._previous_traced_bytes = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    @staticmethod
+    def _take_snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_SNAPSHOT_FILTERS)
+
+    def take_measurement(self, timepoint_ns: int) -> Dict[str, Any]:
+        """Measure the growth since the previous measurement (or start)."""
+        if self._previous_timepoint_ns is None:
+            raise NotImplementedError(
+                "The memory monitor must be started before measurements can be taken."
+            )
+        elapsed_seconds = max(timepoint_ns - self._previous_timepoint_ns, 1) / 10 ** 9
+        measurement: Dict[str, Any] = {
+            "rss_bytes": get_rss_bytes(),
+            "rss_growth_bytes_per_second": None,
+            "traced_bytes": None,
+            "traced_growth_bytes_per_second": None,
+            "top_allocation_sites": None,
+        }
+        growth_rates: List[float] = list()
+        if (
+            measurement["rss_bytes"] is not None
+            and self._previous_rss_bytes is not None
+        ):
+            measurement["rss_growth_bytes_per_second"] = (
+                measurement["rss_bytes"] - self._previous_rss_bytes
+            ) / elapsed_seconds
+            growth_rates.append(measurement["rss_growth_bytes_per_second"])
+        # another monitor in the same process may have stopped tracing
+        if self._use_tracemalloc and tracemalloc.is_tracing():
+            measurement["traced_bytes"] = tracemalloc.get_traced_memory()[0]
+            snapshot = self._take_snapshot()
+            if self._previous_snapshot is not None:
+                measurement["top_allocation_sites"] = [
+                    {
+                        "site": f"{statistic.traceback[0].filename}:{statistic.traceback[0].lineno}",
+                        "size_bytes": statistic.size,
+                        "size_diff_bytes": statistic.size_diff,
+                        "count_diff": statistic.count_diff,
+                    }
+                    for statistic in snapshot.compare_to(
+                        self._previous_snapshot, "lineno"
+                    )[: self._num_top_allocation_sites]
+                ]
+            if self._previous_traced_bytes is not None:
+                measurement["traced_growth_bytes_per_second"] = (
+                    measurement["traced_bytes"] - self._previous_traced_bytes
+                ) / elapsed_seconds
+                growth_rates.append(measurement["traced_growth_bytes_per_second"])
+            self._previous_snapshot = snapshot
+            self._previous_traced_bytes = measurement["traced_bytes"]
+        self._previous_timepoint_ns = timepoint_ns
+        self._previous_rss_bytes = measurement["rss_bytes"]
+        threshold = self._growth_warning_threshold_bytes_per_second
+        if threshold is not None and growth_rates and max(growth_rates) > threshold:
+            self._num_growth_warnings += 1
+            warnings.warn(
+                f"Memory grew by {round(max(growth_rates))} bytes per second, exceeding the threshold of {threshold}.",
+                MemoryGrowthWarning,
+            )
+        measurement["num_growth_warnings"] = self._num_growth_warnings
+        self._latest_measurement = measurement
+        return measurement
+
+    def get_latest_measurement(self) -> Optional[Dict[str, Any]]:
+        return self._latest_measurement
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""Exposing performance of loops and queues over HTTP in OpenMetrics format."""
+from __future__ import annotations
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+import logging
+import math
+import threading
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .constants import UnionOfThreadingAndMultiprocessingQueue
+from .parallelism_framework import InfiniteLoopingParallelismMixIn
+from .performance_tracking import SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS
+from .performance_tracking import SharedPerformanceCounters
+from .queue_utils import SimpleMultiprocessingQueue
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+# name, type and help of each metric family, in the order they are rendered
+METRIC_FAMILIES = (
+    (
+        "stdlib_utils_loop_iterations",
+        "counter",
+        "Number of iterations the loop has completed.",
+    ),
+    (
+        "stdlib_utils_loop_iteration_time_seconds",
+        "counter",
+        "Total time the loop has spent executing iterations.",
+    ),
+    (
+        "stdlib_utils_loop_idle_time_seconds",
+        "counter",
+        "Total time the loop has spent idle between iterations.",
+    ),
+    (
+        "stdlib_utils_loop_max_iteration_time_seconds",
+        "gauge",
+        "Longest iteration of the loop.",
+    ),
+    (
+        "stdlib_utils_loop_percent_use",
+        "gauge",
+        "Percent of time the loop spent executing iterations since the previous scrape. Repeats the previous value if no iterations completed since then, or is NaN if none have completed yet.",
+    ),
+    (
+        "stdlib_utils_loop_fatal_errors",
+        "counter",
+        "Number of fatal errors the loop has reported.",
+    ),
+    (
+        "stdlib_utils_loop_iteration_duration_seconds",
+        "histogram",
+        "Time taken by each iteration of the loop.",
+    ),
+    (
+        "stdlib_utils_queue_depth",
+        "gauge",
+        "Number of items in the queue.",
+    ),
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value: Union[int, float]) -> str:
+    if isinstance(value, float) and math.isnan(value):
+        return "NaN"  # the only spelling OpenMetrics accepts
+    return str(value)
+
+
+def _get_queue_size(
+    the_queue: Union[
+        UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue
+    ]
+) -> Optional[int]:
+    """Return None if the size cannot be determined on this platform."""
+    try:
+        return the_queue.qsize()  # type: ignore[union-attr] # SimpleMultiprocessingQueue does not define qsize, which is handled below
+    except (
+        NotImplementedError,
+        AttributeError,
+    ):  # multiprocessing.Queue.qsize is not implemented on macOS
+        return None
+
+
+class MetricsExporter:
+    """HTTP server exposing performance of loops and queues for Prometheus.
+
+    Metrics are served at /metrics in OpenMetrics text format by a background thread. Loop counters and iteration time histograms are read from shared performance counters, so scraping never resets or blocks the loops, and works for InfiniteProcess as well as loops running in this process. Every loop must therefore be created with use_shared_performance_counters enabled.
+
+    Args:
+        host: the address to listen on.
+        port: the port to listen on. If 0, a free port is chosen (see get_port).
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0) -> None:
+        self._host = host
+        self._port = port
+        self._loops: Dict[str, InfiniteLoopingParallelismMixIn] = dict()
+        self._queues: Dict[
+            str,
+            Union[UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue],
+        ] = dict()
+        self._previous_snapshots: Dict[str, Dict[str, int]] = dict()
+        self._previous_percent_use: Dict[str, float] = dict()
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._server_thread: Optional[threading.Thread] = None
+
+    def add_loop(self, name: str, loop: InfiniteLoopingParallelismMixIn) -> None:
+        # raises SharedPerformanceCountersNotEnabledError if the loop cannot be read without blocking it
+        self._previous_snapshots[name] = loop.get_shared_performance_counters_snapshot()
+        self._previous_percent_use[name] = math.nan
+        self._loops[name] = loop
+
+    def add_queue(
+        self,
+        name: str,
+        the_queue: Union[
+            UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue
+        ],
+    ) -> None:
+        self._queues[name] = the_queue
+
+    def get_port(self) -> int:
+        """Get the port the server is listening on, once started."""
+        if self._server is None:
+            return self._port
+        return self._server.server_address[1]
+
+    def start(self) -> None:
+        exporter = self
+
+        class _MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(
+                self,
+            ) -> None:  # pylint: disable=invalid-name # required name for BaseHTTPRequestHandler
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = exporter.render_metrics().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", OPENMETRICS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(
+                self, format: str, *args: Any
+            ) -> None:  # pylint: disable=redefined-builtin # matching the signature of the method being overridden
+                logging.debug(format % args)
+
+        self._server = ThreadingHTTPServer(
+            (self._host, self._port), _MetricsRequestHandler
+        )
+        self._server.daemon_threads = True
+        self._server_thread = threading.Thread(
+            target=self._server.serve_forever, name="MetricsExporter", daemon=True
+        )
+        self._server_thread.start()
+
+    def stop(self) -> None:
+        if self._server is None or self._server_thread is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._server_thread.join()
+        self._server = None
+        self._server_thread = None
+
+    def render_metrics(self) -> str:
+        """Render the current metrics in OpenMetrics text format."""
+        samples: Dict[str, List[Tuple[str, str, Union[int, float]]]] = {
+            family_name: list() for family_name, _, _ in METRIC_FAMILIES
+        }
+        with self._lock:  # percent use is measured between scrapes, so concurrent scrapes must not interleave
+            for name, loop in self._loops.items():
+                self._collect_loop_samples(name, loop, samples)
+        for name, the_queue in self._queues.items():
+            queue_size = _get_queue_size(the_queue)
+            if queue_size is not None:
+                samples["stdlib_utils_queue_depth"].append(
+                    ("", f'queue="{_escape_label_value(name)}"', queue_size)
+                )
+        lines: List[str] = list()
+        for family_name, family_type, family_help in METRIC_FAMILIES:
+            lines.append(f"# TYPE {family_name} {family_type}")
+            lines.append(f"# HELP {family_name} {family_help}")
+            for suffix, labels, value in samples[family_name]:
+                lines.append(
+                    f"{family_name}{suffix}{{{labels}}} {_format_value(value)}"
+                )
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def _collect_loop_samples(
+        self,
+        name: str,
+        loop: InfiniteLoopingParallelismMixIn,
+        samples: Dict[str, List[Tuple[str, str, Union[int, float]]]],
+    ) -> None:
+        labels = f'loop="{_escape_label_value(name)}"'
+        (
+            snapshot,
+            bucket_counts,
+        ) = loop.get_shared_performance_counters_snapshot_with_iteration_time_buckets()
+        samples["stdlib_utils_loop_iterations"].append(
+            ("_total", labels, snapshot["num_iterations"])
+        )
+        samples["stdlib_utils_loop_iteration_time_seconds"].append(
+            ("_total", labels, snapshot["total_iteration_time_ns"] / 10 ** 9)
+        )
+        samples["stdlib_utils_loop_idle_time_seconds"].append(
+            ("_total", labels, snapshot["total_idle_time_ns"] / 10 ** 9)
+        )
+        samples["stdlib_utils_loop_max_iteration_time_seconds"].append(
+            ("", labels, snapshot["max_iteration_time_ns"] / 10 ** 9)
+        )
+        percent_use = SharedPerformanceCounters.calculate_percent_use(
+            self._previous_snapshots[name], snapshot
+        )
+        if percent_use is not None:
+            self._previous_snapshots[name] = snapshot
+            self._previous_percent_use[name] = percent_use
+        samples["stdlib_utils_loop_percent_use"].append(
+            ("", labels, self._previous_percent_use[name])
+        )
+        samples["stdlib_utils_loop_fatal_errors"].append(
+            ("_total", labels, snapshot["num_fatal_errors"])
+        )
+        histogram_samples = samples["stdlib_utils_loop_iteration_duration_seconds"]
+        cumulative_count = 0
+        for bound_ns, count in zip(
+            SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS, bucket_counts
+        ):
+            cumulative_count += count
+            histogram_samples.append(
+                ("_bucket", f'{labels},le="{bound_ns / 10 ** 9}"', cumulative_count)
+            )
+        histogram_samples.append(
+            ("_bucket", f'{labels},le="+Inf"', snapshot["num_iterations"])
+        )
+        histogram_samples.append(("_count", labels, snapshot["num_iterations"]))
+        histogram_samples.append(
+            ("_sum", labels, snapshot["total_iteration_time_ns"] / 10 ** 9)
+        )
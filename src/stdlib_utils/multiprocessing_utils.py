@@ -2,18 +2,32 @@
 """Utilities for multiprocessing."""
 from __future__ import annotations
 
+import ctypes
+import faulthandler
 import logging
 import multiprocessing
-from multiprocessing import Event
+from multiprocessing import forkserver
 from multiprocessing import Process
+from multiprocessing.context import BaseContext
+from multiprocessing.process import BaseProcess
 import multiprocessing.queues
+import os
+import signal
+import time
+from types import FrameType
 from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Union
 
 from .misc import get_formatted_stack_trace
 from .parallelism_framework import InfiniteLoopingParallelismMixIn
+from .profiling import StackSampleAggregator
+from .queue_utils import safe_get
 from .queue_utils import SimpleMultiprocessingQueue
 
 
@@ -25,6 +39,7 @@ class InfiniteProcess(InfiniteLoopingParallelismMixIn, Process):
 
     Args:
         fatal_error_reporter: set up as a queue to be thread/process safe. If any error is unhandled during run, it is fed into this queue so that calling thread can know the full details about the problem in this process.
+        context: the multiprocessing context used to start the process and create its events. Defaults to the default context. Any queues or other multiprocessing objects passed to the process must be created using the same context.
     """
 
     # pylint: disable=duplicate-code
@@ -39,19 +54,222 @@ class InfiniteProcess(InfiniteLoopingParallelismMixIn, Process):
         ],
         logging_level: int = logging.INFO,
         minimum_iteration_duration_seconds: Union[float, int] = 0.01,
+        use_event_driven_wakeup: bool = False,
+        fixed_rate_overrun_policy: Optional[str] = None,
+        use_shared_performance_counters: bool = False,
+        use_adaptive_iteration_duration: bool = False,
+        max_input_items_per_iteration: int = 100,
+        max_input_item_handling_seconds_per_iteration: Optional[float] = None,
+        use_shared_control_flags: bool = False,
+        cpu_affinity: Optional[Iterable[int]] = None,
+        nice_level: Optional[int] = None,
+        scheduling_policy: Optional[str] = None,
+        scheduling_priority: int = 1,
+        wait_strategy: str = "sleep",
+        spin_duration_seconds: float = 0.0002,
+        use_tracing: bool = False,
+        use_cpu_time_tracking: bool = False,
+        context: Optional[BaseContext] = None,
     ) -> None:
+        if context is None:
+            context = multiprocessing.get_context()
+        self._context = context
         Process.__init__(self)
         InfiniteLoopingParallelismMixIn.__init__(
             self,
             fatal_error_reporter,
             logging_level,
-            Event(),
-            Event(),
-            Event(),
-            Event(),
-            Event(),
+            context.Event(),
+            context.Event(),
+            context.Event(),
+            context.Event(),
+            context.Event(),
             minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+            use_event_driven_wakeup=use_event_driven_wakeup,
+            fixed_rate_overrun_policy=fixed_rate_overrun_policy,
+            use_shared_performance_counters=use_shared_performance_counters,
+            use_adaptive_iteration_duration=use_adaptive_iteration_duration,
+            max_input_items_per_iteration=max_input_items_per_iteration,
+            max_input_item_handling_seconds_per_iteration=max_input_item_handling_seconds_per_iteration,
+            use_shared_control_flags=use_shared_control_flags,
+            cpu_affinity=cpu_affinity,
+            nice_level=nice_level,
+            scheduling_policy=scheduling_policy,
+            scheduling_priority=scheduling_priority,
+            wait_strategy=wait_strategy,
+            spin_duration_seconds=spin_duration_seconds,
+            use_tracing=use_tracing,
+            use_cpu_time_tracking=use_cpu_time_tracking,
         )
+        self._trace_event_queue: Optional[
+            multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+                List[Dict[str, Any]]
+            ]
+        ] = None
+        self._received_trace_events: List[Dict[str, Any]] = list()
+        if use_tracing:
+            self._trace_event_queue = context.Queue()
+            # like any queue the process puts items into, it must be emptied before the process is joined
+            self.register_queue_to_drain("trace_events", self._trace_event_queue)
+        self._start_timepoint_ns: Optional[int] = None
+        self._stack_dump_file_path: Optional[str] = None
+        self._start_up_complete_timepoint_ns = context.RawValue(ctypes.c_int64, 0)
+        # set by the process that started this one before it signals this one to start or stop profiling. 0 means stop
+        self._profiling_interval_ns: Optional[ctypes.c_int64] = None
+        self._folded_stacks_queue: Optional[
+            multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+                Dict[str, int]
+            ]
+        ] = None
+        self._stack_sample_aggregator: Optional[StackSampleAggregator] = None
+
+    def get_context(self) -> BaseContext:
+        return self._context
+
+    def _get_multiprocessing_context(self) -> BaseContext:
+        return self._context
+
+    def _Popen(  # type: ignore[override] # pylint: disable=invalid-name # Process._Popen is a staticmethod that always uses the default context
+        self, process_obj: BaseProcess
+    ) -> Any:
+        context_process_class = self._context.Process  # type: ignore[attr-defined] # every concrete context defines its own Process class
+        return context_process_class._Popen(  # pylint: disable=protected-access # this is how Process objects of each context are started
+            process_obj
+        )
+
+    def start(self) -> None:
+        self._start_timepoint_ns = time.perf_counter_ns()
+        super().start()
+
+    def _mark_start_up_complete(self) -> None:
+        self._start_up_complete_timepoint_ns.value = time.perf_counter_ns()
+        super()._mark_start_up_complete()
+
+    def enable_stack_dumps_on_signal(self, file_path: str) -> None:
+        """Have faulthandler append the stack of every thread to the file whenever the process receives SIGUSR1.
+
+        This works even if the process is stuck in a blocking call. Must be called before the process is started. Not supported on Windows.
+        """
+        self._stack_dump_file_path = file_path
+
+    def get_stack_dump_file_path(self) -> Optional[str]:
+        return self._stack_dump_file_path
+
+    def enable_profiling_on_signal(self) -> None:
+        """Allow the stack of the running process to be sampled using start_profiling and stop_profiling.
+
+        Once started, a timer in the process sends it SIGALRM every sampling interval and the signal handler counts the stack of the loop, so the process does not need to be restarted to be profiled and the loop does not need to cooperate. Must be called before the process is started. Not supported on Windows.
+        """
+        if not hasattr(signal, "SIGUSR2") or not hasattr(signal, "setitimer"):
+            raise NotImplementedError(
+                "Profiling processes is not supported on this platform."
+            )
+        self._profiling_interval_ns = self._context.RawValue(ctypes.c_int64, 0)
+        self._folded_stacks_queue = self._context.Queue()
+        # like any queue the process puts items into, it must be emptied before the process is joined
+        self.register_queue_to_drain("folded_stacks", self._folded_stacks_queue)
+
+    def is_profiling_on_signal_enabled(self) -> bool:
+        return self._profiling_interval_ns is not None
+
+    def start_profiling(
+        self, sampling_interval_seconds: Union[float, int] = 0.01
+    ) -> None:
+        """Start sampling the stack of the running process.
+
+        Requires enable_profiling_on_signal to have been called before the process was started.
+        """
+        self._signal_profiling_change(int(sampling_interval_seconds * 10 ** 9))
+
+    def stop_profiling(
+        self, timeout_seconds: Union[float, int] = 5
+    ) -> Optional[Dict[str, int]]:
+        """Stop sampling the stack and return the number of samples of each folded stack.
+
+        See profiling.write_folded_stacks_file to write them to a file for a flame graph. Returns None if the process did not send them within the timeout, in which case they will be returned by hard_stop under 'folded_stacks'.
+        """
+        self._signal_profiling_change(0)
+        folded_stacks: Optional[Dict[str, int]] = safe_get(
+            self._folded_stacks_queue,  # type: ignore[arg-type] # safe_get works with multiprocessing queues too
+            timeout_seconds=timeout_seconds,
+        )
+        return folded_stacks
+
+    def _signal_profiling_change(self, sampling_interval_ns: int) -> None:
+        if self._profiling_interval_ns is None:
+            raise NotImplementedError(
+                "enable_profiling_on_signal must be called before the process is started."
+            )
+        if self.pid is None or not self.is_start_up_complete():
+            # until then, the process may not have a handler for the signal yet and would be killed by it
+            raise NotImplementedError(
+                "The process must have completed start up before it can be profiled."
+            )
+        self._profiling_interval_ns.value = sampling_interval_ns
+        os.kill(
+            self.pid,
+            signal.SIGUSR2,  # pylint: disable=no-member # not defined on Windows
+        )
+
+    def _handle_profiling_signal(
+        self, signal_number: int, frame: Optional[FrameType]
+    ) -> None:
+        # pylint: disable=unused-argument,no-member # matching the signature of signal handlers. SIGALRM, setitimer and ITIMER_REAL are not defined on Windows
+        sampling_interval_ns = self._profiling_interval_ns.value  # type: ignore[union-attr] # this handler is only registered when profiling is enabled
+        if sampling_interval_ns > 0:
+            if self._stack_sample_aggregator is None:
+                self._stack_sample_aggregator = StackSampleAggregator()
+            signal.signal(signal.SIGALRM, self._sample_stack)
+            sampling_interval_seconds = sampling_interval_ns / 10 ** 9
+            signal.setitimer(
+                signal.ITIMER_REAL, sampling_interval_seconds, sampling_interval_seconds
+            )
+            return
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        folded_stacks: Dict[str, int] = dict()
+        if self._stack_sample_aggregator is not None:
+            folded_stacks = self._stack_sample_aggregator.get_folded_stacks()
+            self._stack_sample_aggregator = None
+        self._folded_stacks_queue.put_nowait(folded_stacks)  # type: ignore[union-attr] # this handler is only registered when profiling is enabled
+
+    def _sample_stack(self, signal_number: int, frame: Optional[FrameType]) -> None:
+        # pylint: disable=unused-argument # matching the signature of signal handlers
+        aggregator = self._stack_sample_aggregator
+        if aggregator is not None:
+            aggregator.add_sample(frame)
+
+    def get_trace_events(self) -> List[Dict[str, Any]]:
+        """Get the events in the trace of the loop in Chrome trace event format.
+
+        The events are recorded in the process running the loop, and sent to the process that started it once the loop finishes. Until then, an empty list is returned. Since the events are sent using a queue, they must be received (using this method, or hard_stop which returns them under 'trace_events') before the process is joined.
+        """
+        trace_event_queue = self._trace_event_queue
+        if trace_event_queue is None or multiprocessing.current_process() is self:
+            return super().get_trace_events()
+        if not self._received_trace_events and self.is_teardown_complete():
+            # the events are sent right after teardown completes
+            trace_events = safe_get(
+                trace_event_queue  # type: ignore[arg-type] # safe_get works with multiprocessing queues too
+            )
+            if trace_events is not None:
+                self._received_trace_events = trace_events
+        return self._received_trace_events
+
+    def _report_trace_events(self) -> None:
+        self._trace_event_queue.put_nowait(  # type: ignore[union-attr] # this is only called when tracing is enabled, which creates the queue
+            super().get_trace_events()
+        )
+
+    def get_start_up_latency_ns(self) -> Optional[int]:
+        """Get the time from calling start until start up completed.
+
+        perf_counter_ns is a system-wide monotonic clock, so the timepoints recorded in each process can be compared.
+
+        Returns None if the process has not been started or start up is not complete yet.
+        """
+        if self._start_timepoint_ns is None or not self.is_start_up_complete():
+            return None
+        return self._start_up_complete_timepoint_ns.value - self._start_timepoint_ns
 
     def _report_fatal_error(self, the_err: Exception) -> None:
         formatted_stack_trace = get_formatted_stack_trace(the_err)
@@ -62,6 +280,7 @@ class InfiniteProcess(InfiniteLoopingParallelismMixIn, Process):
             raise NotImplementedError(
                 "The error reporter for InfiniteProcess must by a SimpleMultiprocessingQueue or multiprocessing.Queue"
             )
+        self._count_fatal_error()
         reporter.put_nowait((the_err, formatted_stack_trace))
 
     # pylint: disable=duplicate-code # pylint is freaking out and requiring the method to be redefined
@@ -75,6 +294,21 @@ class InfiniteProcess(InfiniteLoopingParallelismMixIn, Process):
     ) -> None:
         # For some reason pylint freaks out if this method is only defined in the MixIn https://github.com/PyCQA/pylint/issues/1233
         # pylint: disable=duplicate-code # pylint is freaking out and requiring the method to be redefined
+        if self._stack_dump_file_path is not None and hasattr(signal, "SIGUSR1"):
+            # the file must stay open for as long as faulthandler may write to it
+            stack_dump_file = open(  # pylint: disable=consider-using-with
+                self._stack_dump_file_path, "a"
+            )
+            faulthandler.register(
+                signal.SIGUSR1,  # pylint: disable=no-member # not defined on Windows
+                file=stack_dump_file,
+                all_threads=True,
+            )
+        if self._profiling_interval_ns is not None:
+            signal.signal(
+                signal.SIGUSR2,  # pylint: disable=no-member # not defined on Windows
+                self._handle_profiling_signal,
+            )
         super().run(
             num_iterations=num_iterations,
             perform_setup_before_loop=perform_setup_before_loop,  # pylint: disable=duplicate-code
@@ -86,3 +320,41 @@ class InfiniteProcess(InfiniteLoopingParallelismMixIn, Process):
         err, formatted_traceback = error_info
         logging.exception(formatted_traceback)
         raise err
+
+
+class ProcessLauncher:
+    """Start InfiniteProcesses from a pre-warmed server process.
+
+    With the default 'forkserver' start method, a server process imports the preload modules once and every process is forked from it, so starting a process takes milliseconds instead of re-importing the application like the 'spawn' start method does. Only one forkserver runs per interpreter, so the preload modules must be set before it is first started.
+
+    Processes must be created with the launcher's context (create_process does this), and so must any queues passed to them.
+
+    Args:
+        preload_modules: the modules for the server process to import ahead of time, typically the ones defining the InfiniteProcess subclasses and their heavy dependencies.
+        start_method: the multiprocessing start method. Anything other than 'forkserver' is mainly useful for comparison.
+    """
+
+    def __init__(
+        self, preload_modules: Iterable[str] = tuple(), start_method: str = "forkserver"
+    ) -> None:
+        self._context = multiprocessing.get_context(start_method)
+        self._preload_modules = list(preload_modules)
+        if start_method == "forkserver":
+            self._context.set_forkserver_preload(self._preload_modules)
+
+    def get_context(self) -> BaseContext:
+        return self._context
+
+    def get_preload_modules(self) -> List[str]:
+        return self._preload_modules
+
+    def warm_up(self) -> None:
+        """Start the server process now instead of when the first process is started."""
+        if self._context.get_start_method() == "forkserver":
+            forkserver.ensure_running()
+
+    def create_process(
+        self, process_class: Callable[..., InfiniteProcess], *args: Any, **kwargs: Any
+    ) -> InfiniteProcess:
+        """Create a process that will be started using the launcher's context."""
+        return process_class(*args, context=self._context, **kwargs)
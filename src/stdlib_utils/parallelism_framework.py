@@ -2,38 +2,128 @@
 """Functionality to enhance parallelism."""
 from __future__ import annotations
 
+from collections import deque
+from contextlib import contextmanager
+import ctypes
 import logging
 import multiprocessing
+from multiprocessing.connection import Connection
+from multiprocessing.connection import wait
+from multiprocessing.context import BaseContext
+from multiprocessing.sharedctypes import RawValue
 import multiprocessing.queues
 import multiprocessing.synchronize
+import os
 import queue
-from statistics import stdev
 import threading
 import time
 from typing import Any
+from typing import Callable
+from typing import cast
+from typing import Deque
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
 from typing import Optional
 from typing import Tuple
 from typing import Union
 
 from .constants import NANOSECONDS_PER_CENTIMILLISECOND
+from .constants import NEVER_DUE_TIMEPOINT_NS
+from .constants import UnionOfThreadingAndMultiprocessingQueue
+from .exceptions import EventDrivenWakeupNotEnabledError
+from .exceptions import SharedPerformanceCountersNotEnabledError
+from .exceptions import UnrecognizedFixedRateOverrunPolicyError
+from .exceptions import UnrecognizedSchedulingPolicyError
+from .exceptions import UnrecognizedWaitStrategyError
+from .memory_monitoring import MemoryMonitor
 from .misc import get_formatted_stack_trace
 from .misc import print_exception
-from .queue_utils import is_queue_eventually_not_empty
+from .performance_tracking import get_thread_resource_usage
+from .performance_tracking import get_thread_scheduler_stats
+from .performance_tracking import LogBucketedHistogram
+from .performance_tracking import RunningStatistics
+from .performance_tracking import SharedPerformanceCounters
+from .queue_utils import bulk_drain_queues
 from .queue_utils import SimpleMultiprocessingQueue
 
 
+SCHEDULING_POLICY_NAMES = {"fifo": "SCHED_FIFO", "rr": "SCHED_RR"}
+# the native id matches what OS tools show, but is only available in Python 3.8+
+get_thread_id_for_trace: Callable[[], int] = getattr(
+    threading, "get_native_id", threading.get_ident
+)
+
+
 def calculate_iteration_time_ns(start_timepoint_of_iteration: int) -> int:
     return time.perf_counter_ns() - start_timepoint_of_iteration
 
 
+class _WakeupNotifyingCondition(threading.Condition):
+    """Replacement for the not_empty Condition of a queue.Queue.
+
+    In addition to the normal behavior, this sends a wakeup signal to
+    every registered loop whenever the queue transitions from empty to
+    not empty.
+    """
+
+    def __init__(
+        self,
+        the_queue: queue.Queue[
+            Any
+        ],  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+    ) -> None:
+        super().__init__(the_queue.mutex)
+        self._queue = the_queue
+        # the _send_wakeup methods of the registered loops
+        self.wakeup_callbacks: List[Callable[[], None]] = list()
+
+    def notify(self, n: int = 1) -> None:
+        super().notify(n)
+        # queue.Queue.put only calls notify after adding the item, so a size of 1 means the queue was previously empty
+        if (
+            self._queue._qsize() == 1
+        ):  # pylint: disable=protected-access # this is the same check the queue itself uses and it is already holding the mutex
+            for send_wakeup in self.wakeup_callbacks:
+                send_wakeup()
+
+
+class SharedControlFlags:
+    """Stop, soft stop and pause flags stored as bits of one word in shared memory.
+
+    Setting or clearing a flag holds a lock so that concurrent updates of different flags are not lost, but reading the flags is a single unsynchronized load, which is much cheaper than checking a multiprocessing.Event.
+    """
+
+    STOP = 1
+    SOFT_STOP = 2
+    PAUSE = 4
+
+    def __init__(self, context: Optional[BaseContext] = None) -> None:
+        if context is None:
+            context = multiprocessing.get_context()
+        self._value = RawValue(ctypes.c_uint32, 0)
+        self._lock = context.Lock()
+
+    def set_flag(self, flag: int) -> None:
+        with self._lock:
+            self._value.value |= flag
+
+    def clear_flag(self, flag: int) -> None:
+        with self._lock:
+            self._value.value &= ~flag
+
+    def get_flags(self) -> int:
+        return self._value.value
+
+
 # pylint: disable=too-many-instance-attributes
 class InfiniteLoopingParallelismMixIn:
     """Mix-in for infinite looping.
 
     Attrs:
-        num_longest_iterations: the quantity of longest iterations the object should keep track of.
+        num_percent_use_values_to_keep: the quantity of the most recent percent use values the object should keep track of. Statistics about all percent use values are still available from get_percent_use_metrics.
+        num_trace_events_to_keep: the quantity of the most recent trace events the object should keep when use_tracing is enabled.
 
     Args:
         fatal_error_reporter: a queue to report any fatal unhandled errors back to the thread that started this process
@@ -42,9 +132,25 @@ class InfiniteLoopingParallelismMixIn:
         soft_stop_event: When set (typically by calling .soft_stop()), this will cause the infinite loop to exit the next iteration that all conditionals indicating a soft_stop is possible are met (typically used to ensure all incoming tasks/queues are empty and there is nothing currently available to process)
         teardown_complete_event: After the infinite loop is exited, the _teardown_after_loop() method will be called. This event can be monitored by the parent thread to determine when the teardown has completed and the process is ready to have any needed additional clean-up performed by the parent before the parent calls .join().
         minimum_iteration_duration_seconds: In order for the process not to unnecessarily consume CPU resources while looping, the loop will sleep at the end of each iteration until this threshold duration is met.
+        use_event_driven_wakeup: Instead of sleeping for the full remainder of the minimum iteration duration, block until a registered queue receives an item, one of stop/soft_stop/pause/resume is called, or the minimum iteration duration is met (whichever happens first). Queues are registered using register_wakeup_queue.
+        fixed_rate_overrun_policy: When set, the loop runs on an absolute schedule of ticks spaced minimum_iteration_duration_seconds apart instead of measuring each iteration from its own start, so sleep overshoot and jitter do not accumulate into drift. The policy determines what happens when an iteration finishes after the next tick was due: 'skip' drops the missed ticks and waits for the next one on the schedule, 'catch_up' runs the missed ticks back-to-back, and 'stretch' restarts the schedule from the end of the late iteration.
+        use_shared_performance_counters: Maintain cumulative performance counters in shared memory, so that the thread/process that started this one can read them at any time using get_shared_performance_counters_snapshot without any messages being passed.
+        use_adaptive_iteration_duration: Instead of always using minimum_iteration_duration_seconds, halve the iteration duration each iteration that there is a backlog of work (down to zero) and double it each iteration that there is not (up to minimum_iteration_duration_seconds). The backlog is the total size of queues registered using register_input_queue, or whatever _get_backlog_size is overridden to return. Cannot be combined with fixed_rate_overrun_policy.
+        max_input_items_per_iteration: The maximum number of items to pass to the item handlers of queues registered using register_input_queue during each iteration.
+        max_input_item_handling_seconds_per_iteration: If set, stop passing items to the item handlers during an iteration once this much time has been spent handling them, even if max_input_items_per_iteration has not been reached.
+        cpu_affinity: The CPUs the loop is allowed to run on. Applied to the thread running the loop at the start of run, before _setup_before_loop.
+        nice_level: The nice level of the thread running the loop. Applied at the same time as cpu_affinity.
+        scheduling_policy: 'fifo' or 'rr' to run the loop with the SCHED_FIFO or SCHED_RR real-time scheduling policy. Applied at the same time as cpu_affinity. Settings that cannot be applied (e.g. due to missing privileges or OS support) are logged as a warning instead of raising an error, and are reported by reset_performance_tracker. Invalid values (e.g. a negative CPU number) are reported as a fatal error in the same way as an error during _setup_before_loop.
+        scheduling_priority: The real-time priority used with scheduling_policy.
+        wait_strategy: How to wait for the remainder of the iteration duration. 'sleep' uses time.sleep, which can overshoot by 50-100 microseconds or more. 'sleep_then_spin' sleeps until spin_duration_seconds before the deadline and then busy-waits, which is precise but uses CPU while spinning. 'yield_spin' busy-waits for the whole idle time but yields the GIL and CPU between checks. Cannot be combined with use_event_driven_wakeup. The overshoot of each wait is reported by reset_performance_tracker.
+        spin_duration_seconds: How long before the deadline 'sleep_then_spin' stops sleeping and starts busy-waiting. Should be larger than the typical sleep overshoot.
+        use_tracing: Record the setup, work and idle time of each iteration, pauses, teardown, and spans added using trace_span into a ring buffer, so that a timeline of the loop can be exported using get_trace_events and the tracing module.
+        use_cpu_time_tracking: Also measure the CPU time of the thread running the loop during each iteration, so that reset_performance_tracker can split the busy time into time on a CPU, time descheduled (runnable but waiting for a CPU) and time blocked (on I/O, locks or the GIL), and report context switches and page faults. Costs two extra clock readings per iteration. Only the on CPU time is available on platforms other than Linux.
+        use_shared_control_flags: Also store the stop, soft stop and pause states as bits in shared memory (see SharedControlFlags), and have the loop check those instead of the events each iteration. The events are still set by stop/soft_stop/pause/resume so that is_stopped/is_paused etc. and anything waiting on them keep working, but they must not be set directly since the loop will not see it.
     """
 
-    num_longest_iterations = 5
+    num_percent_use_values_to_keep = 1000
+    num_trace_events_to_keep = 10000
 
     def __init__(
         self,
@@ -64,20 +170,226 @@ class InfiniteLoopingParallelismMixIn:
         ],
         pause_event: Union[threading.Event, multiprocessing.synchronize.Event],
         minimum_iteration_duration_seconds: Union[float, int] = 0.01,
+        use_event_driven_wakeup: bool = False,
+        fixed_rate_overrun_policy: Optional[str] = None,
+        use_shared_performance_counters: bool = False,
+        use_adaptive_iteration_duration: bool = False,
+        max_input_items_per_iteration: int = 100,
+        max_input_item_handling_seconds_per_iteration: Optional[float] = None,
+        use_shared_control_flags: bool = False,
+        cpu_affinity: Optional[Iterable[int]] = None,
+        nice_level: Optional[int] = None,
+        scheduling_policy: Optional[str] = None,
+        scheduling_priority: int = 1,
+        wait_strategy: str = "sleep",
+        spin_duration_seconds: float = 0.0002,
+        use_tracing: bool = False,
+        use_cpu_time_tracking: bool = False,
     ) -> None:
+        if fixed_rate_overrun_policy not in (None, "skip", "catch_up", "stretch"):
+            raise UnrecognizedFixedRateOverrunPolicyError(fixed_rate_overrun_policy)
+        if (
+            scheduling_policy is not None
+            and scheduling_policy not in SCHEDULING_POLICY_NAMES
+        ):
+            raise UnrecognizedSchedulingPolicyError(scheduling_policy)
+        if wait_strategy not in ("sleep", "sleep_then_spin", "yield_spin"):
+            raise UnrecognizedWaitStrategyError(wait_strategy)
+        if wait_strategy != "sleep" and use_event_driven_wakeup:
+            raise NotImplementedError(
+                "Event driven wakeup can only be used with the 'sleep' wait strategy."
+            )
+        if use_adaptive_iteration_duration and fixed_rate_overrun_policy is not None:
+            raise NotImplementedError(
+                "An adaptive iteration duration cannot be used with a fixed rate schedule."
+            )
         self._init_time_ns: Optional[int] = None
         self._stop_event = stop_event
         self._soft_stop_event = soft_stop_event
         self._teardown_complete_event = teardown_complete_event
         self._start_up_complete_event = start_up_complete_event
         self._pause_event = pause_event
+        self._bind_lifecycle_checks()
+        # set by resume/stop/soft_stop so that a paused loop can block until one of them is called
+        self._pause_control_event: Union[
+            threading.Event, multiprocessing.synchronize.Event
+        ] = (
+            threading.Event()
+            if isinstance(pause_event, threading.Event)
+            else self._get_multiprocessing_context().Event()
+        )
+        self._paused_time_ns = 0
+        self._wait_strategy = wait_strategy
+        self._spin_duration_ns = int(spin_duration_seconds * 10 ** 9)
+        # the timepoint the latest wait should have ended, to measure its overshoot once the next iteration starts
+        self._expected_wakeup_timepoint_ns: Optional[int] = None
+        self._sleep_overshoot_histogram = LogBucketedHistogram()
+        # each event is the name, start timepoint and duration of a span
+        self._trace_events: Optional[Deque[Tuple[str, int, int]]] = None
+        if use_tracing:
+            self._trace_events = deque(maxlen=self.num_trace_events_to_keep)
+        self._trace_process_id = os.getpid()
+        self._trace_thread_id = get_thread_id_for_trace()
+        self._use_cpu_time_tracking = use_cpu_time_tracking
+        self._thread_time_at_start_of_iteration_ns = 0
+        self._cpu_time_during_iterations_ns = 0
+        self._resource_usage_at_start_of_measurement: Optional[Dict[str, int]] = None
+        self._scheduler_stats_at_start_of_measurement: Optional[Dict[str, int]] = None
+        # in shared memory for processes, so that a Watchdog in another process can read it
+        self._heartbeat_timepoint_ns: ctypes.c_int64 = (
+            ctypes.c_int64(0)
+            if isinstance(pause_event, threading.Event)
+            else RawValue(ctypes.c_int64, 0)
+        )
         self._fatal_error_reporter = fatal_error_reporter
         self._process_can_be_soft_stopped = True
         self._logging_level = logging_level
         self._minimum_iteration_duration_seconds = minimum_iteration_duration_seconds
         self._idle_iteration_time_ns = 0
-        self._percent_use_values: List[float] = list()
-        self._longest_iterations: List[int] = list()
+        self._percent_use_statistics = RunningStatistics(
+            num_recent_values_to_keep=self.num_percent_use_values_to_keep
+        )
+        self._iteration_time_histogram = LogBucketedHistogram()
+        # the earliest timepoint any periodic task is due. compared against the start of every iteration, so it is left far in the future unless a periodic task is enabled
+        self._next_periodic_task_timepoint_ns = NEVER_DUE_TIMEPOINT_NS
+        self._next_performance_report_timepoint_ns = NEVER_DUE_TIMEPOINT_NS
+        self._performance_report_interval_ns: Optional[int] = None
+        self._next_memory_measurement_timepoint_ns = NEVER_DUE_TIMEPOINT_NS
+        self._memory_measurement_interval_ns: Optional[int] = None
+        self._memory_monitor: Optional[MemoryMonitor] = None
+        self._performance_report_callback: Optional[
+            Callable[[Dict[str, Any]], None]
+        ] = None
+        self._queues_to_report: Dict[
+            str,
+            Union[UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue],
+        ] = dict()
+        self._fixed_rate_overrun_policy = fixed_rate_overrun_policy
+        self._scheduled_timepoint_of_iteration_ns: Optional[int] = None
+        self._num_ticks = 0
+        self._num_missed_ticks = 0
+        self._total_tick_lateness_ns = 0
+        self._max_tick_lateness_ns = 0
+        self._use_adaptive_iteration_duration = use_adaptive_iteration_duration
+        self._adaptive_iteration_duration_ns = int(
+            minimum_iteration_duration_seconds * 10 ** 9
+        )
+        self._total_adaptive_iteration_duration_ns = 0
+        self._num_adaptive_iteration_durations = 0
+        self._input_queues: List[
+            Union[UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue]
+        ] = list()
+        self._input_item_handlers: List[
+            Tuple[
+                Union[
+                    UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue
+                ],
+                Callable[[Any], None],
+            ]
+        ] = list()
+        self._max_input_items_per_iteration = max_input_items_per_iteration
+        self._max_input_item_handling_ns_per_iteration: Optional[int] = None
+        if max_input_item_handling_seconds_per_iteration is not None:
+            self._max_input_item_handling_ns_per_iteration = int(
+                max_input_item_handling_seconds_per_iteration * 10 ** 9
+            )
+        self._num_input_items_handled = 0
+        self._input_item_handling_time_histogram = LogBucketedHistogram()
+        self._shared_performance_counters: Optional[SharedPerformanceCounters] = None
+        if use_shared_performance_counters:
+            self._shared_performance_counters = SharedPerformanceCounters()
+        self._shared_control_flags: Optional[SharedControlFlags] = None
+        if use_shared_control_flags:
+            self._shared_control_flags = SharedControlFlags(
+                self._get_multiprocessing_context()
+            )
+        self._scheduling_settings: Dict[str, Any] = dict()
+        if cpu_affinity is not None:
+            self._scheduling_settings["cpu_affinity"] = sorted(cpu_affinity)
+        if nice_level is not None:
+            self._scheduling_settings["nice_level"] = nice_level
+        if scheduling_policy is not None:
+            self._scheduling_settings["scheduling_policy"] = scheduling_policy
+            self._scheduling_settings["scheduling_priority"] = scheduling_priority
+        self._applied_scheduling_settings: Dict[str, Any] = dict()
+        self._wakeup_receiver: Optional[Connection] = None
+        self._wakeup_sender: Optional[Connection] = None
+        # set when a wakeup is sent and cleared once the receiver has drained the pipe, so that at most one wakeup is outstanding and the pipe can never fill up (and block the sender) while the loop is not waiting on it
+        self._wakeup_pending: Optional[ctypes.c_bool] = None
+        if use_event_driven_wakeup:
+            self._wakeup_receiver, self._wakeup_sender = multiprocessing.Pipe(
+                duplex=False
+            )
+            self._wakeup_pending = (
+                ctypes.c_bool(False)
+                if isinstance(pause_event, threading.Event)
+                else RawValue(ctypes.c_bool, False)
+            )
+        self._queues_to_drain: Dict[
+            str, UnionOfThreadingAndMultiprocessingQueue
+        ] = dict()
+        self._wakeup_queue_readers: List[Connection] = list()
+        self._wakeup_threading_queues: List[
+            queue.Queue[
+                Any
+            ]  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+        ] = list()
+
+    def _bind_lifecycle_checks(self) -> None:
+        """Validate the lifecycle events once and bind the checks the loop uses.
+
+        The public is_stopped/is_paused/etc. methods validate the events on every call for the benefit of external callers, which is too much overhead for the loop to do each iteration.
+        """
+        for attribute_name in (
+            "_stop_event",
+            "_soft_stop_event",
+            "_teardown_complete_event",
+            "_start_up_complete_event",
+            "_pause_event",
+        ):
+            if not isinstance(
+                getattr(self, attribute_name, None),
+                (threading.Event, multiprocessing.synchronize.Event),
+            ):
+                raise NotImplementedError(
+                    f"Classes using this mixin must have a {attribute_name} as either a threading.Event or multiprocessing.Event"
+                )
+        self._rebind_lifecycle_checks()
+
+    def _rebind_lifecycle_checks(self) -> None:
+        """Bind the stop/soft stop/pause checks the loop uses each iteration.
+
+        This is done again each time the loop starts running, so events replaced after init are picked up. If is_stopped, is_preparing_for_soft_stop or is_paused is overridden (by a subclass or on the instance), the loop calls the override instead of the is_set method of the event.
+        """
+        self._is_stop_event_set = self._get_lifecycle_check(
+            "is_stopped", self._stop_event
+        )
+        self._is_soft_stop_event_set = self._get_lifecycle_check(
+            "is_preparing_for_soft_stop", self._soft_stop_event
+        )
+        self._is_pause_event_set = self._get_lifecycle_check(
+            "is_paused", self._pause_event
+        )
+
+    def _get_lifecycle_check(
+        self,
+        method_name: str,
+        event: Union[threading.Event, multiprocessing.synchronize.Event],
+    ) -> Callable[[], bool]:
+        method = getattr(self, method_name)
+        if getattr(method, "__func__", None) is getattr(
+            InfiniteLoopingParallelismMixIn, method_name
+        ):
+            return event.is_set
+        return cast(Callable[[], bool], method)
+
+    def _get_multiprocessing_context(self) -> BaseContext:
+        """Get the context used to create the locks/events the mixin needs.
+
+        Subclasses started using a specific context must return it, since these objects cannot be shared with a process started by a different start method.
+        """
+        # pylint:disable=no-self-use # Tanner (5/12/20): this is needed so method signature matches subclass implementation
+        return multiprocessing.get_context()
 
     def _init_performance_measurements(self) -> None:
         # separate to make mocking easier
@@ -86,6 +398,28 @@ class InfiniteLoopingParallelismMixIn:
     def _reset_performance_measurements(self) -> None:
         self._start_timepoint_of_last_performance_measurement = time.perf_counter_ns()
         self._idle_iteration_time_ns = 0
+        self._paused_time_ns = 0
+        self._iteration_time_histogram = LogBucketedHistogram()
+        self._sleep_overshoot_histogram = LogBucketedHistogram()
+        self._num_ticks = 0
+        self._num_missed_ticks = 0
+        self._total_tick_lateness_ns = 0
+        self._max_tick_lateness_ns = 0
+        self._total_adaptive_iteration_duration_ns = 0
+        self._num_adaptive_iteration_durations = 0
+        self._num_input_items_handled = 0
+        self._input_item_handling_time_histogram = LogBucketedHistogram()
+        if self._use_cpu_time_tracking:
+            self._cpu_time_during_iterations_ns = 0
+            self._take_thread_statistics_baselines()
+
+    def _take_thread_statistics_baselines(self) -> None:
+        self._resource_usage_at_start_of_measurement = get_thread_resource_usage(
+            self._trace_thread_id
+        )
+        self._scheduler_stats_at_start_of_measurement = get_thread_scheduler_stats(
+            self._trace_thread_id
+        )
 
     def _reset_start_time(self) -> None:
         self._init_time_ns = time.perf_counter_ns()
@@ -106,36 +440,284 @@ class InfiniteLoopingParallelismMixIn:
             "start_timepoint_of_measurements"
         ] = self._start_timepoint_of_last_performance_measurement
         out_dict["idle_iteration_time_ns"] = self._idle_iteration_time_ns
+        out_dict["paused_time_ns"] = self._paused_time_ns
+        elapsed_time_ns = self.get_elapsed_time_since_last_performance_measurement()
+        # time spent blocked while paused is neither idle nor active
         out_dict["percent_use"] = 100 * (
             1
             - self._idle_iteration_time_ns
-            / self.get_elapsed_time_since_last_performance_measurement()
+            / max(elapsed_time_ns - self._paused_time_ns, 1)
+        )
+        out_dict[
+            "iteration_time_percentiles"
+        ] = self._iteration_time_histogram.get_percentiles()
+        out_dict["iteration_time_histogram"] = self._iteration_time_histogram
+        out_dict[
+            "sleep_overshoot_percentiles"
+        ] = self._sleep_overshoot_histogram.get_percentiles()
+        if self._fixed_rate_overrun_policy is not None:
+            out_dict["fixed_rate_schedule"] = {
+                "num_ticks": self._num_ticks,
+                "num_missed_ticks": self._num_missed_ticks,
+                "mean_tick_lateness_ns": self._total_tick_lateness_ns
+                // max(self._num_ticks, 1),
+                "max_tick_lateness_ns": self._max_tick_lateness_ns,
+            }
+        if self._use_adaptive_iteration_duration:
+            out_dict["adaptive_iteration_duration_ns"] = {
+                "current": self._adaptive_iteration_duration_ns,
+                "mean": self._total_adaptive_iteration_duration_ns
+                // max(self._num_adaptive_iteration_durations, 1),
+            }
+        if self._scheduling_settings:
+            out_dict["scheduling_settings"] = self._applied_scheduling_settings
+        if self._input_item_handlers:
+            out_dict["input_items"] = {
+                "num_handled": self._num_input_items_handled,
+                "items_per_second": self._num_input_items_handled
+                * 10 ** 9
+                / elapsed_time_ns,
+                "handling_time_percentiles": self._input_item_handling_time_histogram.get_percentiles(),
+            }
+        if self._memory_monitor is not None:
+            out_dict["memory"] = self._memory_monitor.get_latest_measurement()
+        if self._use_cpu_time_tracking:
+            out_dict.update(self._get_cpu_time_metrics())
+        self._percent_use_statistics.add_value(
+            out_dict["percent_use"], elapsed_time_ns / 10 ** 9
         )
-        out_dict["longest_iterations"] = self._longest_iterations
-        self._percent_use_values.append(out_dict["percent_use"])
         self._reset_performance_measurements()
         return out_dict
 
-    def get_percent_use_values(self) -> List[float]:
-        return self._percent_use_values
-
-    def get_percent_use_metrics(self) -> Dict[str, float]:
-        metrics = {
-            "max": max(self._percent_use_values),
-            "min": min(self._percent_use_values),
-            "stdev": round(stdev(self._percent_use_values), 6),
-            "mean": round(
-                sum(self._percent_use_values) / len(self._percent_use_values), 6
-            ),
+    def _get_cpu_time_metrics(self) -> Dict[str, Any]:
+        """Split the busy time since the last reset into on CPU, descheduled and blocked time."""
+        busy_time_ns = self._iteration_time_histogram.get_sum_of_values()
+        on_cpu_time_ns = min(self._cpu_time_during_iterations_ns, busy_time_ns)
+        off_cpu_time_ns = busy_time_ns - on_cpu_time_ns
+        cpu_time: Dict[str, Optional[int]] = {
+            "busy_time_ns": busy_time_ns,
+            "on_cpu_time_ns": on_cpu_time_ns,
+            "descheduled_time_ns": None,
+            "blocked_time_ns": off_cpu_time_ns,
         }
+        scheduler_stats = get_thread_scheduler_stats(self._trace_thread_id)
+        previous_scheduler_stats = self._scheduler_stats_at_start_of_measurement
+        if scheduler_stats is not None and previous_scheduler_stats is not None:
+            # the kernel only tracks the total time waiting for a CPU, which includes waking up from idle waits, so it is capped at the busy time not spent on a CPU
+            descheduled_time_ns = min(
+                scheduler_stats["run_queue_wait_time_ns"]
+                - previous_scheduler_stats["run_queue_wait_time_ns"],
+                off_cpu_time_ns,
+            )
+            cpu_time["descheduled_time_ns"] = descheduled_time_ns
+            cpu_time["blocked_time_ns"] = off_cpu_time_ns - descheduled_time_ns
+        metrics: Dict[str, Any] = {"cpu_time": cpu_time}
+        resource_usage = get_thread_resource_usage(self._trace_thread_id)
+        previous_resource_usage = self._resource_usage_at_start_of_measurement
+        if resource_usage is not None and previous_resource_usage is not None:
+            metrics["resource_usage"] = {
+                name: value - previous_resource_usage[name]
+                for name, value in resource_usage.items()
+            }
         return metrics
 
+    def get_percent_use_values(self) -> Deque[float]:
+        """Get the most recent percent use values.
+
+        This is a bounded ring buffer holding up to num_percent_use_values_to_keep values.
+        """
+        return self._percent_use_statistics.get_recent_values()
+
+    def get_percent_use_metrics(self) -> Dict[str, Optional[float]]:
+        """Get statistics about every percent use value ever recorded.
+
+        Includes exponentially weighted averages over 1, 5 and 15 minutes.
+        """
+        metrics = self._percent_use_statistics.get_metrics()
+        metrics["stdev"] = round(self._percent_use_statistics.get_stdev(), 6)
+        mean = metrics["mean"]
+        if mean is not None:
+            metrics["mean"] = round(mean, 6)
+        return metrics
+
+    def get_shared_performance_counters_snapshot(self) -> Dict[str, int]:
+        """Get a consistent snapshot of the shared performance counters.
+
+        Safe to call from any thread or process at any time. Requires
+        use_shared_performance_counters to have been enabled during init.
+        """
+        if self._shared_performance_counters is None:
+            raise SharedPerformanceCountersNotEnabledError()
+        return self._shared_performance_counters.get_snapshot()
+
+    def get_shared_performance_counters_snapshot_with_iteration_time_buckets(
+        self,
+    ) -> Tuple[Dict[str, int], List[int]]:
+        """Get a snapshot of the shared performance counters and iteration time buckets.
+
+        The buckets are never reset, and are counted using the fixed bounds in SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS. Safe to call from any thread or process at any time. Requires use_shared_performance_counters to have been enabled during init.
+        """
+        if self._shared_performance_counters is None:
+            raise SharedPerformanceCountersNotEnabledError()
+        return (
+            self._shared_performance_counters.get_snapshot_with_iteration_time_buckets()
+        )
+
+    def enable_periodic_performance_reports(
+        self,
+        destination: Union[
+            UnionOfThreadingAndMultiprocessingQueue,
+            SimpleMultiprocessingQueue,
+            Callable[[Dict[str, Any]], None],
+        ],
+        interval_seconds: Union[float, int],
+        queues_to_report: Optional[
+            Dict[
+                str,
+                Union[
+                    UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue
+                ],
+            ]
+        ] = None,
+    ) -> None:
+        """Have the loop itself report its performance every interval.
+
+        At the start of the first iteration after each interval has elapsed, the loop calls reset_performance_tracker and sends a compact report of the result to the destination. Must be called before the loop is started.
+
+        Args:
+            destination: a queue to put each report into, or a callable that each report is passed to. Either is used from within the thread or process running the loop. If the queue is full the report is dropped, but any other error raised while sending a report is reported as a fatal error of the loop.
+            interval_seconds: how often to report.
+            queues_to_report: the depth of each of these queues is included in the report under its name. None if the size of the queue cannot be determined on this platform.
+        """
+        if callable(destination):
+            self._performance_report_callback = destination
+        else:
+            self._performance_report_callback = destination.put_nowait
+        self._performance_report_interval_ns = int(interval_seconds * 10 ** 9)
+        if queues_to_report is not None:
+            self._queues_to_report = dict(queues_to_report)
+
+    def _send_performance_report(self, start_timepoint_of_iteration: int) -> None:
+        if (
+            self._performance_report_callback is None
+            or self._performance_report_interval_ns is None
+        ):
+            raise NotImplementedError(
+                "Periodic performance reports must be enabled before they can be sent."
+            )
+        self._next_performance_report_timepoint_ns = (
+            start_timepoint_of_iteration + self._performance_report_interval_ns
+        )
+        metrics = self.reset_performance_tracker()
+        report: Dict[str, Any] = {
+            "communication_type": "performance_report",
+            "start_timepoint_of_measurements": metrics[
+                "start_timepoint_of_measurements"
+            ],
+            "measurement_duration_ns": start_timepoint_of_iteration
+            - metrics["start_timepoint_of_measurements"],
+            "num_iterations": metrics["iteration_time_histogram"].get_total_count(),
+            "percent_use": round(metrics["percent_use"], 2),
+            "iteration_time_percentiles": metrics["iteration_time_percentiles"],
+        }
+        if "input_items" in metrics:
+            report["num_input_items_handled"] = metrics["input_items"]["num_handled"]
+            report["input_items_per_second"] = round(
+                metrics["input_items"]["items_per_second"], 2
+            )
+        for key in ("cpu_time", "resource_usage"):
+            if key in metrics:
+                report[key] = metrics[key]
+        if metrics.get("memory") is not None:
+            report["memory"] = {
+                key: metrics["memory"][key]
+                for key in (
+                    "rss_bytes",
+                    "rss_growth_bytes_per_second",
+                    "traced_growth_bytes_per_second",
+                )
+            }
+        if self._queues_to_report:
+            queue_depths: Dict[str, Optional[int]] = dict()
+            for name, the_queue in self._queues_to_report.items():
+                try:
+                    queue_depths[name] = the_queue.qsize()  # type: ignore[union-attr] # SimpleMultiprocessingQueue does not define qsize, which is handled below
+                except (
+                    NotImplementedError,
+                    AttributeError,
+                ):  # multiprocessing.Queue.qsize is not implemented on macOS
+                    queue_depths[name] = None
+            report["queue_depths"] = queue_depths
+        try:
+            self._performance_report_callback(report)
+        except queue.Full:
+            # reports are only informational, so a slow consumer should not bring down the loop
+            logging.warning(
+                "Dropped a performance report because the destination queue is full."
+            )
+
+    def enable_memory_monitoring(
+        self,
+        interval_seconds: Union[float, int] = 60,
+        num_top_allocation_sites: int = 10,
+        growth_warning_threshold_bytes_per_second: Optional[Union[float, int]] = None,
+        use_tracemalloc: bool = True,
+    ) -> None:
+        """Have the loop measure its memory growth every interval.
+
+        The latest measurement is returned under 'memory' by reset_performance_tracker (and so is included in periodic performance reports). Monitoring starts after _setup_before_loop and stops after _teardown_after_loop, in the thread or process running the loop. Must be called before the loop is started. See MemoryMonitor for the overhead of each setting.
+
+        Args:
+            interval_seconds: how often to measure.
+            num_top_allocation_sites: how many of the allocation sites whose size changed the most to include in each measurement.
+            growth_warning_threshold_bytes_per_second: if the RSS or the traced memory grows faster than this between two measurements, a MemoryGrowthWarning is issued. If warnings are turned into errors, it is reported as a fatal error of the loop, as is any other error raised while measuring.
+            use_tracemalloc: trace allocations to find the allocation sites that grew. If False, only the RSS is measured.
+        """
+        self._memory_monitor = MemoryMonitor(
+            num_top_allocation_sites=num_top_allocation_sites,
+            growth_warning_threshold_bytes_per_second=growth_warning_threshold_bytes_per_second,
+            use_tracemalloc=use_tracemalloc,
+        )
+        self._memory_measurement_interval_ns = int(interval_seconds * 10 ** 9)
+
+    def _take_memory_measurement(self, start_timepoint_of_iteration: int) -> None:
+        if self._memory_monitor is None or self._memory_measurement_interval_ns is None:
+            raise NotImplementedError(
+                "Memory monitoring must be enabled before measurements can be taken."
+            )
+        self._next_memory_measurement_timepoint_ns = (
+            start_timepoint_of_iteration + self._memory_measurement_interval_ns
+        )
+        self._memory_monitor.take_measurement(start_timepoint_of_iteration)
+
     def get_idle_time_ns(self) -> float:
         return self._idle_iteration_time_ns
 
+    def get_paused_time_ns(self) -> int:
+        return self._paused_time_ns
+
     def get_minimum_iteration_duration_seconds(self) -> Union[float, int]:
         return self._minimum_iteration_duration_seconds
 
+    def get_fixed_rate_overrun_policy(self) -> Optional[str]:
+        return self._fixed_rate_overrun_policy
+
+    def is_adaptive_iteration_duration_enabled(self) -> bool:
+        return self._use_adaptive_iteration_duration
+
+    def get_scheduling_settings(self) -> Dict[str, Any]:
+        """Get the requested CPU affinity, nice level and scheduling policy.
+
+        Only the settings that were requested are included.
+        """
+        return self._scheduling_settings
+
+    def is_shared_control_flags_enabled(self) -> bool:
+        return self._shared_control_flags is not None
+
+    def get_adaptive_iteration_duration_ns(self) -> int:
+        return self._adaptive_iteration_duration_ns
+
     def get_cms_since_init(self) -> int:
         if self._init_time_ns is None:
             return 0
@@ -165,7 +747,13 @@ class InfiniteLoopingParallelismMixIn:
     ]:
         return self._fatal_error_reporter
 
+    def _count_fatal_error(self) -> None:
+        """Count the error where it is reported, since the reporter may not be able to report its size and is emptied once errors are handled."""
+        if self._shared_performance_counters is not None:
+            self._shared_performance_counters.record_fatal_error()
+
     def _report_fatal_error(self, the_err: Exception) -> None:
+        self._count_fatal_error()
         self._fatal_error_reporter.put_nowait(the_err)  # type: ignore # the subclasses all have an instance of fatal error reporter. there may be a more elegant way to handle this to make mypy happy though... (Eli 2/12/20)
 
     def _setup_before_loop(self) -> None:
@@ -213,28 +801,12 @@ class InfiniteLoopingParallelismMixIn:
         if num_iterations is None:
             num_iterations = -1
         completed_iterations = 0
-        if perform_setup_before_loop:
-            try:
-                self._setup_before_loop()
-            except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
-                print_exception(e, "cf477f32-9797-417e-a157-ea6e0c4f25d1")
-                self._report_fatal_error(e)
-                return
-        self._start_up_complete_event.set()
+        if not self._start_running(perform_setup_before_loop=perform_setup_before_loop):
+            return
         while True:
             start_timepoint_of_iteration = time.perf_counter_ns()
-            self._process_can_be_soft_stopped = True
-            if not self._pause_event.is_set():
-                try:
-                    self._commands_for_each_run_iteration()
-                except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
-                    print_exception(e, "88a25177-b2a1-4bbb-ba92-bf5810594a99")
-                    self._report_fatal_error(e)
-                    self.stop()
-            if self.is_preparing_for_soft_stop() and self._process_can_be_soft_stopped:
-                self.stop()
-
-            if self.is_stopped():
+            self._begin_iteration(start_timepoint_of_iteration)
+            if not self._run_one_iteration():
                 # Having the check for is_stopped after the first iteration of run allows easier unit testing.
                 break
             completed_iterations += 1
@@ -243,34 +815,582 @@ class InfiniteLoopingParallelismMixIn:
             # only decide to sleep if there are more iterations to do. this will keep unit tests executing more quickly
             self._sleep_for_idle_time_during_iteration(start_timepoint_of_iteration)
         if perform_teardown_after_loop:
+            self._finish_running()
+
+    def _start_running(self, perform_setup_before_loop: bool = True) -> bool:
+        """Perform the steps of run that happen before the loop is entered.
+
+        Returns False if the setup failed and the loop should not be entered.
+        """
+        self._rebind_lifecycle_checks()
+        self._scheduled_timepoint_of_iteration_ns = None
+        self._expected_wakeup_timepoint_ns = None
+        self._trace_process_id = os.getpid()
+        self._trace_thread_id = get_thread_id_for_trace()
+        if self._use_cpu_time_tracking:
+            # the statistics are per thread, so the baselines taken during init were of the wrong thread if the loop runs in a new one
+            self._take_thread_statistics_baselines()
+        if perform_setup_before_loop:
             try:
-                self._teardown_after_loop()
+                if self._scheduling_settings:
+                    self._apply_scheduling_settings()
+                with self.trace_span("setup"):
+                    self._setup_before_loop()
             except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
-                print_exception(e, "bd9a8587-e79b-43cb-8ffe-0bf45740599d")
+                print_exception(e, "cf477f32-9797-417e-a157-ea6e0c4f25d1")
                 self._report_fatal_error(e)
+                return False
+        if self._shared_performance_counters is not None:
+            self._shared_performance_counters.mark_start(time.perf_counter_ns())
+        if (
+            self._performance_report_interval_ns is not None
+            or self._memory_monitor is not None
+        ):
+            self._start_periodic_tasks(time.perf_counter_ns())
+        self._mark_start_up_complete()
+        return True
+
+    def _begin_iteration(self, start_timepoint_of_iteration: int) -> None:
+        """Perform the bookkeeping due at the start of every iteration."""
+        self._record_heartbeat(start_timepoint_of_iteration)
+        if self._use_cpu_time_tracking:
+            self._thread_time_at_start_of_iteration_ns = time.thread_time_ns()
+        if start_timepoint_of_iteration >= self._next_periodic_task_timepoint_ns:
+            try:
+                self._run_periodic_tasks(start_timepoint_of_iteration)
+            except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
+                print_exception(e, "5e0d1b7a-3c84-4f2e-9a61-d7b2c6f08e93")
+                self._report_fatal_error(e)
+                self.stop()
+
+    def _start_periodic_tasks(self, timepoint_ns: int) -> None:
+        if self._performance_report_interval_ns is not None:
+            self._next_performance_report_timepoint_ns = (
+                timepoint_ns + self._performance_report_interval_ns
+            )
+        if (
+            self._memory_monitor is not None
+            and self._memory_measurement_interval_ns is not None
+        ):
+            self._memory_monitor.start(timepoint_ns)
+            self._next_memory_measurement_timepoint_ns = (
+                timepoint_ns + self._memory_measurement_interval_ns
+            )
+        self._schedule_next_periodic_task()
+
+    def _run_periodic_tasks(self, start_timepoint_of_iteration: int) -> None:
+        # the memory is measured first so that a performance report sent during the same iteration includes it
+        if start_timepoint_of_iteration >= self._next_memory_measurement_timepoint_ns:
+            self._take_memory_measurement(start_timepoint_of_iteration)
+        if start_timepoint_of_iteration >= self._next_performance_report_timepoint_ns:
+            self._send_performance_report(start_timepoint_of_iteration)
+        self._schedule_next_periodic_task()
+
+    def _schedule_next_periodic_task(self) -> None:
+        self._next_periodic_task_timepoint_ns = min(
+            self._next_performance_report_timepoint_ns,
+            self._next_memory_measurement_timepoint_ns,
+        )
+
+    def _record_heartbeat(self, timepoint_ns: int) -> None:
+        self._heartbeat_timepoint_ns.value = timepoint_ns
+
+    def is_cpu_time_tracking_enabled(self) -> bool:
+        return self._use_cpu_time_tracking
+
+    def is_tracing_enabled(self) -> bool:
+        return self._trace_events is not None
+
+    @contextmanager
+    def trace_span(self, name: str) -> Iterator[None]:
+        """Record the code run inside the with block as a span of the trace.
+
+        Can be used within _commands_for_each_run_iteration to break iterations down into sub-spans. Does nothing if use_tracing is not enabled.
+        """
+        trace_events = self._trace_events
+        if trace_events is None:
+            yield
+            return
+        start_timepoint = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            trace_events.append(
+                (name, start_timepoint, time.perf_counter_ns() - start_timepoint)
+            )
+
+    def get_trace_events(self) -> List[Dict[str, Any]]:
+        """Get the events in the trace of the loop in Chrome trace event format.
+
+        Timestamps are taken from time.perf_counter_ns, which is a system-wide clock, so the events of loops in different threads and processes can be merged into one timeline (see tracing.write_chrome_trace_file).
+        """
+        trace_events = self._trace_events
+        if trace_events is None:
+            return list()
+        process_id = self._trace_process_id
+        thread_id = self._trace_thread_id
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": process_id,
+                "tid": thread_id,
+                "args": {"name": getattr(self, "name", type(self).__name__)},
+            }
+        ]
+        events.extend(
+            {
+                "name": name,
+                "ph": "X",
+                "ts": start_timepoint / 1000,
+                "dur": duration / 1000,
+                "pid": process_id,
+                "tid": thread_id,
+            }
+            for name, start_timepoint, duration in trace_events
+        )
+        return events
+
+    def _report_trace_events(self) -> None:
+        """Make the trace events available after the loop finishes.
+
+        Subclasses whose loop runs in another process override this to send the events to the parent.
+        """
+
+    def get_heartbeat_timepoint_ns(self) -> int:
+        """Get the perf_counter_ns timepoint of the start of the latest iteration.
+
+        Returns 0 if no iterations have started.
+        """
+        return self._heartbeat_timepoint_ns.value
+
+    def _mark_start_up_complete(self) -> None:
+        self._start_up_complete_event.set()
+
+    def _apply_scheduling_settings(self) -> None:
+        """Apply the requested settings to the calling thread.
+
+        On Linux, a pid of 0 refers to the calling thread rather than the whole process, so each loop can have its own settings.
+        """
+        settings = self._scheduling_settings
+        applied_settings: Dict[str, Any] = dict()
+        errors: Dict[str, str] = dict()
+        if "cpu_affinity" in settings:
+            try:
+                os.sched_setaffinity(0, settings["cpu_affinity"])
+                applied_settings["cpu_affinity"] = sorted(os.sched_getaffinity(0))
+            except (
+                AttributeError,
+                OSError,
+            ) as e:  # AttributeError if not supported by the OS
+                errors["cpu_affinity"] = repr(e)
+        if "nice_level" in settings:
+            try:
+                os.setpriority(os.PRIO_PROCESS, 0, settings["nice_level"])
+                applied_settings["nice_level"] = os.getpriority(os.PRIO_PROCESS, 0)
+            except (AttributeError, OSError) as e:
+                errors["nice_level"] = repr(e)
+        if "scheduling_policy" in settings:
+            try:
+                os.sched_setscheduler(
+                    0,
+                    getattr(os, SCHEDULING_POLICY_NAMES[settings["scheduling_policy"]]),
+                    os.sched_param(settings["scheduling_priority"]),
+                )
+                applied_settings["scheduling_policy"] = settings["scheduling_policy"]
+                applied_settings["scheduling_priority"] = os.sched_getparam(
+                    0
+                ).sched_priority
+            except (AttributeError, OSError) as e:
+                errors["scheduling_policy"] = repr(e)
+        for setting_name, error_description in errors.items():
+            logging.warning(
+                f"Could not apply {setting_name} of {settings[setting_name]}: {error_description}"
+            )
+        applied_settings["errors"] = errors
+        self._applied_scheduling_settings = applied_settings
+
+    def _run_one_iteration(self) -> bool:
+        """Execute a single iteration of the loop.
+
+        Returns False if the loop has been stopped and should be exited.
+        """
+        self._process_can_be_soft_stopped = True
+        shared_control_flags = self._shared_control_flags
+        if shared_control_flags is not None:
+            if not shared_control_flags.get_flags() & SharedControlFlags.PAUSE:
+                self._execute_commands_of_iteration()
+            # read again since the commands may have stopped the loop
+            control_flags = shared_control_flags.get_flags()
+            if (
+                control_flags & SharedControlFlags.SOFT_STOP
+                and self._process_can_be_soft_stopped
+            ):
+                self.stop()
+                return False
+            return not control_flags & SharedControlFlags.STOP
+        if not self._is_pause_event_set():
+            self._execute_commands_of_iteration()
+        if self._is_soft_stop_event_set() and self._process_can_be_soft_stopped:
+            self.stop()
+        return not self._is_stop_event_set()
+
+    def _execute_commands_of_iteration(self) -> None:
+        try:
+            if self._input_item_handlers:
+                self._handle_items_from_input_queues()
+            self._commands_for_each_run_iteration()
+        except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
+            print_exception(e, "88a25177-b2a1-4bbb-ba92-bf5810594a99")
+            self._report_fatal_error(e)
+            self.stop()
+
+    def _finish_running(self) -> None:
+        """Perform the steps of run that happen after the loop is exited."""
+        try:
+            with self.trace_span("teardown"):
+                self._teardown_after_loop()
+        except Exception as e:  # pylint: disable=broad-except # The deliberate goal of this is to catch everything and put it into the error queue
+            print_exception(e, "bd9a8587-e79b-43cb-8ffe-0bf45740599d")
+            self._report_fatal_error(e)
+        if self._memory_monitor is not None:
+            self._memory_monitor.stop()
+        self._unregister_wakeup_queues()
+        if self._trace_events is not None:
+            self._report_trace_events()
 
     def _sleep_for_idle_time_during_iteration(
         self, start_timepoint_of_iteration: int
     ) -> None:
+        expected_wakeup_timepoint = self._expected_wakeup_timepoint_ns
+        if expected_wakeup_timepoint is not None:
+            # the start of this iteration was the first clock reading after the previous wait ended
+            self._sleep_overshoot_histogram.record_value(
+                start_timepoint_of_iteration - expected_wakeup_timepoint
+            )
+            self._expected_wakeup_timepoint_ns = None
         iteration_time_ns = calculate_iteration_time_ns(start_timepoint_of_iteration)
-
-        longest_iterations = self._longest_iterations
-        if len(longest_iterations) < 5:
-            longest_iterations.append(iteration_time_ns)
-        else:
-            min_longest_iteration = min(longest_iterations)
-            if iteration_time_ns > min_longest_iteration:
-                longest_iterations[
-                    longest_iterations.index(min_longest_iteration)
-                ] = iteration_time_ns
-
-        idle_time_ns = (
-            int(self.get_minimum_iteration_duration_seconds() * 10 ** 9)
-            - iteration_time_ns
+        if self._is_pause_requested():
+            # there is nothing to do until resumed, so block instead of waking up every iteration
+            self._record_iteration_performance(
+                iteration_time_ns, 0, start_timepoint_of_iteration + iteration_time_ns
+            )
+            self._wait_while_paused()
+            return
+        idle_time_ns = self._calculate_idle_time_ns(
+            start_timepoint_of_iteration, iteration_time_ns
         )
+        end_timepoint_of_iteration = start_timepoint_of_iteration + iteration_time_ns
         if idle_time_ns > 0:
-            self._idle_iteration_time_ns += idle_time_ns
+            if self._wakeup_receiver is None:
+                wakeup_timepoint = end_timepoint_of_iteration + idle_time_ns
+                self._wait_until(wakeup_timepoint, idle_time_ns)
+                self._expected_wakeup_timepoint_ns = wakeup_timepoint
+            else:
+                self._wait_for_wakeup(self._wakeup_receiver, idle_time_ns / 10 ** 9)
+                idle_time_ns = min(
+                    idle_time_ns, time.perf_counter_ns() - end_timepoint_of_iteration
+                )
+        else:
+            idle_time_ns = 0
+        self._record_iteration_performance(
+            iteration_time_ns, idle_time_ns, end_timepoint_of_iteration
+        )
+
+    def _wait_until(self, wakeup_timepoint_ns: int, idle_time_ns: int) -> None:
+        """Wait for the idle time using the wait strategy."""
+        wait_strategy = self._wait_strategy
+        if wait_strategy == "sleep":
             time.sleep(idle_time_ns / 10 ** 9)
+            return
+        perf_counter_ns = time.perf_counter_ns
+        if wait_strategy == "sleep_then_spin":
+            sleep_time_ns = idle_time_ns - self._spin_duration_ns
+            if sleep_time_ns > 0:
+                time.sleep(sleep_time_ns / 10 ** 9)
+            while perf_counter_ns() < wakeup_timepoint_ns:
+                pass
+            return
+        while perf_counter_ns() < wakeup_timepoint_ns:
+            time.sleep(0)  # releases the GIL and lets the OS schedule something else
+
+    def get_wait_strategy(self) -> str:
+        return self._wait_strategy
+
+    def _is_pause_requested(self) -> bool:
+        shared_control_flags = self._shared_control_flags
+        if shared_control_flags is None:
+            return self._is_pause_event_set()
+        return bool(shared_control_flags.get_flags() & SharedControlFlags.PAUSE)
+
+    def _is_waiting_for_resume(self) -> bool:
+        return (
+            self._is_pause_event_set()
+            and not self._is_stop_event_set()
+            and not self._is_soft_stop_event_set()
+        )
+
+    def _wait_while_paused(self) -> None:
+        """Block until resume, stop or soft_stop is called."""
+        start_timepoint_of_pause = time.perf_counter_ns()
+        pause_control_event = self._pause_control_event
+        while True:
+            # clear before checking so that a control method called after the check still ends the wait
+            pause_control_event.clear()
+            if not self._is_waiting_for_resume():
+                break
+            pause_control_event.wait()
+        self._finish_waiting_while_paused(start_timepoint_of_pause)
+
+    def _finish_waiting_while_paused(self, start_timepoint_of_pause: int) -> None:
+        paused_time_ns = time.perf_counter_ns() - start_timepoint_of_pause
+        self._paused_time_ns += paused_time_ns
+        trace_events = self._trace_events
+        if trace_events is not None:
+            trace_events.append(("pause", start_timepoint_of_pause, paused_time_ns))
+        # ticks that were due while paused are not late or missed, so start a new schedule
+        self._scheduled_timepoint_of_iteration_ns = None
+        if self._wakeup_receiver is not None:
+            # the control signals that ended the pause have already been handled
+            self._drain_wakeup_receiver(self._wakeup_receiver)
+
+    def _calculate_idle_time_ns(
+        self, start_timepoint_of_iteration: int, iteration_time_ns: int
+    ) -> int:
+        """Determine how long to idle for after an iteration.
+
+        Returns a negative value if the iteration overran its duration.
+        """
+        if self._use_adaptive_iteration_duration:
+            return self._adapt_iteration_duration() - iteration_time_ns
+        if self._fixed_rate_overrun_policy is None:
+            return (
+                int(self.get_minimum_iteration_duration_seconds() * 10 ** 9)
+                - iteration_time_ns
+            )
+        return self._advance_fixed_rate_schedule(
+            start_timepoint_of_iteration, iteration_time_ns
+        )
+
+    def _record_iteration_performance(
+        self,
+        iteration_time_ns: int,
+        idle_time_ns: int,
+        end_timepoint_of_iteration: int,
+    ) -> None:
+        self._iteration_time_histogram.record_value(iteration_time_ns)
+        self._idle_iteration_time_ns += idle_time_ns
+        if self._use_cpu_time_tracking:
+            self._cpu_time_during_iterations_ns += (
+                time.thread_time_ns() - self._thread_time_at_start_of_iteration_ns
+            )
+        trace_events = self._trace_events
+        if trace_events is not None:
+            trace_events.append(
+                (
+                    "iteration",
+                    end_timepoint_of_iteration - iteration_time_ns,
+                    iteration_time_ns,
+                )
+            )
+            if idle_time_ns > 0:
+                trace_events.append(("idle", end_timepoint_of_iteration, idle_time_ns))
+        if self._shared_performance_counters is not None:
+            self._shared_performance_counters.record_iteration(
+                iteration_time_ns, idle_time_ns, end_timepoint_of_iteration
+            )
+
+    def _advance_fixed_rate_schedule(
+        self, start_timepoint_of_iteration: int, iteration_time_ns: int
+    ) -> int:
+        """Record the lateness of this tick and schedule the next one.
+
+        Returns the time remaining until the next tick is due.
+        """
+        period_ns = int(self.get_minimum_iteration_duration_seconds() * 10 ** 9)
+        scheduled_timepoint = self._scheduled_timepoint_of_iteration_ns
+        if scheduled_timepoint is None:
+            scheduled_timepoint = start_timepoint_of_iteration
+        lateness_ns = start_timepoint_of_iteration - scheduled_timepoint
+        self._num_ticks += 1
+        self._total_tick_lateness_ns += lateness_ns
+        if lateness_ns > self._max_tick_lateness_ns:
+            self._max_tick_lateness_ns = lateness_ns
+
+        end_timepoint_of_iteration = start_timepoint_of_iteration + iteration_time_ns
+        next_scheduled_timepoint = scheduled_timepoint + period_ns
+        if end_timepoint_of_iteration > next_scheduled_timepoint:
+            if self._fixed_rate_overrun_policy == "skip":
+                num_missed_ticks = (
+                    end_timepoint_of_iteration - next_scheduled_timepoint
+                ) // period_ns + 1
+                self._num_missed_ticks += num_missed_ticks
+                next_scheduled_timepoint += num_missed_ticks * period_ns
+            elif self._fixed_rate_overrun_policy == "stretch":
+                next_scheduled_timepoint = end_timepoint_of_iteration
+            # when catching up, the missed ticks are left on the schedule so they run back-to-back
+        self._scheduled_timepoint_of_iteration_ns = next_scheduled_timepoint
+        return next_scheduled_timepoint - end_timepoint_of_iteration
+
+    def _adapt_iteration_duration(self) -> int:
+        """Shorten or lengthen the iteration duration based on the backlog.
+
+        Returns the new iteration duration.
+        """
+        ceiling_ns = int(self.get_minimum_iteration_duration_seconds() * 10 ** 9)
+        # durations this far below the ceiling are not worth sleeping for
+        floor_ns = ceiling_ns >> 6
+        duration_ns = self._adaptive_iteration_duration_ns
+        if self._get_backlog_size() > 0:
+            duration_ns >>= 1
+            if duration_ns < floor_ns:
+                duration_ns = 0
+        else:
+            duration_ns = min(ceiling_ns, max(duration_ns << 1, floor_ns, 1))
+        self._adaptive_iteration_duration_ns = duration_ns
+        self._total_adaptive_iteration_duration_ns += duration_ns
+        self._num_adaptive_iteration_durations += 1
+        return duration_ns
+
+    def _get_backlog_size(self) -> int:
+        """Return the amount of work waiting to be processed.
+
+        By default this is the total size of the queues registered using register_input_queue. This can be overridden by the subclass to report any other kind of pending work.
+        """
+        backlog_size = 0
+        for the_queue in self._input_queues:
+            if isinstance(the_queue, multiprocessing.queues.SimpleQueue):
+                backlog_size += 0 if the_queue.empty() else 1
+                continue
+            try:
+                backlog_size += the_queue.qsize()
+            except NotImplementedError:  # multiprocessing.Queue.qsize is not implemented on macOS
+                backlog_size += 0 if the_queue.empty() else 1
+        return backlog_size
+
+    def register_input_queue(
+        self,
+        the_queue: Union[
+            UnionOfThreadingAndMultiprocessingQueue, SimpleMultiprocessingQueue
+        ],
+        item_handler: Optional[Callable[[Any], None]] = None,
+    ) -> None:
+        """Declare a queue of work to be processed by the loop.
+
+        The size of the queue is included in the backlog used by the adaptive iteration duration, and if event driven wakeup is enabled the queue is also registered using register_wakeup_queue.
+
+        If an item handler is given, the loop will get items from the queue and pass them to it at the start of each iteration (before _commands_for_each_run_iteration is called), up to the limits set by max_input_items_per_iteration and max_input_item_handling_seconds_per_iteration. Queues are handled in the order they were registered.
+        """
+        self._input_queues.append(the_queue)
+        if item_handler is not None:
+            self._input_item_handlers.append((the_queue, item_handler))
+        if self.is_event_driven_wakeup_enabled():
+            self.register_wakeup_queue(the_queue)
+
+    def _handle_items_from_input_queues(self) -> None:
+        """Pass items to their handlers until the budget for this iteration is used."""
+        max_num_items = self._max_input_items_per_iteration
+        max_handling_ns = self._max_input_item_handling_ns_per_iteration
+        num_items_handled = 0
+        start_timepoint = time.perf_counter_ns()
+        timepoint_before_item = start_timepoint
+        for the_queue, item_handler in self._input_item_handlers:
+            while True:
+                if num_items_handled >= max_num_items or (
+                    max_handling_ns is not None
+                    and timepoint_before_item - start_timepoint >= max_handling_ns
+                ):
+                    # there may still be items left, so wait until they have been handled before allowing a soft stop
+                    self._process_can_be_soft_stopped = False
+                    return
+                if isinstance(the_queue, multiprocessing.queues.SimpleQueue):
+                    if the_queue.empty():
+                        break
+                    item = the_queue.get()
+                else:
+                    try:
+                        item = the_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                item_handler(item)
+                timepoint_after_item = time.perf_counter_ns()
+                self._input_item_handling_time_histogram.record_value(
+                    timepoint_after_item - timepoint_before_item
+                )
+                timepoint_before_item = timepoint_after_item
+                num_items_handled += 1
+                self._num_input_items_handled += 1
+
+    def _wait_for_wakeup(self, receiver: Connection, timeout_seconds: float) -> None:
+        """Block until a wakeup is triggered or the timeout has passed."""
+        connections_to_wait_on = [receiver]
+        if not self._is_pause_requested():
+            # while paused, items in the queues will not be processed, so only wake up for control signals
+            for the_queue in self._wakeup_threading_queues:
+                if not the_queue.empty():
+                    return
+            connections_to_wait_on.extend(self._wakeup_queue_readers)
+        if receiver in wait(connections_to_wait_on, timeout=timeout_seconds):
+            self._drain_wakeup_receiver(receiver)
+
+    def _drain_wakeup_receiver(self, receiver: Connection) -> None:
+        while receiver.poll():
+            receiver.recv_bytes()
+        # cleared only after draining: a wakeup skipped in between is not needed since the loop is already awake, and one sent in between only causes a spurious wakeup
+        cast(ctypes.c_bool, self._wakeup_pending).value = False
+
+    def _send_wakeup(self) -> None:
+        wakeup_pending = self._wakeup_pending
+        if wakeup_pending is None or wakeup_pending.value:
+            return
+        wakeup_pending.value = True
+        cast(Connection, self._wakeup_sender).send_bytes(b"")
+
+    def _unregister_wakeup_queues(self) -> None:
+        """Stop the threading queues from sending wakeups to this loop once it is no longer running."""
+        for the_queue in self._wakeup_threading_queues:
+            not_empty_condition = cast(_WakeupNotifyingCondition, the_queue.not_empty)
+            with not_empty_condition:
+                not_empty_condition.wakeup_callbacks.remove(self._send_wakeup)
+        self._wakeup_threading_queues = list()
+
+    def is_event_driven_wakeup_enabled(self) -> bool:
+        return self._wakeup_receiver is not None
+
+    def register_wakeup_queue(
+        self,
+        the_queue: Union[
+            queue.Queue[
+                Any
+            ],  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            multiprocessing.queues.Queue[
+                Any
+            ],  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            SimpleMultiprocessingQueue,
+        ],
+    ) -> None:
+        """Wake up the loop from its idle period when an item is put in the queue.
+
+        Requires use_event_driven_wakeup to have been enabled during init.
+
+        Queues must be registered before any other thread begins blocking on a get from them. A queue.Queue can be registered by multiple loops in the same process, and stops waking up this loop once the loop finishes running.
+        """
+        if self._wakeup_sender is None:
+            raise EventDrivenWakeupNotEnabledError()
+        if isinstance(
+            the_queue,
+            (multiprocessing.queues.Queue, multiprocessing.queues.SimpleQueue),
+        ):
+            # the underlying Connection is the only way to wait on multiple queues at once
+            self._wakeup_queue_readers.append(getattr(the_queue, "_reader"))
+            return
+        not_empty_condition = the_queue.not_empty
+        if not isinstance(not_empty_condition, _WakeupNotifyingCondition):
+            not_empty_condition = _WakeupNotifyingCondition(the_queue)
+            the_queue.not_empty = not_empty_condition
+        with not_empty_condition:
+            not_empty_condition.wakeup_callbacks.append(self._send_wakeup)
+        self._wakeup_threading_queues.append(the_queue)
 
     def _commands_for_each_run_iteration(self) -> None:
         """Execute additional commands inside the run loop."""
@@ -290,7 +1410,11 @@ class InfiniteLoopingParallelismMixIn:
             )
         stop_event = getattr(self, "_stop_event")
 
+        if self._shared_control_flags is not None:
+            self._shared_control_flags.set_flag(SharedControlFlags.STOP)
         stop_event.set()
+        self._pause_control_event.set()
+        self._send_wakeup()
 
     def soft_stop(self) -> None:
         """Stop the infinite loop when the process indicates it is OK to do so.
@@ -306,46 +1430,74 @@ class InfiniteLoopingParallelismMixIn:
             )
         soft_stop_event = getattr(self, "_soft_stop_event")
 
+        if self._shared_control_flags is not None:
+            self._shared_control_flags.set_flag(SharedControlFlags.SOFT_STOP)
         soft_stop_event.set()
+        self._pause_control_event.set()
+        self._send_wakeup()
 
     def hard_stop(self, timeout: Optional[float] = None) -> Dict[str, Any]:
         """Stop the infinite loop and drain all queues.
 
-        Timeout can be specified (in seconds) which will override waiting for process to tear itself down.
+        Timeout can be specified (in seconds) which will override waiting for process to tear itself down. Waiting blocks on the teardown complete event rather than polling it.
+
+        Queues registered using register_queue_to_drain and the fatal_error_reporter are drained together in a single pass.
 
         Items in queues will be returned in a dict
         """
         self.stop()
+        self._wait_for_teardown_after_stop(
+            None if timeout is None else time.perf_counter() + timeout
+        )
+        item_dict = self._drain_all_queues()
+        queues_to_drain = self.get_queues_to_drain()
+        queues_to_drain["fatal_error_reporter"] = self.get_fatal_error_reporter()
+        item_dict.update(bulk_drain_queues(queues_to_drain))
+        return item_dict
+
+    def _wait_for_teardown_after_stop(self, deadline: Optional[float]) -> None:
+        """Perform the steps of hard_stop between stopping and draining the queues.
+
+        Separate so that several loops can be stopped at once before waiting for any of them.
+
+        Args:
+            deadline: the perf_counter time to stop waiting at, or None to wait until teardown is complete.
+        """
         self._teardown_after_loop()
-        start_timepoint = time.perf_counter()
-        while True:
-            if timeout is not None:
-                elapsed_time = time.perf_counter() - start_timepoint
-                if elapsed_time > timeout:
+        while not self.is_teardown_complete():
+            remaining_seconds = None
+            if deadline is not None:
+                remaining_seconds = deadline - time.perf_counter()
+                if remaining_seconds <= 0:
                     break
-            if self.is_teardown_complete():
-                break
-
-        item_dict = self._drain_all_queues()
+            self._teardown_complete_event.wait(remaining_seconds)
 
-        error_queue = self.get_fatal_error_reporter()
-        error_items = list()
-        if isinstance(error_queue, SimpleMultiprocessingQueue):
-            while not error_queue.empty():
-                error_items.append(error_queue.get_nowait())
-        else:
-            while is_queue_eventually_not_empty(error_queue):
-                error_items.append(error_queue.get_nowait())
+    def get_queues_to_drain(
+        self,
+    ) -> Dict[
+        str,
+        Union[
+            UnionOfThreadingAndMultiprocessingQueue,
+            multiprocessing.queues.SimpleQueue[
+                Any
+            ],  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+        ],
+    ]:
+        """Get the queues registered using register_queue_to_drain."""
+        return dict(self._queues_to_drain)
 
-        item_dict["fatal_error_reporter"] = error_items
-        return item_dict
+    def register_queue_to_drain(
+        self, name: str, the_queue: UnionOfThreadingAndMultiprocessingQueue
+    ) -> None:
+        """Include the queue in the items returned by hard_stop."""
+        self._queues_to_drain[name] = the_queue
 
     def _drain_all_queues(self) -> Dict[str, Any]:
         """Drain all queues of the process except the fatal_error_reporter.
 
         fatal_error_reporter will always be drained by hard_stop.
 
-        This method should be overriden by subclasses implementations
+        This method can be overriden by subclasses implementations to drain queues that need special handling. Queues that only need to be emptied should be registered using register_queue_to_drain instead, so that they are drained together with all other queues.
         """
         # pylint:disable=no-self-use # Tanner (5/12/20): this is needed so method signature matches subclass implementation
         return dict()
@@ -414,6 +1566,8 @@ class InfiniteLoopingParallelismMixIn:
     def pause(self) -> None:
         """Have the infinite loop skip executing commands.
 
+        While paused, the loop blocks until resume, stop or soft_stop is called instead of waking up every iteration. Time spent blocked is reported as paused_time_ns by reset_performance_tracker and is excluded from percent_use.
+
         This is typically useful during integration testing scenarios.
         """
         if not hasattr(self, "_pause_event"):
@@ -422,7 +1576,10 @@ class InfiniteLoopingParallelismMixIn:
             )
         pause_event = getattr(self, "_pause_event")
 
+        if self._shared_control_flags is not None:
+            self._shared_control_flags.set_flag(SharedControlFlags.PAUSE)
         pause_event.set()
+        self._send_wakeup()
 
     def resume(self) -> None:
         """Have the infinite loop resume executing commands.
@@ -435,7 +1592,13 @@ class InfiniteLoopingParallelismMixIn:
             )
         pause_event = getattr(self, "_pause_event")
 
+        # the heartbeat stopped while paused, so restart it before unpausing to avoid the loop appearing stalled until its next iteration
+        self._record_heartbeat(time.perf_counter_ns())
+        if self._shared_control_flags is not None:
+            self._shared_control_flags.clear_flag(SharedControlFlags.PAUSE)
         pause_event.clear()
+        self._pause_control_event.set()
+        self._send_wakeup()
 
     def is_paused(self) -> bool:
         """Check if framework is paused."""
@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+"""Constant-memory data structures for tracking loop performance.
+
+This module should not need to import from any other modules in
+stdlib_utils.
+"""
+from __future__ import annotations
+
+from bisect import bisect_left
+from collections import deque
+import ctypes
+import math
+from multiprocessing.sharedctypes import RawArray
+import time
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+REPORTED_PERCENTILES = (("p50", 50.0), ("p90", 90.0), ("p99", 99.0), ("p99.9", 99.9))
+SHARED_PERFORMANCE_COUNTER_NAMES = (
+    "start_timepoint_ns",
+    "last_update_timepoint_ns",
+    "num_iterations",
+    "total_iteration_time_ns",
+    "total_idle_time_ns",
+    "last_iteration_time_ns",
+    "max_iteration_time_ns",
+    "num_fatal_errors",
+)
+# upper bounds (inclusive) of the buckets SharedPerformanceCounters counts iteration times in, followed by a bucket for everything longer
+SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS = (
+    10_000,
+    100_000,
+    1_000_000,
+    2_500_000,
+    5_000_000,
+    10_000_000,
+    25_000_000,
+    50_000_000,
+    100_000_000,
+    250_000_000,
+    500_000_000,
+    1_000_000_000,
+    2_500_000_000,
+    5_000_000_000,
+    10_000_000_000,
+)
+# name to report and the field of /proc/self/task/<tid>/status
+THREAD_CONTEXT_SWITCH_FIELDS = (
+    ("voluntary_context_switches", "voluntary_ctxt_switches"),
+    ("involuntary_context_switches", "nonvoluntary_ctxt_switches"),
+)
+# name to report and the index of the field of /proc/self/task/<tid>/stat, counting from the field after the command name (which may contain spaces)
+THREAD_PAGE_FAULT_FIELDS = (("minor_page_faults", 7), ("major_page_faults", 9))
+EXPONENTIALLY_WEIGHTED_AVERAGE_WINDOWS = (
+    ("ewma_1_minute", 60),
+    ("ewma_5_minute", 300),
+    ("ewma_15_minute", 900),
+)
+
+
+class LogBucketedHistogram:
+    """Histogram of non-negative integers using log-spaced buckets.
+
+    Similar to an HDR histogram: values below 2**sub_bucket_bits are counted exactly, and larger values are grouped into buckets whose width is proportional to their magnitude so that the relative error of any reported value is at most 2**(1 - sub_bucket_bits). Memory is fixed at construction and recording a value is O(1).
+
+    Args:
+        sub_bucket_bits: the precision of the histogram. The default of 5 gives a relative error of at most ~6%.
+        max_value_bits: values of 2**max_value_bits or greater are counted in the highest bucket. The default of 40 covers about 18 minutes when recording nanoseconds.
+    """
+
+    def __init__(self, sub_bucket_bits: int = 5, max_value_bits: int = 40) -> None:
+        self._sub_bucket_bits = sub_bucket_bits
+        self._sub_bucket_count = 1 << sub_bucket_bits
+        self._half_sub_bucket_count = self._sub_bucket_count >> 1
+        self._counts: List[int] = [0] * (
+            self._sub_bucket_count
+            + (max_value_bits - sub_bucket_bits) * self._half_sub_bucket_count
+        )
+        self._last_index = len(self._counts) - 1
+        self._total_count = 0
+        self._sum_of_values = 0
+        self._max_value = 0
+
+    def record_value(self, value: int) -> None:
+        if value < 0:
+            value = 0
+        if value > self._max_value:
+            self._max_value = value
+        if value < self._sub_bucket_count:
+            index = value
+        else:
+            shift = value.bit_length() - self._sub_bucket_bits
+            index = (
+                self._sub_bucket_count
+                + (shift - 1) * self._half_sub_bucket_count
+                + (value >> shift)
+                - self._half_sub_bucket_count
+            )
+            if index > self._last_index:
+                index = self._last_index
+        self._counts[index] += 1
+        self._total_count += 1
+        self._sum_of_values += value
+
+    def _get_bucket_bounds(self, index: int) -> Tuple[int, int]:
+        """Return the lowest and highest values counted by a bucket."""
+        if index < self._sub_bucket_count:
+            return index, index
+        offset = index - self._sub_bucket_count
+        shift = offset // self._half_sub_bucket_count + 1
+        top_bits = offset % self._half_sub_bucket_count + self._half_sub_bucket_count
+        return top_bits << shift, ((top_bits + 1) << shift) - 1
+
+    def get_total_count(self) -> int:
+        return self._total_count
+
+    def get_sum_of_values(self) -> int:
+        return self._sum_of_values
+
+    def get_max_value(self) -> int:
+        return self._max_value
+
+    def get_mean(self) -> Optional[float]:
+        if self._total_count == 0:
+            return None
+        return self._sum_of_values / self._total_count
+
+    def get_value_at_percentile(self, percentile: float) -> Optional[int]:
+        """Return the highest value equivalent to the given percentile.
+
+        The result is never greater than the maximum recorded value.
+        """
+        if self._total_count == 0:
+            return None
+        target_count = min(
+            self._total_count,
+            max(1, math.ceil(self._total_count * percentile / 100)),
+        )
+        index = 0
+        cumulative_count = self._counts[0]
+        while cumulative_count < target_count:
+            index += 1
+            cumulative_count += self._counts[index]
+        return min(self._get_bucket_bounds(index)[1], self.get_max_value())
+
+    def get_percentiles(self) -> Dict[str, Optional[int]]:
+        """Return the standard set of reported percentiles and the max."""
+        percentiles = {
+            name: self.get_value_at_percentile(percentile)
+            for name, percentile in REPORTED_PERCENTILES
+        }
+        percentiles["max"] = self.get_max_value() if self._total_count else None
+        return percentiles
+
+    def get_nonzero_buckets(self) -> List[Tuple[int, int, int]]:
+        """Return (lowest value, highest value, count) of each used bucket."""
+        return [
+            (*self._get_bucket_bounds(index), count)
+            for index, count in enumerate(self._counts)
+            if count > 0
+        ]
+
+
+class RunningStatistics:
+    """Summary statistics of a stream of values in constant memory.
+
+    Max/min/mean/stdev are maintained online using Welford's algorithm, the most recent values are kept in a ring buffer, and exponentially weighted averages over 1, 5 and 15 minutes are updated the same way as system load averages. All queries are O(1).
+
+    Args:
+        num_recent_values_to_keep: the size of the ring buffer of recent values.
+    """
+
+    def __init__(self, num_recent_values_to_keep: int = 1000) -> None:
+        self._recent_values: Deque[float] = deque(maxlen=num_recent_values_to_keep)
+        self._count = 0
+        self._mean = 0.0
+        self._sum_of_squared_differences = 0.0
+        self._min: Optional[float] = None
+        self._max: Optional[float] = None
+        self._exponentially_weighted_averages: Dict[str, Optional[float]] = {
+            name: None for name, _ in EXPONENTIALLY_WEIGHTED_AVERAGE_WINDOWS
+        }
+
+    def add_value(self, value: float, elapsed_seconds: float) -> None:
+        """Add a value that summarizes the given period of time.
+
+        The elapsed time is used to weight the value in the
+        exponentially weighted averages.
+        """
+        self._recent_values.append(value)
+        self._count += 1
+        difference_from_old_mean = value - self._mean
+        self._mean += difference_from_old_mean / self._count
+        self._sum_of_squared_differences += difference_from_old_mean * (
+            value - self._mean
+        )
+        if self._min is None or value < self._min:
+            self._min = value
+        if self._max is None or value > self._max:
+            self._max = value
+        averages = self._exponentially_weighted_averages
+        for name, window_seconds in EXPONENTIALLY_WEIGHTED_AVERAGE_WINDOWS:
+            previous_average = averages[name]
+            if previous_average is None:
+                averages[name] = value
+                continue
+            weight = 1 - math.exp(-elapsed_seconds / window_seconds)
+            averages[name] = previous_average + weight * (value - previous_average)
+
+    def get_recent_values(self) -> Deque[float]:
+        return self._recent_values
+
+    def get_count(self) -> int:
+        return self._count
+
+    def get_stdev(self) -> float:
+        """Return the sample standard deviation.
+
+        Returns 0 if fewer than two values have been added.
+        """
+        if self._count < 2:
+            return 0.0
+        return math.sqrt(self._sum_of_squared_differences / (self._count - 1))
+
+    def get_metrics(self) -> Dict[str, Optional[float]]:
+        metrics: Dict[str, Optional[float]] = {
+            "max": self._max,
+            "min": self._min,
+            "stdev": self.get_stdev(),
+            "mean": self._mean if self._count else None,
+        }
+        metrics.update(self._exponentially_weighted_averages)
+        return metrics
+
+
+class SharedPerformanceCounters:
+    """Cumulative loop performance counters stored in shared memory.
+
+    The loop updates the counters in place each iteration, and any thread or process holding a reference (passed to the child when it is started) can read a consistent snapshot at any time without pickling or messages. Consistency is provided by a sequence lock: the writer increments a sequence number before and after updating, and readers retry if the number was odd or changed while they were copying.
+
+    Counters are never reset, so the usage over any period can be computed from two snapshots using calculate_percent_use. Iteration times are also counted in the fixed buckets of SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS, which are likewise never reset.
+    """
+
+    def __init__(self) -> None:
+        # index 0 holds the sequence number, followed by the named counters and then the iteration time buckets
+        self._values = RawArray(
+            ctypes.c_int64,
+            1
+            + len(SHARED_PERFORMANCE_COUNTER_NAMES)
+            + len(SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS)
+            + 1,
+        )
+
+    def mark_start(self, timepoint_ns: int) -> None:
+        values = self._values
+        values[0] += 1
+        values[1] = timepoint_ns
+        values[2] = timepoint_ns
+        values[0] += 1
+
+    def record_iteration(
+        self, iteration_time_ns: int, idle_time_ns: int, timepoint_ns: int
+    ) -> None:
+        values = self._values
+        values[0] += 1
+        values[2] = timepoint_ns
+        values[3] += 1
+        values[4] += iteration_time_ns
+        values[5] += idle_time_ns
+        values[6] = iteration_time_ns
+        if iteration_time_ns > values[7]:
+            values[7] = iteration_time_ns
+        values[
+            1
+            + len(SHARED_PERFORMANCE_COUNTER_NAMES)
+            + bisect_left(SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS, iteration_time_ns)
+        ] += 1
+        values[0] += 1
+
+    def record_fatal_error(self) -> None:
+        values = self._values
+        values[0] += 1
+        values[8] += 1
+        values[0] += 1
+
+    def _read_values(self) -> List[int]:
+        values = self._values
+        while True:
+            sequence_number = values[0]
+            snapshot = values[1:]
+            if sequence_number % 2 == 0 and values[0] == sequence_number:
+                return snapshot
+            time.sleep(0)  # a write is in progress, so yield to let it finish
+
+    def get_snapshot(self) -> Dict[str, int]:
+        return dict(zip(SHARED_PERFORMANCE_COUNTER_NAMES, self._read_values()))
+
+    def get_snapshot_with_iteration_time_buckets(
+        self,
+    ) -> Tuple[Dict[str, int], List[int]]:
+        """Get a snapshot of the counters and the iteration time buckets taken at the same time.
+
+        The bucket counts are in the order of SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS and are not cumulative. The last one counts the iterations longer than all the bounds.
+        """
+        values = self._read_values()
+        num_counters = len(SHARED_PERFORMANCE_COUNTER_NAMES)
+        return (
+            dict(zip(SHARED_PERFORMANCE_COUNTER_NAMES, values[:num_counters])),
+            values[num_counters:],
+        )
+
+    @staticmethod
+    def calculate_percent_use(
+        earlier_snapshot: Dict[str, int], later_snapshot: Dict[str, int]
+    ) -> Optional[float]:
+        """Calculate the percent of time spent not idle between snapshots.
+
+        Returns None if no iterations completed in between.
+        """
+        busy_time_ns = (
+            later_snapshot["total_iteration_time_ns"]
+            - earlier_snapshot["total_iteration_time_ns"]
+        )
+        idle_time_ns = (
+            later_snapshot["total_idle_time_ns"]
+            - earlier_snapshot["total_idle_time_ns"]
+        )
+        if busy_time_ns + idle_time_ns == 0:
+            return None
+        return 100 * busy_time_ns / (busy_time_ns + idle_time_ns)
+
+
+def get_thread_resource_usage(native_thread_id: int) -> Optional[Dict[str, int]]:
+    """Get the context switch and page fault counters of a thread of this process.
+
+    Read from /proc/self/task/<native_thread_id>/status and stat, so the thread does not need to be the calling one. Returns None if the counters are not available (anything other than Linux).
+    """
+    task_dir = f"/proc/self/task/{native_thread_id}"
+    try:
+        with open(f"{task_dir}/status") as status_file:
+            status_values = dict(
+                line.split(":", 1) for line in status_file.read().splitlines()
+            )
+        with open(f"{task_dir}/stat") as stat_file:
+            stat_values = stat_file.read().rpartition(")")[2].split()
+        usage = {
+            name: int(status_values[field])
+            for name, field in THREAD_CONTEXT_SWITCH_FIELDS
+        }
+        usage.update(
+            (name, int(stat_values[index])) for name, index in THREAD_PAGE_FAULT_FIELDS
+        )
+    except (OSError, KeyError, IndexError, ValueError):
+        return None
+    return usage
+
+
+def get_thread_scheduler_stats(native_thread_id: int) -> Optional[Dict[str, int]]:
+    """Get the time a thread of this process has spent on a CPU and runnable but waiting for one.
+
+    Read from /proc/self/task/<native_thread_id>/schedstat, so the thread does not need to be the calling one. Returns None if the scheduler statistics are not available (anything other than Linux, or a kernel without schedstats).
+    """
+    try:
+        with open(f"/proc/self/task/{native_thread_id}/schedstat") as schedstat_file:
+            on_cpu_time_ns, run_queue_wait_time_ns, _ = (
+                int(value) for value in schedstat_file.read().split()
+            )
+    except (OSError, ValueError):
+        return None
+    return {
+        "on_cpu_time_ns": on_cpu_time_ns,
+        "run_queue_wait_time_ns": run_queue_wait_time_ns,
+    }
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+"""A pool of InfiniteProcess workers sharing input and output queues."""
+from __future__ import annotations
+
+import multiprocessing
+from multiprocessing.context import BaseContext
+import multiprocessing.queues
+import time
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Union
+
+from .constants import UnionOfThreadingAndMultiprocessingQueue
+from .exceptions import UnrecognizedWorkDistributionStrategyError
+from .misc import get_formatted_stack_trace
+from .multiprocessing_utils import InfiniteProcess
+from .performance_tracking import SharedPerformanceCounters
+from .queue_utils import bulk_drain_queues
+from .threading_utils import InfiniteThread
+
+WORK_DISTRIBUTION_STRATEGIES = ("round_robin", "key_hash", "least_loaded")
+
+
+class _InfiniteProcessPoolDispatcher(InfiniteThread):
+    """Moves items from the pool's input queue to the input queues of the workers."""
+
+    def __init__(
+        self,
+        input_queue: multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ],
+        workers: List[InfiniteProcess],
+        worker_input_queues: List[
+            multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+                Any
+            ]
+        ],
+        fatal_error_reporter: multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ],
+        distribution_strategy: str,
+        key_function: Optional[Callable[[Any], Hashable]],
+        minimum_iteration_duration_seconds: float,
+    ) -> None:
+        super().__init__(
+            fatal_error_reporter,  # type: ignore[arg-type] # errors are reported in the same format as the workers so they can all be merged into one queue
+            minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+            use_event_driven_wakeup=True,
+        )
+        self._workers = workers
+        self._worker_input_queues = worker_input_queues
+        self._distribution_strategy = distribution_strategy
+        self._key_function = key_function
+        self._num_workers = len(workers)
+        self._next_worker_index = 0
+        self._earlier_snapshots: List[Dict[str, int]] = list()
+        self._worker_loads: List[float] = [0.0] * self._num_workers
+        self._num_items_since_snapshots: List[int] = [0] * self._num_workers
+        self._are_worker_input_queues_flushed = False
+        self.register_input_queue(input_queue, item_handler=self._dispatch_item)
+
+    def _report_fatal_error(self, the_err: Exception) -> None:
+        self._count_fatal_error()
+        self._fatal_error_reporter.put_nowait(
+            (the_err, get_formatted_stack_trace(the_err))  # type: ignore[arg-type] # the pool always gives the dispatcher a multiprocessing.Queue
+        )
+
+    def _commands_for_each_run_iteration(self) -> None:
+        if self._distribution_strategy == "least_loaded":
+            self._refresh_worker_loads()
+
+    def _refresh_worker_loads(self) -> None:
+        """Update the percent use of each worker since the last refresh."""
+        later_snapshots = [
+            worker.get_shared_performance_counters_snapshot()
+            for worker in self._workers
+        ]
+        if self._earlier_snapshots:
+            for index, (earlier, later) in enumerate(
+                zip(self._earlier_snapshots, later_snapshots)
+            ):
+                percent_use = SharedPerformanceCounters.calculate_percent_use(
+                    earlier, later
+                )
+                if percent_use is not None:
+                    self._worker_loads[index] = percent_use
+        self._earlier_snapshots = later_snapshots
+        self._num_items_since_snapshots = [0] * self._num_workers
+
+    def _choose_worker_index(self, item: Any) -> int:
+        if self._key_function is not None:
+            return hash(self._key_function(item)) % self._num_workers
+        if self._distribution_strategy == "least_loaded":
+            # items already sent since the last refresh count against a worker, so that a burst is not all sent to the same one
+            return min(
+                range(self._num_workers),
+                key=lambda index: (self._worker_loads[index] + 1)
+                * (self._num_items_since_snapshots[index] + 1),
+            )
+        index = self._next_worker_index
+        self._next_worker_index = (index + 1) % self._num_workers
+        return index
+
+    def _dispatch_item(self, item: Any) -> None:
+        index = self._choose_worker_index(item)
+        self._num_items_since_snapshots[index] += 1
+        self._worker_input_queues[index].put_nowait(item)
+
+    def are_worker_input_queues_flushed(self) -> bool:
+        return self._are_worker_input_queues_flushed
+
+    def _teardown_after_loop(self) -> None:
+        if self.is_preparing_for_soft_stop():
+            # every item has been dispatched, so make sure they have all actually been sent through the pipes before the workers check whether their queues are empty
+            for the_queue in self._worker_input_queues:
+                the_queue.close()
+                the_queue.join_thread()
+            self._are_worker_input_queues_flushed = True
+            for worker in self._workers:
+                worker.soft_stop()
+        super()._teardown_after_loop()
+
+
+class InfiniteProcessPool:
+    """Group of InfiniteProcess workers that behave as a single stage.
+
+    Items put into the pool's input queue are distributed to the workers by a dispatcher thread in the parent process. All workers share a single output queue and a single fatal error reporter, so outputs and errors are merged.
+
+    The worker class must accept (input_queue, output_queue, fatal_error_reporter) as its first three arguments and pass any keyword arguments through to InfiniteProcess.
+
+    Args:
+        worker_class: the InfiniteProcess subclass to start.
+        num_workers: how many workers to start. Defaults to the number of CPUs.
+        distribution_strategy: 'round_robin' sends items to each worker in turn, 'key_hash' sends all items with the same key to the same worker, and 'least_loaded' sends items to the worker with the lowest recent percent use.
+        key_function: required for 'key_hash'. Called on each item to get the key to hash.
+        worker_kwargs: additional keyword arguments passed to each worker.
+        dispatcher_iteration_duration_seconds: the minimum iteration duration of the dispatcher. Items are dispatched as soon as they arrive regardless of this, but the least loaded strategy refreshes the load of each worker at this interval.
+        context: the multiprocessing context used to create the queues and start the workers (e.g. ProcessLauncher.get_context()). Defaults to the default context.
+    """
+
+    def __init__(
+        self,
+        worker_class: Callable[..., InfiniteProcess],
+        num_workers: Optional[int] = None,
+        distribution_strategy: str = "round_robin",
+        key_function: Optional[Callable[[Any], Hashable]] = None,
+        worker_kwargs: Optional[Dict[str, Any]] = None,
+        dispatcher_iteration_duration_seconds: float = 0.1,
+        context: Optional[BaseContext] = None,
+    ) -> None:
+        if distribution_strategy not in WORK_DISTRIBUTION_STRATEGIES:
+            raise UnrecognizedWorkDistributionStrategyError(distribution_strategy)
+        if distribution_strategy == "key_hash" and key_function is None:
+            raise NotImplementedError(
+                "A key_function must be given to use the key_hash distribution strategy."
+            )
+        if num_workers is None:
+            num_workers = multiprocessing.cpu_count()
+        if context is None:
+            context = multiprocessing.get_context()
+        worker_kwargs = dict(worker_kwargs or dict(), context=context)
+        if distribution_strategy == "least_loaded":
+            worker_kwargs = dict(worker_kwargs, use_shared_performance_counters=True)
+        self._distribution_strategy = distribution_strategy
+        self._input_queue: multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ] = context.Queue()
+        self._output_queue: multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ] = context.Queue()
+        self._fatal_error_reporter: multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ] = context.Queue()
+        self._worker_input_queues: List[
+            multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+                Any
+            ]
+        ] = [context.Queue() for _ in range(num_workers)]
+        self._workers: List[InfiniteProcess] = [
+            worker_class(
+                worker_input_queue,
+                self._output_queue,
+                self._fatal_error_reporter,
+                **worker_kwargs,
+            )
+            for worker_input_queue in self._worker_input_queues
+        ]
+        self._dispatcher = _InfiniteProcessPoolDispatcher(
+            self._input_queue,
+            self._workers,
+            self._worker_input_queues,
+            self._fatal_error_reporter,
+            distribution_strategy,
+            key_function if distribution_strategy == "key_hash" else None,
+            dispatcher_iteration_duration_seconds,
+        )
+
+    def get_input_queue(
+        self,
+    ) -> multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+        Any
+    ]:
+        return self._input_queue
+
+    def get_output_queue(
+        self,
+    ) -> multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+        Any
+    ]:
+        return self._output_queue
+
+    def get_fatal_error_reporter(
+        self,
+    ) -> multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+        Any
+    ]:
+        return self._fatal_error_reporter
+
+    def get_worker_input_queues(
+        self,
+    ) -> List[
+        multiprocessing.queues.Queue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+            Any
+        ]
+    ]:
+        return self._worker_input_queues
+
+    def get_workers(self) -> List[InfiniteProcess]:
+        return self._workers
+
+    def get_distribution_strategy(self) -> str:
+        return self._distribution_strategy
+
+    def start(self) -> None:
+        for worker in self._workers:
+            worker.start()
+        self._dispatcher.start()
+
+    def is_alive(self) -> bool:
+        return self._dispatcher.is_alive() or any(
+            worker.is_alive() for worker in self._workers
+        )
+
+    def soft_stop(self) -> None:
+        """Stop once every item in the input queue has been handled.
+
+        The dispatcher stops once the pool's input queue is empty, and then soft stops each worker.
+        """
+        self._dispatcher.soft_stop()
+
+    def stop(self) -> None:
+        self._dispatcher.stop()
+        for worker in self._workers:
+            worker.stop()
+
+    def join(self, timeout: Optional[float] = None) -> None:
+        """Wait for the dispatcher and every worker to exit."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        self._dispatcher.join(timeout)
+        for worker in self._workers:
+            worker.join(
+                None if deadline is None else max(deadline - time.perf_counter(), 0)
+            )
+
+    def hard_stop(self, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Stop the dispatcher and all workers and drain all queues.
+
+        Items that were never handled by a worker (whether still in the pool's input queue or already dispatched) are returned under 'input_queue'. Any other items the hard_stop of each worker would return are returned under 'worker_<index>'.
+
+        The dispatcher and every worker are stopped before waiting for any of them, and all queues (including the shared fatal error reporter) are then drained together in a single pass, so the time taken does not grow with the number of workers.
+        """
+        # pylint: disable=protected-access # the pool performs the steps of hard_stop of its dispatcher and workers together
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        self.stop()
+        self._dispatcher._wait_for_teardown_after_stop(deadline)
+        for worker in self._workers:
+            worker._wait_for_teardown_after_stop(deadline)
+        item_dict: Dict[str, Any] = dict()
+        worker_queue_names: Dict[str, Tuple[int, str]] = dict()
+        queues_to_drain: Dict[
+            str,
+            Union[
+                UnionOfThreadingAndMultiprocessingQueue,
+                multiprocessing.queues.SimpleQueue[  # pylint: disable=unsubscriptable-object # Eli (3/12/20) not sure why pylint doesn't recognize this type annotation
+                    Any
+                ],
+            ],
+        ] = {
+            "input_queue": self._input_queue,
+            "output_queue": self._output_queue,
+            "fatal_error_reporter": self._fatal_error_reporter,
+        }
+        if not self._dispatcher.are_worker_input_queues_flushed():
+            # once flushed, the queues are closed in this process and every item in them was handed to a worker that was soft stopped
+            for index, the_queue in enumerate(self._worker_input_queues):
+                queues_to_drain[f"worker_input_queue_{index}"] = the_queue
+        worker_items: List[Dict[str, Any]] = list()
+        for index, worker in enumerate(self._workers):
+            worker_items.append(worker._drain_all_queues())
+            for name, worker_queue in worker.get_queues_to_drain().items():
+                queue_key = f"worker_{index}_queue_{name}"
+                queues_to_drain[queue_key] = worker_queue
+                worker_queue_names[queue_key] = (index, name)
+        drained_items = bulk_drain_queues(queues_to_drain)
+        for index in range(len(self._worker_input_queues)):
+            drained_items["input_queue"].extend(
+                drained_items.pop(f"worker_input_queue_{index}", [])
+            )
+        for queue_key, (index, name) in worker_queue_names.items():
+            worker_items[index][name] = drained_items.pop(queue_key)
+        for index, items in enumerate(worker_items):
+            if items:
+                item_dict[f"worker_{index}"] = items
+        item_dict.update(drained_items)
+        return item_dict
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Sampling the stacks of running loops to see where their time is spent."""
+from __future__ import annotations
+
+import sys
+import threading
+from types import CodeType
+from types import FrameType
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+TRUNCATED_STACK_ROOT_NAME = "[truncated]"
+
+
+class StackSampleAggregator:
+    """Count how many times each stack was sampled.
+
+    Stacks are stored in the folded format used by flamegraph.pl, speedscope and similar tools: the name of each frame from the outermost to the innermost, separated by semicolons. Memory use is bounded: only the innermost max_stack_depth frames of a stack are kept, and once max_num_stacks different stacks have been seen, samples of any new stack are dropped and counted instead.
+
+    Args:
+        max_stack_depth: the maximum number of frames to keep from each stack.
+        max_num_stacks: the maximum number of different stacks to keep.
+    """
+
+    def __init__(self, max_stack_depth: int = 100, max_num_stacks: int = 10000) -> None:
+        self._max_stack_depth = max_stack_depth
+        self._max_num_stacks = max_num_stacks
+        self._stack_counts: Dict[str, int] = dict()
+        self._num_dropped_samples = 0
+        # formatting the name of a frame is the most expensive part of a sample, so it is done once per function
+        self._frame_names: Dict[CodeType, str] = dict()
+
+    def _get_frame_name(self, code: CodeType) -> str:
+        frame_name = self._frame_names.get(code)
+        if frame_name is None:
+            frame_name = f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+            self._frame_names[code] = frame_name
+        return frame_name
+
+    def add_sample(self, frame: Optional[FrameType]) -> None:
+        """Count the stack ending at the frame."""
+        frame_names: List[str] = list()
+        while frame is not None:
+            if len(frame_names) == self._max_stack_depth:
+                frame_names.append(TRUNCATED_STACK_ROOT_NAME)
+                break
+            frame_names.append(self._get_frame_name(frame.f_code))
+            frame = frame.f_back
+        frame_names.reverse()
+        stack = ";".join(frame_names)
+        stack_counts = self._stack_counts
+        if stack in stack_counts:
+            stack_counts[stack] += 1
+        elif len(stack_counts) < self._max_num_stacks:
+            stack_counts[stack] = 1
+        else:
+            self._num_dropped_samples += 1
+
+    def get_folded_stacks(self) -> Dict[str, int]:
+        """Get the number of samples of each stack."""
+        return dict(self._stack_counts)
+
+    def get_num_dropped_samples(self) -> int:
+        return self._num_dropped_samples
+
+
+class ThreadStackSampler(threading.Thread):
+    """Thread that periodically samples the stack of another thread.
+
+    Samples are taken using sys._current_frames, so the sampled thread does not need to cooperate and is sampled whether it is running, waiting or idle. The cost to the sampled thread is only the time this thread holds the GIL while taking a sample.
+
+    Args:
+        thread: the thread to sample. Sampling stops once it exits.
+        sampling_interval_seconds: how long to wait between samples.
+        aggregator: where to count the samples. Defaults to a new StackSampleAggregator.
+    """
+
+    def __init__(
+        self,
+        thread: threading.Thread,
+        sampling_interval_seconds: Union[float, int] = 0.01,
+        aggregator: Optional[StackSampleAggregator] = None,
+    ) -> None:
+        super().__init__(daemon=True)
+        self._thread = thread
+        self._sampling_interval_seconds = sampling_interval_seconds
+        if aggregator is None:
+            aggregator = StackSampleAggregator()
+        self._aggregator = aggregator
+        self._stop_sampling_event = threading.Event()
+
+    def get_aggregator(self) -> StackSampleAggregator:
+        return self._aggregator
+
+    def run(self) -> None:
+        thread = self._thread
+        aggregator = self._aggregator
+        while not self._stop_sampling_event.wait(self._sampling_interval_seconds):
+            frames = (
+                sys._current_frames()  # pylint: disable=protected-access # this is the only way to get the frame of another thread
+            )
+            # idents are reused once a thread exits, so the frames only belong to the thread if it was still alive after they were taken
+            if not thread.is_alive():
+                break
+            frame = frames.get(thread.ident)  # type: ignore[arg-type] # a thread that is alive has an ident
+            if frame is not None:
+                aggregator.add_sample(frame)
+
+    def stop(self) -> Dict[str, int]:
+        """Stop sampling and return the folded stacks."""
+        self._stop_sampling_event.set()
+        self.join()
+        return self._aggregator.get_folded_stacks()
+
+
+def write_folded_stacks_file(file_path: str, folded_stacks: Dict[str, int]) -> None:
+    """Write the folded stacks to a file, one stack and its count per line.
+
+    The file can be turned into a flame graph by flamegraph.pl or opened in https://www.speedscope.app.
+    """
+    with open(file_path, "w") as folded_stacks_file:
+        for stack, count in sorted(folded_stacks.items()):
+            folded_stacks_file.write(f"{stack} {count}\n")
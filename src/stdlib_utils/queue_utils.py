@@ -7,6 +7,8 @@ stdlib_utils.
 from __future__ import annotations
 
 import multiprocessing
+from multiprocessing.connection import wait
+from multiprocessing.context import BaseContext
 import multiprocessing.queues
 import queue
 from queue import Empty
@@ -14,7 +16,9 @@ from queue import Queue
 import time
 from time import process_time
 from typing import Any
+from typing import Dict
 from typing import List
+from typing import Optional
 from typing import Union
 
 from .constants import QUEUE_CHECK_TIMEOUT_SECONDS
@@ -156,14 +160,68 @@ def drain_queue(
     return queue_items
 
 
+def _get_all_items_without_blocking(
+    the_queue: Union[
+        UnionOfThreadingAndMultiprocessingQueue, multiprocessing.queues.SimpleQueue[Any]
+    ],
+    queue_items: List[Any],
+) -> None:
+    if isinstance(the_queue, multiprocessing.queues.SimpleQueue):
+        while not the_queue.empty():
+            queue_items.append(the_queue.get())
+        return
+    while True:
+        try:
+            queue_items.append(the_queue.get_nowait())
+        except Empty:
+            return
+
+
+def bulk_drain_queues(
+    queues: Dict[
+        str,
+        Union[
+            UnionOfThreadingAndMultiprocessingQueue,
+            multiprocessing.queues.SimpleQueue[Any],
+        ],
+    ],
+    grace_period_seconds: Union[float, int] = QUEUE_CHECK_TIMEOUT_SECONDS,
+) -> Dict[str, List[Any]]:
+    """Drain several queues at once without polling each item.
+
+    Items already in the queues are removed immediately. A multiprocessing.Queue uses a background feeder thread, so items put into it just before draining may not be visible yet. For those queues a single grace period (shared by all of them) is spent blocking until more data arrives, rather than polling for each item.
+
+    Returns a dict of the items from each queue, keyed by the same names as the given queues.
+    """
+    queue_items: Dict[str, List[Any]] = {name: list() for name in queues}
+    names_of_queues_with_feeders = dict()
+    for name, the_queue in queues.items():
+        _get_all_items_without_blocking(the_queue, queue_items[name])
+        if isinstance(the_queue, multiprocessing.queues.Queue):
+            names_of_queues_with_feeders[getattr(the_queue, "_reader")] = name
+    if not names_of_queues_with_feeders:
+        return queue_items
+    deadline = time.perf_counter() + grace_period_seconds
+    while True:
+        remaining_seconds = deadline - time.perf_counter()
+        if remaining_seconds <= 0:
+            return queue_items
+        for reader in wait(
+            list(names_of_queues_with_feeders), timeout=remaining_seconds
+        ):
+            name = names_of_queues_with_feeders[reader]
+            _get_all_items_without_blocking(queues[name], queue_items[name])
+
+
 class SimpleMultiprocessingQueue(multiprocessing.queues.SimpleQueue):  # type: ignore[type-arg] # noqa: F821 # Eli (3/10/20) can't figure out why SimpleQueue doesn't have type arguments defined in the stdlib(?)
     """Some additional basic functionality.
 
     Since SimpleQueue is not technically a class, there are some tricks to subclassing it: https://stackoverflow.com/questions/39496554/cannot-subclass-multiprocessing-queue-in-python-3-5
     """
 
-    def __init__(self) -> None:
-        ctx = multiprocessing.get_context()
+    def __init__(self, ctx: Optional[BaseContext] = None) -> None:
+        if ctx is None:
+            ctx = multiprocessing.get_context()
         super().__init__(ctx=ctx)
 
     def get_nowait(self) -> Any:
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Automatically restarting crashed threads and processes."""
+from __future__ import annotations
+
+from collections import deque
+import logging
+import queue
+import time
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Union
+
+from .exceptions import SupervisorRestartLimitExceededError
+from .exceptions import UnrecognizedRestartStrategyError
+from .multiprocessing_utils import InfiniteProcess
+from .queue_utils import bulk_drain_queues
+from .threading_utils import InfiniteThread
+
+SupervisedChild = Union[InfiniteThread, InfiniteProcess]
+
+
+class Supervisor(InfiniteThread):
+    """Thread that watches InfiniteThreads/InfiniteProcesses and restarts them.
+
+    Since a thread or process cannot be started twice, each child is added as a factory that creates a new instance. The children are started when the supervisor starts, and stopped when it stops.
+
+    A child has crashed if it exits after reporting a fatal error, or exits without having been stopped (e.g. a process that was killed). A child that exits after being stopped without any error is considered finished and is no longer supervised.
+
+    Args:
+        fatal_error_reporter: the queue the supervisor reports its own fatal errors to, including SupervisorRestartLimitExceededError.
+        restart_strategy: 'one_for_one' restarts only the child that crashed. 'one_for_all' stops and restarts every child whenever any of them crashes.
+        max_restarts: the maximum number of restarts allowed within max_restarts_window_seconds. If exceeded, the supervisor stops all children and stops itself.
+        max_restarts_window_seconds: the window for max_restarts.
+        initial_backoff_seconds: how long to wait before the first restart of a child. The wait doubles for each further restart of that child within max_restarts_window_seconds.
+        max_backoff_seconds: the longest to wait before a restart.
+        child_stop_timeout_seconds: how long to wait for each child to stop when the supervisor needs to stop it.
+    """
+
+    def __init__(
+        self,
+        fatal_error_reporter: queue.Queue,  # type: ignore[type-arg] # noqa: F821 # Eli (3/10/20) can't figure out why queue.Queue doesn't have type arguments defined in the stdlib(?)
+        restart_strategy: str = "one_for_one",
+        max_restarts: int = 3,
+        max_restarts_window_seconds: float = 5,
+        initial_backoff_seconds: float = 0.1,
+        max_backoff_seconds: float = 10,
+        child_stop_timeout_seconds: float = 5,
+        logging_level: int = logging.INFO,
+        minimum_iteration_duration_seconds: Union[float, int] = 0.05,
+    ) -> None:
+        if restart_strategy not in ("one_for_one", "one_for_all"):
+            raise UnrecognizedRestartStrategyError(restart_strategy)
+        super().__init__(
+            fatal_error_reporter,
+            logging_level=logging_level,
+            minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+        )
+        self._restart_strategy = restart_strategy
+        self._max_restarts = max_restarts
+        self._max_restarts_window_ns = int(max_restarts_window_seconds * 10 ** 9)
+        self._initial_backoff_ns = int(initial_backoff_seconds * 10 ** 9)
+        self._max_backoff_ns = int(max_backoff_seconds * 10 ** 9)
+        self._child_stop_timeout_seconds = child_stop_timeout_seconds
+        self._child_factories: Dict[str, Callable[[], SupervisedChild]] = dict()
+        self._children: Dict[str, SupervisedChild] = dict()
+        self._restart_timepoints: Deque[int] = deque()
+        self._restart_timepoints_of_each_child: Dict[str, Deque[int]] = dict()
+        self._pending_restart_timepoints: Dict[str, int] = dict()
+        self._crash_timepoints: Dict[str, int] = dict()
+        self._restart_metrics: Dict[str, Dict[str, Any]] = dict()
+
+    def add_child(self, name: str, factory: Callable[[], SupervisedChild]) -> None:
+        """Supervise a child created by calling the factory.
+
+        Children must be added before the supervisor is started.
+        """
+        if self.is_alive():
+            raise NotImplementedError(
+                "Children must be added before the supervisor is started."
+            )
+        self._child_factories[name] = factory
+        self._restart_timepoints_of_each_child[name] = deque()
+        self._restart_metrics[name] = {
+            "num_restarts": 0,
+            "num_recoveries": 0,
+            "last_fatal_errors": list(),
+            "last_time_to_recovery_seconds": None,
+            "max_time_to_recovery_seconds": None,
+            "mean_time_to_recovery_seconds": None,
+        }
+
+    def get_children(self) -> Dict[str, SupervisedChild]:
+        """Get the current instance of each child that is running."""
+        return self._children
+
+    def get_restart_metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Get the restart count and time to recovery of each child.
+
+        Time to recovery is measured from when the crash was detected until the start up of the new instance completed, so it includes any backoff.
+        """
+        return self._restart_metrics
+
+    def _setup_before_loop(self) -> None:
+        super()._setup_before_loop()
+        for name in self._child_factories:
+            self._start_child(name)
+
+    def _start_child(self, name: str) -> None:
+        child = self._child_factories[name]()
+        child.start()
+        self._children[name] = child
+
+    def _commands_for_each_run_iteration(self) -> None:
+        now = time.perf_counter_ns()
+        for name, child in list(self._children.items()):
+            if name not in self._children:
+                continue  # already stopped by the one_for_all restart of a sibling
+            if name in self._crash_timepoints and child.is_start_up_complete():
+                self._record_recovery(name, now)
+            if child.is_alive():
+                continue
+            fatal_errors = bulk_drain_queues(
+                {"fatal_error_reporter": child.get_fatal_error_reporter()},
+                grace_period_seconds=0,
+            )["fatal_error_reporter"]
+            del self._children[name]
+            if not fatal_errors and child.is_stopped():
+                continue
+            self._restart_metrics[name]["last_fatal_errors"] = fatal_errors
+            self._handle_crash(name, now)
+        for name, restart_timepoint in list(self._pending_restart_timepoints.items()):
+            if restart_timepoint <= now:
+                del self._pending_restart_timepoints[name]
+                self._start_child(name)
+
+    def _handle_crash(self, name: str, crash_timepoint: int) -> None:
+        restart_timepoints = self._restart_timepoints
+        window_start = crash_timepoint - self._max_restarts_window_ns
+        while restart_timepoints and restart_timepoints[0] < window_start:
+            restart_timepoints.popleft()
+        if len(restart_timepoints) >= self._max_restarts:
+            raise SupervisorRestartLimitExceededError(name)
+        restart_timepoints.append(crash_timepoint)
+
+        names_to_restart = [name]
+        if self._restart_strategy == "one_for_all":
+            for sibling_name in list(self._children):
+                self._stop_child(sibling_name, self._children.pop(sibling_name))
+                names_to_restart.append(sibling_name)
+        for name_to_restart in names_to_restart:
+            timepoints_of_child = self._restart_timepoints_of_each_child[
+                name_to_restart
+            ]
+            while timepoints_of_child and timepoints_of_child[0] < window_start:
+                timepoints_of_child.popleft()
+            backoff_ns = min(
+                self._max_backoff_ns,
+                self._initial_backoff_ns * 2 ** len(timepoints_of_child),
+            )
+            timepoints_of_child.append(crash_timepoint)
+            self._pending_restart_timepoints[name_to_restart] = (
+                crash_timepoint + backoff_ns
+            )
+            self._crash_timepoints[name_to_restart] = crash_timepoint
+            self._restart_metrics[name_to_restart]["num_restarts"] += 1
+
+    def _record_recovery(self, name: str, recovery_timepoint: int) -> None:
+        time_to_recovery_seconds = (
+            recovery_timepoint - self._crash_timepoints.pop(name)
+        ) / 10 ** 9
+        metrics = self._restart_metrics[name]
+        metrics["num_recoveries"] += 1
+        metrics["last_time_to_recovery_seconds"] = time_to_recovery_seconds
+        previous_max = metrics["max_time_to_recovery_seconds"]
+        if previous_max is None or time_to_recovery_seconds > previous_max:
+            metrics["max_time_to_recovery_seconds"] = time_to_recovery_seconds
+        previous_mean = metrics["mean_time_to_recovery_seconds"] or 0.0
+        metrics["mean_time_to_recovery_seconds"] = (
+            previous_mean
+            + (time_to_recovery_seconds - previous_mean) / metrics["num_recoveries"]
+        )
+
+    def _stop_child(self, name: str, child: SupervisedChild) -> None:
+        """Stop and join a child.
+
+        Any fatal errors the child reported are kept in its restart metrics. Items left in the other queues of the child are the responsibility of whoever created the queues.
+        """
+        fatal_errors = child.hard_stop(timeout=self._child_stop_timeout_seconds)[
+            "fatal_error_reporter"
+        ]
+        child.join(self._child_stop_timeout_seconds)
+        if fatal_errors:
+            self._restart_metrics[name]["last_fatal_errors"] = fatal_errors
+
+    def _teardown_after_loop(self) -> None:
+        # signal every child first so that they all stop at the same time instead of one after another
+        for child in self._children.values():
+            child.stop()
+        for name, child in self._children.items():
+            self._stop_child(name, child)
+        self._children = dict()
+        self._pending_restart_timepoints = dict()
+        super()._teardown_after_loop()
@@ -2,13 +2,21 @@
 """Controlling communication with the OpalKelly FPGA Boards."""
 from __future__ import annotations
 
+import heapq
 import logging
 import queue
 import threading
+import time
+from typing import Dict
+from typing import Iterable
+from typing import List
 from typing import Optional
+from typing import Tuple
 from typing import Union
 
+from .parallelism_framework import calculate_iteration_time_ns
 from .parallelism_framework import InfiniteLoopingParallelismMixIn
+from .profiling import ThreadStackSampler
 
 
 class InfiniteThread(InfiniteLoopingParallelismMixIn, threading.Thread):
@@ -26,6 +34,21 @@ class InfiniteThread(InfiniteLoopingParallelismMixIn, threading.Thread):
         lock: Optional[threading.Lock] = None,
         logging_level: int = logging.INFO,
         minimum_iteration_duration_seconds: Union[float, int] = 0.01,
+        use_event_driven_wakeup: bool = False,
+        fixed_rate_overrun_policy: Optional[str] = None,
+        use_shared_performance_counters: bool = False,
+        use_adaptive_iteration_duration: bool = False,
+        max_input_items_per_iteration: int = 100,
+        max_input_item_handling_seconds_per_iteration: Optional[float] = None,
+        use_shared_control_flags: bool = False,
+        cpu_affinity: Optional[Iterable[int]] = None,
+        nice_level: Optional[int] = None,
+        scheduling_policy: Optional[str] = None,
+        scheduling_priority: int = 1,
+        wait_strategy: str = "sleep",
+        spin_duration_seconds: float = 0.0002,
+        use_tracing: bool = False,
+        use_cpu_time_tracking: bool = False,
     ) -> None:
         threading.Thread.__init__(self)
         InfiniteLoopingParallelismMixIn.__init__(
@@ -38,8 +61,53 @@ class InfiniteThread(InfiniteLoopingParallelismMixIn, threading.Thread):
             threading.Event(),
             threading.Event(),
             minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+            use_event_driven_wakeup=use_event_driven_wakeup,
+            fixed_rate_overrun_policy=fixed_rate_overrun_policy,
+            use_shared_performance_counters=use_shared_performance_counters,
+            use_adaptive_iteration_duration=use_adaptive_iteration_duration,
+            max_input_items_per_iteration=max_input_items_per_iteration,
+            max_input_item_handling_seconds_per_iteration=max_input_item_handling_seconds_per_iteration,
+            use_shared_control_flags=use_shared_control_flags,
+            cpu_affinity=cpu_affinity,
+            nice_level=nice_level,
+            scheduling_policy=scheduling_policy,
+            scheduling_priority=scheduling_priority,
+            wait_strategy=wait_strategy,
+            spin_duration_seconds=spin_duration_seconds,
+            use_tracing=use_tracing,
+            use_cpu_time_tracking=use_cpu_time_tracking,
         )
         self._lock = lock
+        self._stack_sampler: Optional[ThreadStackSampler] = None
+
+    def start_profiling(
+        self, sampling_interval_seconds: Union[float, int] = 0.01
+    ) -> None:
+        """Start sampling the stack of the running thread.
+
+        Sampling is done by a separate thread, so this can be called at any time while the thread is alive without restarting it.
+        """
+        if not self.is_alive():
+            raise NotImplementedError(
+                "The thread must be running before it can be profiled."
+            )
+        if self._stack_sampler is not None:
+            raise NotImplementedError("The thread is already being profiled.")
+        self._stack_sampler = ThreadStackSampler(
+            self, sampling_interval_seconds=sampling_interval_seconds
+        )
+        self._stack_sampler.start()
+
+    def stop_profiling(self) -> Dict[str, int]:
+        """Stop sampling the stack and return the number of samples of each folded stack.
+
+        See profiling.write_folded_stacks_file to write them to a file for a flame graph.
+        """
+        if self._stack_sampler is None:
+            raise NotImplementedError("The thread is not being profiled.")
+        folded_stacks = self._stack_sampler.stop()
+        self._stack_sampler = None
+        return folded_stacks
 
     # pylint: disable=duplicate-code # pylint is freaking out and requiring the method to be redefined
     def run(  # pylint: disable=duplicate-code # pylint is freaking out and requiring the method to be redefined
@@ -55,3 +123,83 @@ class InfiniteThread(InfiniteLoopingParallelismMixIn, threading.Thread):
             perform_setup_before_loop=perform_setup_before_loop,
             perform_teardown_after_loop=perform_teardown_after_loop,
         )
+
+
+class CooperativeLoopScheduler(threading.Thread):
+    """Thread that runs many infinite loops cooperatively.
+
+    Instead of each loop having its own thread, the scheduler executes one iteration at a time of whichever loop is due next, and sleeps only when none of them are due. Each loop keeps its own minimum iteration duration (including adaptive and fixed rate modes), stop/soft_stop/pause semantics, performance tracking and fatal error reporter, and its setup/teardown are performed in the scheduler's thread.
+
+    This is best suited for lightweight loops whose iterations are short, since a long iteration delays every other loop. To spread loops over a small fixed pool of threads, distribute them among several schedulers.
+
+    The loops should not also be started themselves. The scheduler exits once every loop has stopped.
+
+    Args:
+        loops: the loops to run. More can be added using add_loop before the scheduler is started.
+    """
+
+    def __init__(
+        self, loops: Iterable[InfiniteLoopingParallelismMixIn] = tuple()
+    ) -> None:
+        super().__init__()
+        self._loops: List[InfiniteLoopingParallelismMixIn] = list()
+        for loop in loops:
+            self.add_loop(loop)
+
+    def add_loop(self, loop: InfiniteLoopingParallelismMixIn) -> None:
+        if self.is_alive():
+            raise NotImplementedError(
+                "Loops must be added before the scheduler is started."
+            )
+        if loop.is_event_driven_wakeup_enabled():
+            raise NotImplementedError(
+                "Loops using event driven wakeup cannot be run by a scheduler."
+            )
+        if loop.get_scheduling_settings():
+            raise NotImplementedError(
+                "Loops with CPU affinity or scheduling settings cannot share a scheduler's thread."
+            )
+        if loop.get_wait_strategy() != "sleep":
+            raise NotImplementedError(
+                "Loops run by a scheduler must use the 'sleep' wait strategy, since the scheduler does the waiting."
+            )
+        self._loops.append(loop)
+
+    def get_loops(self) -> List[InfiniteLoopingParallelismMixIn]:
+        return self._loops
+
+    def run(self) -> None:
+        # pylint: disable=protected-access # the scheduler takes the place of each loop's own run method
+        # each entry is the timepoint the loop is next due and the index of the loop, so that ties are broken by the order the loops were added
+        schedule: List[Tuple[int, int]] = list()
+        for index, loop in enumerate(self._loops):
+            if loop._start_running():
+                schedule.append((time.perf_counter_ns(), index))
+        heapq.heapify(schedule)
+        while schedule:
+            due_timepoint, index = heapq.heappop(schedule)
+            loop = self._loops[index]
+            time_until_due_ns = due_timepoint - time.perf_counter_ns()
+            if time_until_due_ns > 0:
+                time.sleep(time_until_due_ns / 10 ** 9)
+            start_timepoint_of_iteration = time.perf_counter_ns()
+            loop._begin_iteration(start_timepoint_of_iteration)
+            if not loop._run_one_iteration():
+                loop._finish_running()
+                continue
+            iteration_time_ns = calculate_iteration_time_ns(
+                start_timepoint_of_iteration
+            )
+            idle_time_ns = max(
+                loop._calculate_idle_time_ns(
+                    start_timepoint_of_iteration, iteration_time_ns
+                ),
+                0,
+            )
+            end_timepoint_of_iteration = (
+                start_timepoint_of_iteration + iteration_time_ns
+            )
+            loop._record_iteration_performance(
+                iteration_time_ns, idle_time_ns, end_timepoint_of_iteration
+            )
+            heapq.heappush(schedule, (end_timepoint_of_iteration + idle_time_ns, index))
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""Exporting a timeline of loops as a Chrome trace."""
+from __future__ import annotations
+
+import json
+from typing import Any
+from typing import Dict
+from typing import Iterable
+from typing import List
+
+from .parallelism_framework import InfiniteLoopingParallelismMixIn
+
+
+def merge_trace_events(
+    loops: Iterable[InfiniteLoopingParallelismMixIn],
+) -> List[Dict[str, Any]]:
+    """Combine the trace events of the loops into one timeline.
+
+    Loops must have been created with use_tracing enabled. The trace events of an InfiniteProcess are only available once its loop has finished.
+    """
+    events: List[Dict[str, Any]] = list()
+    for loop in loops:
+        events.extend(loop.get_trace_events())
+    return events
+
+
+def write_chrome_trace_file(
+    file_path: str, loops: Iterable[InfiniteLoopingParallelismMixIn]
+) -> None:
+    """Write the merged trace events of the loops to a JSON file.
+
+    The file can be opened in chrome://tracing or https://ui.perfetto.dev, where each loop is shown as a thread of its process.
+    """
+    with open(file_path, "w") as trace_file:
+        json.dump(
+            {"traceEvents": merge_trace_events(loops), "displayTimeUnit": "ms"},
+            trace_file,
+        )
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Detecting loops that have stalled during an iteration."""
+from __future__ import annotations
+
+import logging
+from multiprocessing.process import BaseProcess
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+from .multiprocessing_utils import InfiniteProcess
+from .parallelism_framework import InfiniteLoopingParallelismMixIn
+from .threading_utils import InfiniteThread
+
+
+class Watchdog(InfiniteThread):
+    """Thread that reports loops whose heartbeat has stopped.
+
+    Each loop records a heartbeat at the start of every iteration. If the heartbeat of a running loop that is not paused becomes older than stall_threshold_multiple times its minimum iteration duration, the loop is considered stalled (e.g. blocked forever in a device read or on a deadlocked lock) and a report is put into the stall_reporter queue. Each stall is reported once, when it is first detected.
+
+    The report includes the stack of the stalled loop: captured using sys._current_frames for threads, and by sending SIGUSR1 to trigger a faulthandler dump for processes (which must be added before they are started, and is not supported on Windows). For other loops the stack is None.
+
+    Args:
+        fatal_error_reporter: the queue the watchdog reports its own fatal errors to.
+        stall_reporter: the queue stall reports are put into. Each report is a dict with the name of the loop, the age of its heartbeat in seconds, and its stack trace.
+        stall_threshold_multiple: how many minimum iteration durations a heartbeat can be old before the loop is considered stalled.
+        minimum_stall_threshold_seconds: the shortest threshold to use, so that loops with a very short (or zero) minimum iteration duration are not reported for normal delays.
+        stack_dump_timeout_seconds: how long to wait for a process to write its stack dump.
+    """
+
+    def __init__(
+        self,
+        fatal_error_reporter: queue.Queue,  # type: ignore[type-arg] # noqa: F821 # Eli (3/10/20) can't figure out why queue.Queue doesn't have type arguments defined in the stdlib(?)
+        stall_reporter: queue.Queue,  # type: ignore[type-arg] # noqa: F821 # Eli (3/10/20) can't figure out why queue.Queue doesn't have type arguments defined in the stdlib(?)
+        stall_threshold_multiple: float = 10,
+        minimum_stall_threshold_seconds: float = 1,
+        stack_dump_timeout_seconds: float = 1,
+        logging_level: int = logging.INFO,
+        minimum_iteration_duration_seconds: Union[float, int] = 0.1,
+    ) -> None:
+        super().__init__(
+            fatal_error_reporter,
+            logging_level=logging_level,
+            minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+        )
+        self._stall_reporter = stall_reporter
+        self._stall_threshold_multiple = stall_threshold_multiple
+        self._minimum_stall_threshold_ns = int(
+            minimum_stall_threshold_seconds * 10 ** 9
+        )
+        self._stack_dump_timeout_seconds = stack_dump_timeout_seconds
+        self._loops: Dict[str, InfiniteLoopingParallelismMixIn] = dict()
+        self._stalled_heartbeats: Dict[str, int] = dict()
+        self._stall_counts: Dict[str, int] = dict()
+        self._stack_dump_file_paths: List[str] = list()
+
+    def add_loop(self, name: str, loop: InfiniteLoopingParallelismMixIn) -> None:
+        """Monitor the loop.
+
+        To capture the stack of an InfiniteProcess, it must be added before it is started.
+        """
+        self._loops[name] = loop
+        self._stall_counts[name] = 0
+        if (
+            isinstance(loop, InfiniteProcess)
+            and loop.pid is None
+            and hasattr(signal, "SIGUSR1")
+        ):
+            file_descriptor, file_path = tempfile.mkstemp(
+                prefix="stack_dump_", suffix=".txt"
+            )
+            os.close(file_descriptor)
+            self._stack_dump_file_paths.append(file_path)
+            loop.enable_stack_dumps_on_signal(file_path)
+
+    def get_stall_counts(self) -> Dict[str, int]:
+        """Get the number of stalls detected for each loop."""
+        return self._stall_counts
+
+    def _commands_for_each_run_iteration(self) -> None:
+        now = time.perf_counter_ns()
+        for name, loop in self._loops.items():
+            heartbeat_timepoint = loop.get_heartbeat_timepoint_ns()
+            if heartbeat_timepoint == 0 or not self._is_loop_running(loop):
+                continue
+            heartbeat_age_ns = now - heartbeat_timepoint
+            threshold_ns = max(
+                int(
+                    self._stall_threshold_multiple
+                    * loop.get_minimum_iteration_duration_seconds()
+                    * 10 ** 9
+                ),
+                self._minimum_stall_threshold_ns,
+            )
+            if heartbeat_age_ns <= threshold_ns:
+                continue
+            if self._stalled_heartbeats.get(name) == heartbeat_timepoint:
+                continue  # this stall was already reported
+            self._stalled_heartbeats[name] = heartbeat_timepoint
+            self._stall_counts[name] += 1
+            heartbeat_age_seconds = heartbeat_age_ns / 10 ** 9
+            stack_trace = self._capture_stack_trace(loop)
+            logging.warning(
+                f"Loop '{name}' has not started an iteration in {heartbeat_age_seconds:.3f} seconds. Stack:\n{stack_trace}"
+            )
+            report: Dict[str, Any] = {
+                "name": name,
+                "heartbeat_age_seconds": heartbeat_age_seconds,
+                "stack_trace": stack_trace,
+            }
+            self._stall_reporter.put_nowait(report)
+
+    @staticmethod
+    def _is_loop_running(loop: InfiniteLoopingParallelismMixIn) -> bool:
+        if isinstance(loop, (threading.Thread, BaseProcess)) and not loop.is_alive():
+            return False
+        return (
+            loop.is_start_up_complete()
+            and not loop.is_paused()
+            and not loop.is_teardown_complete()
+        )
+
+    def _capture_stack_trace(
+        self, loop: InfiniteLoopingParallelismMixIn
+    ) -> Optional[str]:
+        if isinstance(loop, threading.Thread):
+            frame = sys._current_frames().get(  # pylint: disable=protected-access # this is the only way to get the stack of another thread
+                loop.ident  # type: ignore[arg-type] # the thread is alive, so it has an ident
+            )
+            if frame is None:
+                return None
+            return "".join(traceback.format_stack(frame))
+        if isinstance(loop, InfiniteProcess):
+            return self._capture_stack_trace_of_process(loop)
+        return None
+
+    def _capture_stack_trace_of_process(
+        self, process: InfiniteProcess
+    ) -> Optional[str]:
+        file_path = process.get_stack_dump_file_path()
+        if file_path is None or process.pid is None:
+            return None
+        size_before_dump = os.path.getsize(file_path)
+        os.kill(
+            process.pid,
+            signal.SIGUSR1,  # pylint: disable=no-member # file_path is only set on platforms with SIGUSR1
+        )
+        # wait for the dump to start, then for it to stop growing
+        deadline = time.perf_counter() + self._stack_dump_timeout_seconds
+        previous_size = size_before_dump
+        while time.perf_counter() < deadline:
+            time.sleep(0.01)
+            current_size = os.path.getsize(file_path)
+            if previous_size != size_before_dump and current_size == previous_size:
+                break
+            previous_size = current_size
+        with open(file_path) as stack_dump_file:
+            stack_dump_file.seek(size_before_dump)
+            stack_trace = stack_dump_file.read()
+        return stack_trace or None
+
+    def _teardown_after_loop(self) -> None:
+        for file_path in self._stack_dump_file_paths:
+            try:
+                os.remove(file_path)
+            except OSError:
+                pass  # a process may still have it open on Windows
+        self._stack_dump_file_paths = list()
+        super()._teardown_after_loop()
@@ -65,6 +65,11 @@ class InfiniteThreadThatRaisesError(InfiniteThread):
         raise ValueError("test message")
 
 
+class InfiniteThreadThatRaisesErrorInSetup(InfiniteThread):
+    def _setup_before_loop(self):
+        raise ValueError("error during setup")
+
+
 class InfiniteThreadThatCannotBeSoftStopped(InfiniteThread):
     def _commands_for_each_run_iteration(self):
         self._process_can_be_soft_stopped = False
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import queue
+import threading
+
+import pytest
+from stdlib_utils import InfiniteLoopingParallelismMixIn
+from stdlib_utils import InfiniteTask
+
+
+class InfiniteTaskThatCountsIterations(InfiniteTask):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._num_iterations = 0
+
+    async def _commands_for_each_run_iteration(self):
+        await asyncio.sleep(0)
+        self._num_iterations += 1
+
+    def get_num_iterations(self):
+        return self._num_iterations
+
+
+class InfiniteTaskThatRaisesError(InfiniteTask):
+    async def _commands_for_each_run_iteration(self):
+        raise ValueError("test message")
+
+
+class InfiniteTaskThatRaisesErrorInSetup(InfiniteTask):
+    def _setup_before_loop(self):
+        raise ValueError("error during setup")
+
+
+def test_InfiniteTask__is_an_InfiniteLoopingParallelismMixIn_using_thread_safe_events():
+    t = InfiniteTask(queue.Queue(), minimum_iteration_duration_seconds=0.5)
+    assert isinstance(t, InfiniteLoopingParallelismMixIn)
+    assert isinstance(t._stop_event, threading.Event)
+    assert t.get_minimum_iteration_duration_seconds() == 0.5
+    assert t.is_alive() is False
+
+
+def test_InfiniteTask__run_can_be_executed_a_given_number_of_iterations_and_awaits_commands():
+    t = InfiniteTaskThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0
+    )
+    asyncio.run(t.run(num_iterations=3))
+    assert t.get_num_iterations() == 3
+    assert t.is_start_up_complete() is True
+    assert t.is_teardown_complete() is True
+
+
+def test_InfiniteTask__sleeps_for_remainder_of_minimum_iteration_duration_without_blocking_event_loop():
+    t = InfiniteTaskThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0.05
+    )
+    other_coroutine_iterations = list()
+
+    async def count_while_task_runs():
+        while t.is_alive():
+            other_coroutine_iterations.append(None)
+            await asyncio.sleep(0.005)
+
+    async def run_and_soft_stop():
+        t.start()
+        counter = asyncio.ensure_future(count_while_task_runs())
+        while t.get_num_iterations() < 3:
+            await asyncio.sleep(0.005)
+        t.soft_stop()
+        await t.join()
+        await counter
+
+    asyncio.run(run_and_soft_stop())
+    assert len(other_coroutine_iterations) > 3
+    assert 0 < t.reset_performance_tracker()["percent_use"] < 100
+
+
+@pytest.mark.timeout(5)
+def test_InfiniteTask__stop_ends_idle_period_immediately__even_from_another_thread():
+    t = InfiniteTaskThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=60
+    )
+
+    async def run_and_stop():
+        t.start()
+        while t.get_num_iterations() < 1:
+            await asyncio.sleep(0.001)
+        stopping_thread = threading.Thread(target=t.stop)
+        stopping_thread.start()
+        await asyncio.wait_for(t.join(), timeout=2)
+        stopping_thread.join()
+
+    asyncio.run(run_and_stop())
+    assert t.is_teardown_complete() is True
+    assert t.is_alive() is False
+
+
+def test_InfiniteTask__pause_skips_commands_and_resume_wakes_task_up():
+    t = InfiniteTaskThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=60
+    )
+
+    async def pause_then_resume():
+        t.pause()
+        t.start()
+        await asyncio.sleep(0.01)
+        assert t.get_num_iterations() == 0
+        t.resume()
+        while t.get_num_iterations() < 1:
+            await asyncio.sleep(0.001)
+        t.stop()
+        await t.join()
+
+    asyncio.run(pause_then_resume())
+    # stop is checked after the commands of the iteration it wakes up
+    assert t.get_num_iterations() == 2
+
+
+def test_InfiniteTask__does_not_idle_if_iteration_overruns_minimum_iteration_duration():
+    t = InfiniteTaskThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0
+    )
+    asyncio.run(t.run(num_iterations=2))
+    assert t.get_idle_time_ns() == 0
+
+
+def test_InfiniteTask__reports_error_during_iteration_and_stops():
+    error_queue = queue.Queue()
+    t = InfiniteTaskThatRaisesError(error_queue)
+    asyncio.run(t.run())
+    assert t.is_stopped() is True
+    assert str(error_queue.get_nowait()) == "test message"
+
+
+def test_InfiniteTask__reports_error_during_setup_and_does_not_enter_loop():
+    error_queue = queue.Queue()
+    t = InfiniteTaskThatRaisesErrorInSetup(error_queue)
+    asyncio.run(t.run())
+    assert t.is_start_up_complete() is False
+    assert str(error_queue.get_nowait()) == "error during setup"
+
+
+def test_InfiniteTask__hard_stop__returns_fatal_errors():
+    error_queue = queue.Queue()
+    t = InfiniteTaskThatRaisesError(error_queue)
+
+    async def run_task():
+        t.start()
+        await t.join()
+
+    asyncio.run(run_task())
+    items = t.hard_stop(timeout=1)
+    assert [str(err) for err in items["fatal_error_reporter"]] == ["test message"]
+
+
+def test_InfiniteTask__control_methods_can_be_called_before_running_and_after_event_loop_closed():
+    t = InfiniteTask(queue.Queue())
+    t.pause()
+    t.resume()
+    asyncio.run(t.run(num_iterations=1))
+    t.stop()
+    assert t.is_stopped() is True
+
+
+def test_InfiniteTask__join__returns_immediately_if_never_started():
+    t = InfiniteTask(queue.Queue())
+    asyncio.run(t.join())
+    assert t.is_alive() is False
+
+
+def test_InfiniteTask__run__teardown_can_be_skipped():
+    t = InfiniteTask(queue.Queue())
+    asyncio.run(t.run(num_iterations=1, perform_teardown_after_loop=False))
+    assert t.is_teardown_complete() is False
+
+
+def test_InfiniteTask__passes_items_from_registered_input_queues_to_handler():
+    t = InfiniteTask(queue.Queue())
+    input_queue = queue.Queue()
+    input_queue.put_nowait("item")
+    handled_items = list()
+    t.register_input_queue(input_queue, item_handler=handled_items.append)
+    asyncio.run(t.run(num_iterations=1))
+    assert handled_items == ["item"]
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import tracemalloc
+import warnings
+
+import pytest
+from stdlib_utils import get_rss_bytes
+from stdlib_utils import memory_monitoring
+from stdlib_utils import MemoryGrowthWarning
+from stdlib_utils import MemoryMonitor
+
+
+def allocate_in_distinctive_function(leaked_objects):
+    leaked_objects.extend(bytearray(1000) for _ in range(100))
+
+
+def test_get_rss_bytes__returns_resident_set_size_of_process():
+    assert get_rss_bytes() > 0
+
+
+def test_get_rss_bytes__returns_none_if_platform_does_not_provide_it(mocker):
+    mocker.patch.object(memory_monitoring, "open", create=True, side_effect=OSError)
+    assert get_rss_bytes() is None
+
+
+def test_MemoryMonitor__take_measurement__raises_error_if_not_started():
+    with pytest.raises(NotImplementedError, match="must be started"):
+        MemoryMonitor().take_measurement(0)
+
+
+def test_MemoryMonitor__reports_allocation_sites_that_grew_most_and_stops_tracing_it_started():
+    assert tracemalloc.is_tracing() is False
+    monitor = MemoryMonitor(num_top_allocation_sites=3)
+    leaked_objects = list()
+    monitor.start(0)
+    assert tracemalloc.is_tracing() is True
+    allocate_in_distinctive_function(leaked_objects)
+
+    measurement = monitor.take_measurement(10 ** 9)
+    monitor.stop()
+
+    assert tracemalloc.is_tracing() is False
+    assert monitor.get_latest_measurement() is measurement
+    assert measurement["traced_growth_bytes_per_second"] >= 100000
+    assert measurement["traced_bytes"] >= 100000
+    assert len(measurement["top_allocation_sites"]) == 3
+    top_site = measurement["top_allocation_sites"][0]
+    assert top_site["site"].startswith(__file__)
+    assert top_site["size_diff_bytes"] >= 100000
+    assert top_site["count_diff"] >= 100
+    assert top_site["size_bytes"] >= top_site["size_diff_bytes"]
+
+
+def test_MemoryMonitor__does_not_stop_tracing_started_by_something_else():
+    tracemalloc.start()
+    try:
+        monitor = MemoryMonitor()
+        monitor.start(0)
+        monitor.stop()
+        assert tracemalloc.is_tracing() is True
+    finally:
+        tracemalloc.stop()
+
+
+def test_MemoryMonitor__only_measures_rss_if_tracing_has_been_stopped_by_something_else():
+    monitor = MemoryMonitor()
+    monitor.start(0)
+    tracemalloc.stop()
+    measurement = monitor.take_measurement(10 ** 9)
+    monitor.stop()
+    assert measurement["rss_bytes"] > 0
+    assert measurement["traced_bytes"] is None
+    assert measurement["top_allocation_sites"] is None
+
+
+def test_MemoryMonitor__measures_rss_growth_rate_without_tracemalloc(mocker):
+    mocker.patch.object(
+        memory_monitoring,
+        "get_rss_bytes",
+        autospec=True,
+        side_effect=[1000, 3000, None, 5000],
+    )
+    monitor = MemoryMonitor(use_tracemalloc=False)
+    monitor.start(0)
+    assert tracemalloc.is_tracing() is False
+
+    measurement = monitor.take_measurement(10 ** 9)
+    assert measurement == {
+        "rss_bytes": 3000,
+        "rss_growth_bytes_per_second": 2000,
+        "traced_bytes": None,
+        "traced_growth_bytes_per_second": None,
+        "top_allocation_sites": None,
+        "num_growth_warnings": 0,
+    }
+    assert monitor.take_measurement(2 * 10 ** 9)["rss_growth_bytes_per_second"] is None
+    assert monitor.take_measurement(3 * 10 ** 9)["rss_growth_bytes_per_second"] is None
+
+
+def test_MemoryMonitor__warns_when_growth_exceeds_threshold(mocker):
+    mocker.patch.object(
+        memory_monitoring,
+        "get_rss_bytes",
+        autospec=True,
+        side_effect=[0, 500, 2000],
+    )
+    monitor = MemoryMonitor(
+        growth_warning_threshold_bytes_per_second=1000, use_tracemalloc=False
+    )
+    monitor.start(0)
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert monitor.take_measurement(10 ** 9)["num_growth_warnings"] == 0
+    with pytest.warns(MemoryGrowthWarning, match="1500 bytes per second"):
+        measurement = monitor.take_measurement(2 * 10 ** 9)
+    assert measurement["num_growth_warnings"] == 1
+
+
+def test_MemoryMonitor__does_not_report_traced_growth_since_before_it_was_stopped():
+    monitor = MemoryMonitor()
+    monitor.start(0)
+    monitor.stop()
+    tracemalloc.start()
+    try:
+        measurement = monitor.take_measurement(10 ** 9)
+    finally:
+        tracemalloc.stop()
+    assert measurement["traced_bytes"] >= 0
+    assert measurement["traced_growth_bytes_per_second"] is None
+    assert measurement["top_allocation_sites"] is None
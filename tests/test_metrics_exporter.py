@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+import math
+import queue
+import urllib.error
+import urllib.request
+
+import pytest
+from stdlib_utils import InfiniteProcess
+from stdlib_utils import metrics_exporter
+from stdlib_utils import MetricsExporter
+from stdlib_utils import performance_tracking
+from stdlib_utils import SharedPerformanceCountersNotEnabledError
+from stdlib_utils import SimpleMultiprocessingQueue
+
+from .fixtures_parallelism import InfiniteThreadThatCountsIterations
+
+
+def traced_thread(**kwargs):
+    return InfiniteThreadThatCountsIterations(
+        queue.Queue(),
+        minimum_iteration_duration_seconds=0,
+        use_shared_performance_counters=True,
+        **kwargs,
+    )
+
+
+def get_samples(rendered_metrics):
+    samples = dict()
+    for line in rendered_metrics.splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_MetricsExporter__add_loop__raises_error_if_loop_does_not_use_shared_performance_counters():
+    exporter = MetricsExporter()
+    with pytest.raises(SharedPerformanceCountersNotEnabledError):
+        exporter.add_loop("loop", InfiniteThreadThatCountsIterations(queue.Queue()))
+
+
+def test_MetricsExporter__render_metrics__includes_counters_percent_use_fatal_errors_and_histogram_of_each_loop():
+    exporter = MetricsExporter()
+    t = traced_thread()
+    exporter.add_loop('my "loop"', t)
+    t.run(num_iterations=4)
+    t._report_fatal_error(ValueError("error"))
+    # errors stay counted after they have been taken from the reporter
+    t.get_fatal_error_reporter().get_nowait()
+    snapshot = t.get_shared_performance_counters_snapshot()
+
+    rendered_metrics = exporter.render_metrics()
+
+    assert rendered_metrics.endswith("\n# EOF\n")
+    assert "# TYPE stdlib_utils_loop_iterations counter" in rendered_metrics
+    samples = get_samples(rendered_metrics)
+    labels = '{loop="my \\"loop\\""}'
+    assert samples[f"stdlib_utils_loop_iterations_total{labels}"] == 3
+    assert (
+        samples[f"stdlib_utils_loop_iteration_time_seconds_total{labels}"]
+        == snapshot["total_iteration_time_ns"] / 10 ** 9
+    )
+    assert samples[f"stdlib_utils_loop_idle_time_seconds_total{labels}"] == 0
+    assert (
+        samples[f"stdlib_utils_loop_max_iteration_time_seconds{labels}"]
+        == snapshot["max_iteration_time_ns"] / 10 ** 9
+    )
+    assert samples[f"stdlib_utils_loop_percent_use{labels}"] == 100
+    assert samples[f"stdlib_utils_loop_fatal_errors_total{labels}"] == 1
+
+    bucket_samples = [
+        (name, value)
+        for name, value in samples.items()
+        if name.startswith("stdlib_utils_loop_iteration_duration_seconds_bucket")
+    ]
+    assert [name for name, _ in bucket_samples] == [
+        f'stdlib_utils_loop_iteration_duration_seconds_bucket{{loop="my \\"loop\\"",le="{bound_ns / 10 ** 9}"}}'
+        for bound_ns in performance_tracking.SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS
+    ] + [
+        'stdlib_utils_loop_iteration_duration_seconds_bucket{loop="my \\"loop\\"",le="+Inf"}'
+    ]
+    assert [value for _, value in bucket_samples] == sorted(
+        value for _, value in bucket_samples
+    )
+    assert bucket_samples[-1][1] == 3
+    assert samples[f"stdlib_utils_loop_iteration_duration_seconds_count{labels}"] == 3
+    assert (
+        samples[f"stdlib_utils_loop_iteration_duration_seconds_sum{labels}"]
+        == snapshot["total_iteration_time_ns"] / 10 ** 9
+    )
+
+
+def test_MetricsExporter__render_metrics__reports_percent_use_since_previous_scrape_and_repeats_it_if_no_iterations_completed(
+    mocker,
+):
+    exporter = MetricsExporter()
+    t = traced_thread()
+    exporter.add_loop("loop", t)
+    (
+        initial_snapshot,
+        bucket_counts,
+    ) = t.get_shared_performance_counters_snapshot_with_iteration_time_buckets()
+    snapshots = [
+        ({**initial_snapshot, **counters}, bucket_counts)
+        for counters in (
+            dict(),
+            {"total_iteration_time_ns": 30, "total_idle_time_ns": 70},
+            {"total_iteration_time_ns": 30, "total_idle_time_ns": 70},
+            {"total_iteration_time_ns": 110, "total_idle_time_ns": 90},
+        )
+    ]
+    mocker.patch.object(
+        t,
+        "get_shared_performance_counters_snapshot_with_iteration_time_buckets",
+        autospec=True,
+        side_effect=snapshots,
+    )
+    rendered_metrics = [exporter.render_metrics() for _ in snapshots]
+
+    assert 'stdlib_utils_loop_percent_use{loop="loop"} NaN\n' in rendered_metrics[0]
+    percent_use_values = [
+        get_samples(rendered)['stdlib_utils_loop_percent_use{loop="loop"}']
+        for rendered in rendered_metrics
+    ]
+    assert math.isnan(percent_use_values[0])
+    assert percent_use_values[1:] == [30, 30, 80]
+
+
+def test_MetricsExporter__render_metrics__includes_histogram_of_process_but_not_sizes_that_cannot_be_determined():
+    exporter = MetricsExporter()
+    p = InfiniteProcess(
+        SimpleMultiprocessingQueue(), use_shared_performance_counters=True
+    )
+    exporter.add_loop("process", p)
+    exporter.add_queue("simple", SimpleMultiprocessingQueue())
+    threading_queue = queue.Queue()
+    threading_queue.put_nowait(1)
+    threading_queue.put_nowait(2)
+    exporter.add_queue("threading", threading_queue)
+
+    samples = get_samples(exporter.render_metrics())
+
+    assert samples['stdlib_utils_loop_iterations_total{loop="process"}'] == 0
+    assert (
+        samples[
+            'stdlib_utils_loop_iteration_duration_seconds_bucket{loop="process",le="+Inf"}'
+        ]
+        == 0
+    )
+    assert samples['stdlib_utils_loop_fatal_errors_total{loop="process"}'] == 0
+    assert math.isnan(samples['stdlib_utils_loop_percent_use{loop="process"}'])
+    assert samples['stdlib_utils_queue_depth{queue="threading"}'] == 2
+    assert 'stdlib_utils_queue_depth{queue="simple"}' not in samples
+
+
+@pytest.mark.timeout(10)
+def test_MetricsExporter__serves_metrics_over_http_without_resetting_them(mocker):
+    spied_debug = mocker.spy(metrics_exporter.logging, "debug")
+    exporter = MetricsExporter(port=0)
+    assert exporter.get_port() == 0
+    t = traced_thread()
+    exporter.add_loop("loop", t)
+    t.run(num_iterations=3)
+    exporter.start()
+    url = f"http://127.0.0.1:{exporter.get_port()}"
+    try:
+        bodies = list()
+        for _ in range(2):
+            # neither scraping nor resetting the performance tracker of the loop resets the metrics
+            t.reset_performance_tracker()
+            with urllib.request.urlopen(f"{url}/metrics") as response:
+                assert response.status == 200
+                assert response.headers["Content-Type"] == (
+                    metrics_exporter.OPENMETRICS_CONTENT_TYPE
+                )
+                bodies.append(response.read().decode("utf-8"))
+        with pytest.raises(urllib.error.HTTPError) as exc_info:
+            urllib.request.urlopen(f"{url}/other")
+        assert exc_info.value.code == 404
+    finally:
+        exporter.stop()
+    exporter.stop()
+
+    for body in bodies:
+        samples = get_samples(body)
+        assert samples['stdlib_utils_loop_iterations_total{loop="loop"}'] == 2
+        assert (
+            samples['stdlib_utils_loop_iteration_duration_seconds_count{loop="loop"}']
+            == 2
+        )
+    assert "GET /metrics" in spied_debug.call_args_list[0][0][0]
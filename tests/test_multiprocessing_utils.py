@@ -1,13 +1,19 @@
 # -*- coding: utf-8 -*-
 import logging
 import multiprocessing
+from multiprocessing import forkserver
 from multiprocessing import Process
+import signal
+import sys
 import time
 
 import pytest
+from stdlib_utils import drain_queue
 from stdlib_utils import InfiniteLoopingParallelismMixIn
 from stdlib_utils import InfiniteProcess
 from stdlib_utils import invoke_process_run_and_check_errors
+from stdlib_utils import multiprocessing_utils
+from stdlib_utils import ProcessLauncher
 from stdlib_utils import SECONDS_TO_SLEEP_BETWEEN_CHECKING_QUEUE_SIZE
 from stdlib_utils import SimpleMultiprocessingQueue
 
@@ -41,6 +47,17 @@ class InfiniteProcessThatPopulatesQueue(InfiniteProcess):
         time.sleep(0.05)
 
 
+class InfiniteProcessThatEchoesQueue(InfiniteProcess):
+    def __init__(self, input_queue, output_queue, fatal_error_reporter, **kwargs):
+        super().__init__(fatal_error_reporter, **kwargs)
+        self._input_queue = input_queue
+        self._output_queue = output_queue
+
+    def _commands_for_each_run_iteration(self):
+        if not self._input_queue.empty():
+            self._output_queue.put_nowait(self._input_queue.get_nowait())
+
+
 def test_InfiniteProcess_super_Process_is_called_during_init(mocker):
     mocked_init = mocker.patch.object(Process, "__init__")
     error_queue = SimpleMultiprocessingQueue()
@@ -60,6 +77,21 @@ def test_InfiniteProcess_super_InfiniteLoopingParallelismMixIn_is_called_during_
         error_queue,
         *init_test_args_InfiniteLoopingParallelismMixIn,
         minimum_iteration_duration_seconds=0.01,
+        use_event_driven_wakeup=False,
+        fixed_rate_overrun_policy=None,
+        use_shared_performance_counters=False,
+        use_adaptive_iteration_duration=False,
+        max_input_items_per_iteration=100,
+        max_input_item_handling_seconds_per_iteration=None,
+        use_shared_control_flags=False,
+        cpu_affinity=None,
+        nice_level=None,
+        scheduling_policy=None,
+        scheduling_priority=1,
+        wait_strategy="sleep",
+        spin_duration_seconds=0.0002,
+        use_tracing=False,
+        use_cpu_time_tracking=False,
     )
 
 
@@ -239,6 +271,23 @@ def test_InfiniteProcess__catches_error_in_teardown_after_loop(mocker):
     assert str(actual_error) == str(expected_error)
 
 
+@pytest.mark.timeout(15)
+def test_InfiniteProcess__shared_control_flags__can_be_paused_and_stopped_from_parent():
+    error_queue = SimpleMultiprocessingQueue()
+    p = InfiniteProcessThatCountsIterations(
+        error_queue,
+        minimum_iteration_duration_seconds=0.001,
+        use_shared_control_flags=True,
+    )
+    p.start()
+    p.pause()
+    p.soft_stop()
+    p.join(timeout=10)
+    assert p.is_alive() is False
+    assert p.is_stopped() is True
+    assert error_queue.empty() is True
+
+
 @pytest.mark.timeout(
     45
 )  # Eli (2/10/21): Because there can be ~40 items put into the queue, need to ensure sufficient time to pull them all out using the sleep time between polling the queue
@@ -284,3 +333,317 @@ def test_InfiniteProcess__pause_and_resume_work_while_running():
 
     assert len(items_in_queue_at_stop) > 0
     assert items_in_queue_at_stop[0] - 1 == last_item_in_queue_at_pause
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteProcess__event_driven_wakeup__handles_items_and_stops_without_waiting_for_minimum_iteration_duration():
+    input_queue = SimpleMultiprocessingQueue()
+    output_queue = SimpleMultiprocessingQueue()
+    p = InfiniteProcessThatEchoesQueue(
+        input_queue,
+        output_queue,
+        SimpleMultiprocessingQueue(),
+        minimum_iteration_duration_seconds=30,
+        use_event_driven_wakeup=True,
+    )
+    p.register_wakeup_queue(input_queue)
+    p.start()
+    while not p.is_start_up_complete():
+        time.sleep(0.01)
+    input_queue.put("expected item")
+    assert output_queue.get() == "expected item"
+    p.stop()
+    p.join(timeout=5)
+    assert p.is_alive() is False
+    assert p.exitcode == 0
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteProcess__shared_performance_counters_can_be_read_by_parent_while_running():
+    p = InfiniteProcess(
+        SimpleMultiprocessingQueue(),
+        minimum_iteration_duration_seconds=0.001,
+        use_shared_performance_counters=True,
+    )
+    p.start()
+    snapshot = p.get_shared_performance_counters_snapshot()
+    while snapshot["num_iterations"] < 5:
+        time.sleep(0.01)
+        snapshot = p.get_shared_performance_counters_snapshot()
+    p.stop()
+    p.join()
+
+    assert snapshot["start_timepoint_ns"] > 0
+    assert snapshot["last_update_timepoint_ns"] > snapshot["start_timepoint_ns"]
+    assert snapshot["total_idle_time_ns"] > 0
+
+
+def test_InfiniteProcess__counts_fatal_errors_in_shared_performance_counters():
+    error_queue = SimpleMultiprocessingQueue()
+    p = InfiniteProcess(error_queue, use_shared_performance_counters=True)
+    p._report_fatal_error(ValueError("error"))
+    err, _ = error_queue.get()
+    assert str(err) == "error"
+    assert p.get_shared_performance_counters_snapshot()["num_fatal_errors"] == 1
+
+
+def test_InfiniteProcess__uses_default_context_unless_given_one():
+    p = InfiniteProcess(SimpleMultiprocessingQueue())
+    assert p.get_context() is multiprocessing.get_context()
+    assert p.get_start_up_latency_ns() is None
+
+
+def test_InfiniteProcess__run__registers_faulthandler_for_stack_dumps_only_if_enabled(
+    mocker, tmp_path
+):
+    mocked_register = mocker.patch.object(
+        multiprocessing_utils.faulthandler, "register", autospec=True
+    )
+    p = InfiniteProcess(SimpleMultiprocessingQueue())
+    assert p.get_stack_dump_file_path() is None
+    invoke_process_run_and_check_errors(p)
+    mocked_register.assert_not_called()
+
+    file_path = str(tmp_path / "stack_dump.txt")
+    p.enable_stack_dumps_on_signal(file_path)
+    assert p.get_stack_dump_file_path() == file_path
+    invoke_process_run_and_check_errors(p)
+    mocked_register.assert_called_once_with(
+        signal.SIGUSR1, file=mocker.ANY, all_threads=True
+    )
+    assert mocked_register.call_args[1]["file"].name == file_path
+
+
+def test_InfiniteProcess__run__does_not_register_faulthandler_if_platform_has_no_sigusr1(
+    mocker, monkeypatch, tmp_path
+):
+    mocked_register = mocker.patch.object(
+        multiprocessing_utils.faulthandler, "register", autospec=True
+    )
+    monkeypatch.delattr(multiprocessing_utils.signal, "SIGUSR1")
+    p = InfiniteProcess(SimpleMultiprocessingQueue())
+    p.enable_stack_dumps_on_signal(str(tmp_path / "stack_dump.txt"))
+    invoke_process_run_and_check_errors(p)
+    mocked_register.assert_not_called()
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcess__sends_trace_events_recorded_in_process_to_parent_after_loop_finishes():
+    error_queue = multiprocessing.Queue()
+    p = InfiniteProcessThatCountsIterations(
+        error_queue, minimum_iteration_duration_seconds=0.001, use_tracing=True
+    )
+    p.start()
+    assert p._start_up_complete_event.wait(timeout=10) is True
+    assert p.get_trace_events() == []
+    time.sleep(0.05)  # let some iterations run
+    p.soft_stop()
+    assert p._teardown_complete_event.wait(timeout=10) is True
+
+    events = p.get_trace_events()
+    assert events is p.get_trace_events()
+    p.join(timeout=5)
+
+    assert p.exitcode == 0
+    assert events[0]["args"] == {"name": p.name}
+    assert {event["pid"] for event in events} == {p.pid}
+    names = [event["name"] for event in events[1:]]
+    assert names[0] == "setup"
+    assert names[-1] == "teardown"
+    assert "iteration" in names
+
+
+def test_InfiniteProcess__get_trace_events__returns_events_recorded_so_far_when_called_in_the_process_itself(
+    mocker,
+):
+    p = InfiniteProcess(multiprocessing.Queue(), use_tracing=True)
+    mocker.patch.object(
+        multiprocessing, "current_process", autospec=True, return_value=p
+    )
+    invoke_process_run_and_check_errors(p, perform_setup_before_loop=True)
+    assert [event["name"] for event in p.get_trace_events()[1:]] == ["setup"]
+
+    p.run(num_iterations=1, perform_setup_before_loop=False)
+    events_in_process = p.get_trace_events()
+    mocker.stopall()
+
+    assert p.get_trace_events() == events_in_process
+
+
+def test_InfiniteProcess__get_trace_events__returns_empty_list_if_teardown_completed_without_events_being_sent():
+    p = InfiniteProcess(multiprocessing.Queue(), use_tracing=True)
+    p._teardown_complete_event.set()
+    assert p.get_trace_events() == []
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcess__hard_stop__returns_trace_events_so_process_can_be_joined():
+    p = InfiniteProcess(
+        multiprocessing.Queue(),
+        minimum_iteration_duration_seconds=0.001,
+        use_tracing=True,
+    )
+    p.start()
+    assert p._start_up_complete_event.wait(timeout=10) is True
+    items = p.hard_stop(timeout=5)
+    p.join(timeout=5)
+
+    assert p.exitcode == 0
+    (events,) = items["trace_events"]
+    assert events[-1]["name"] == "teardown"
+
+
+def busy_work_in_distinctive_function():
+    end_timepoint = time.perf_counter() + 0.002
+    while time.perf_counter() < end_timepoint:
+        pass
+
+
+class InfiniteProcessThatDoesBusyWork(InfiniteProcess):
+    def _commands_for_each_run_iteration(self):
+        busy_work_in_distinctive_function()
+
+
+@pytest.mark.timeout(20)
+def test_InfiniteProcess__start_profiling__samples_stack_of_running_process_until_stop_profiling():
+    error_queue = multiprocessing.Queue()
+    p = InfiniteProcessThatDoesBusyWork(
+        error_queue, minimum_iteration_duration_seconds=0.001
+    )
+    p.enable_profiling_on_signal()
+    assert p.is_profiling_on_signal_enabled() is True
+    p.start()
+    assert p._start_up_complete_event.wait(timeout=10) is True
+    p.start_profiling(sampling_interval_seconds=0.001)
+    time.sleep(0.2)
+    folded_stacks = p.stop_profiling()
+    assert p.stop_profiling() == {}
+    p.soft_stop()
+    p.join(timeout=5)
+
+    assert p.exitcode == 0
+    assert error_queue.empty() is True
+    assert sum(folded_stacks.values()) > 0
+    assert any("busy_work_in_distinctive_function" in stack for stack in folded_stacks)
+
+
+def test_InfiniteProcess__handles_profiling_signals_by_starting_and_stopping_sampling_timer(
+    mocker,
+):
+    mocked_setitimer = mocker.patch.object(
+        multiprocessing_utils.signal, "setitimer", autospec=True
+    )
+    mocked_signal = mocker.patch.object(
+        multiprocessing_utils.signal, "signal", autospec=True
+    )
+    p = InfiniteProcess(multiprocessing.Queue())
+    p.enable_profiling_on_signal()
+    invoke_process_run_and_check_errors(p)
+    mocked_signal.assert_called_once_with(signal.SIGUSR2, p._handle_profiling_signal)
+    # stopping before sampling ever started
+    p._handle_profiling_signal(signal.SIGUSR2, None)
+    p._profiling_interval_ns.value = 2 * 10 ** 6
+    p._handle_profiling_signal(signal.SIGUSR2, None)
+    p._handle_profiling_signal(signal.SIGUSR2, None)
+    mocked_signal.assert_called_with(signal.SIGALRM, p._sample_stack)
+    mocked_setitimer.assert_called_with(signal.ITIMER_REAL, 0.002, 0.002)
+
+    p._sample_stack(signal.SIGALRM, sys._getframe())
+    p._profiling_interval_ns.value = 0
+    p._handle_profiling_signal(signal.SIGUSR2, None)
+    mocked_setitimer.assert_called_with(signal.ITIMER_REAL, 0)
+    # a sample that was already pending when the timer was stopped
+    p._sample_stack(signal.SIGALRM, sys._getframe())
+
+    folded_stacks_before_start, folded_stacks = p.hard_stop()["folded_stacks"]
+    assert folded_stacks_before_start == {}
+    assert list(folded_stacks.values()) == [1]
+
+
+def test_InfiniteProcess__start_profiling__raises_error_if_not_enabled_or_process_not_started():
+    p = InfiniteProcess(multiprocessing.Queue())
+    assert p.is_profiling_on_signal_enabled() is False
+    with pytest.raises(NotImplementedError, match="enable_profiling_on_signal"):
+        p.start_profiling()
+    p.enable_profiling_on_signal()
+    with pytest.raises(NotImplementedError, match="completed start up"):
+        p.start_profiling()
+
+
+def test_InfiniteProcess__enable_profiling_on_signal__raises_error_if_platform_has_no_sigusr2(
+    monkeypatch,
+):
+    monkeypatch.delattr(multiprocessing_utils.signal, "SIGUSR2")
+    p = InfiniteProcess(multiprocessing.Queue())
+    with pytest.raises(NotImplementedError, match="not supported"):
+        p.enable_profiling_on_signal()
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcess__puts_periodic_performance_reports_from_process_into_queue():
+    error_queue = multiprocessing.Queue()
+    report_queue = multiprocessing.Queue()
+    p = InfiniteProcessThatCountsIterations(
+        error_queue, minimum_iteration_duration_seconds=0.001
+    )
+    p.enable_periodic_performance_reports(
+        report_queue, 0.01, queues_to_report={"errors": error_queue}
+    )
+    p.start()
+    report = report_queue.get(timeout=10)
+    p.soft_stop()
+    assert p._teardown_complete_event.wait(timeout=10) is True
+    drain_queue(report_queue)
+    p.join(timeout=5)
+
+    assert p.exitcode == 0
+    assert report["communication_type"] == "performance_report"
+    assert report["num_iterations"] > 0
+    assert report["measurement_duration_ns"] >= 0.01 * 10 ** 9
+    assert "errors" in report["queue_depths"]
+
+
+@pytest.mark.timeout(30)
+@pytest.mark.parametrize(
+    "start_method,use_shared_control_flags",
+    [("forkserver", True), ("spawn", False)],
+)
+def test_ProcessLauncher__starts_processes_using_its_context_and_measures_start_up_latency(
+    start_method, use_shared_control_flags
+):
+    launcher = ProcessLauncher(
+        preload_modules=["stdlib_utils"], start_method=start_method
+    )
+    launcher.warm_up()
+    error_queue = SimpleMultiprocessingQueue(ctx=launcher.get_context())
+    p = launcher.create_process(
+        InfiniteProcessThatCountsIterations,
+        error_queue,
+        use_shared_control_flags=use_shared_control_flags,
+    )
+    assert p.get_context() is launcher.get_context()
+
+    p.start()
+    assert p._start_up_complete_event.wait(timeout=20) is True
+    latency_ns = p.get_start_up_latency_ns()
+    p.soft_stop()
+    p.join(timeout=10)
+
+    assert type(p._popen).__module__.startswith(f"multiprocessing.popen_{start_method}")
+    assert p.exitcode == 0
+    assert error_queue.empty() is True
+    assert 0 < latency_ns < 20 * 10 ** 9
+
+
+def test_ProcessLauncher__sets_forkserver_preload_and_only_warms_up_forkserver(mocker):
+    mocked_ensure_running = mocker.patch.object(
+        forkserver, "ensure_running", autospec=True
+    )
+    launcher = ProcessLauncher(preload_modules=["stdlib_utils", "json"])
+    assert launcher.get_preload_modules() == ["stdlib_utils", "json"]
+    assert forkserver._forkserver._preload_modules == ["stdlib_utils", "json"]
+    launcher.warm_up()
+    assert mocked_ensure_running.call_count == 1
+
+    ProcessLauncher(start_method="spawn").warm_up()
+    assert mocked_ensure_running.call_count == 1
@@ -1,18 +1,34 @@
 # -*- coding: utf-8 -*-
+import collections
 import logging
+import multiprocessing
+import os
 import queue
 from statistics import stdev
 import threading
 import time
+import tracemalloc
+import warnings
 
 import pytest
+from stdlib_utils import EventDrivenWakeupNotEnabledError
 from stdlib_utils import InfiniteLoopingParallelismMixIn
+from stdlib_utils import InfiniteThread
 from stdlib_utils import invoke_process_run_and_check_errors
 from stdlib_utils import is_queue_eventually_empty
 from stdlib_utils import is_queue_eventually_not_empty
+from stdlib_utils import LogBucketedHistogram
+from stdlib_utils import MemoryGrowthWarning
 from stdlib_utils import NANOSECONDS_PER_CENTIMILLISECOND
 from stdlib_utils import parallelism_framework
+from stdlib_utils import SharedControlFlags
+from stdlib_utils import SharedPerformanceCountersNotEnabledError
 from stdlib_utils import SimpleMultiprocessingQueue
+from stdlib_utils import UnrecognizedFixedRateOverrunPolicyError
+from stdlib_utils import UnrecognizedSchedulingPolicyError
+from stdlib_utils import UnrecognizedWaitStrategyError
+
+from .fixtures_parallelism import InfiniteThreadThatCountsIterations
 
 
 def generic_infinite_looper():
@@ -69,7 +85,7 @@ def test_InfiniteLoopingParallelismMixIn__does_not_sleep_during_loop_if_minimum_
         time,
         "perf_counter_ns",
         autospec=True,
-        side_effect=[0, 0, 0, 0.1 * 10 ** 9, 0],
+        side_effect=[0, 0, 0, 10 ** 8, 0],
     )
     mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
     generic_infinite_looper().run(num_iterations=2, perform_setup_before_loop=True)
@@ -254,6 +270,59 @@ def test_InfiniteLoopingParallelismMixIn__hard_stop__timeout_overrides_waiting_f
     mocked_complete.assert_called()
 
 
+@pytest.mark.timeout(5)
+def test_InfiniteLoopingParallelismMixIn__hard_stop__blocks_on_teardown_complete_event_instead_of_polling(
+    mocker,
+):
+    p = generic_infinite_looper()
+    mocker.patch.object(p, "_teardown_after_loop", autospec=True)
+    spied_is_teardown_complete = mocker.spy(p, "is_teardown_complete")
+    threading.Timer(0.2, p._teardown_complete_event.set).start()
+
+    p.hard_stop()
+
+    assert spied_is_teardown_complete.call_count == 2
+
+
+@pytest.mark.timeout(5)
+def test_InfiniteLoopingParallelismMixIn__hard_stop__returns_after_timeout_if_teardown_never_completes(
+    mocker,
+):
+    p = generic_infinite_looper()
+    mocker.patch.object(p, "_teardown_after_loop", autospec=True)
+
+    start = time.perf_counter()
+    p.hard_stop(timeout=0.2)
+    assert 0.2 <= time.perf_counter() - start < 1
+    assert p.is_teardown_complete() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__hard_stop__drains_registered_queues_and_items_from_drain_all_queues(
+    mocker,
+):
+    p = generic_infinite_looper()
+    threading_queue = queue.Queue()
+    threading_queue.put("threading item")
+    multiprocessing_queue = multiprocessing.Queue()
+    multiprocessing_queue.put("multiprocessing item")
+    p.register_queue_to_drain("threading_queue", threading_queue)
+    p.register_queue_to_drain("multiprocessing_queue", multiprocessing_queue)
+    mocker.patch.object(
+        p,
+        "_drain_all_queues",
+        autospec=True,
+        return_value={"subclass_queue": ["subclass item"]},
+    )
+
+    actual = p.hard_stop()
+    assert actual == {
+        "subclass_queue": ["subclass item"],
+        "threading_queue": ["threading item"],
+        "multiprocessing_queue": ["multiprocessing item"],
+        "fatal_error_reporter": [],
+    }
+
+
 @pytest.mark.parametrize(
     "perform_setup_before_loop,test_description",
     [
@@ -294,26 +363,133 @@ def test_InfiniteLoopingParallelismMixIn__get_percent_use_metrics__returns_corre
     )
 
 
-def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__returns_longest_iterations(
+def test_InfiniteLoopingParallelismMixIn__get_percent_use_metrics__returns_None_for_mean_before_any_values_recorded():
+    actual = generic_infinite_looper().get_percent_use_metrics()
+    assert actual["mean"] is None
+    assert actual["stdev"] == 0
+
+
+def test_InfiniteLoopingParallelismMixIn__get_percent_use_metrics__includes_exponentially_weighted_averages():
+    p = generic_infinite_looper()
+    p.run(num_iterations=2)
+    percent_use = p.reset_performance_tracker()["percent_use"]
+
+    actual = p.get_percent_use_metrics()
+    assert actual["ewma_1_minute"] == percent_use
+    assert actual["ewma_5_minute"] == percent_use
+    assert actual["ewma_15_minute"] == percent_use
+
+
+def test_InfiniteLoopingParallelismMixIn__get_percent_use_values__is_bounded_but_metrics_include_all_values(
+    mocker,
+):
+    mocker.patch.object(
+        InfiniteLoopingParallelismMixIn, "num_percent_use_values_to_keep", 2
+    )
+    p = generic_infinite_looper()
+    p.run(num_iterations=1)
+    all_percent_use_values = [
+        p.reset_performance_tracker()["percent_use"] for _ in range(5)
+    ]
+
+    assert list(p.get_percent_use_values()) == all_percent_use_values[-2:]
+    assert p.get_percent_use_metrics()["max"] == max(all_percent_use_values)
+    assert p.get_percent_use_metrics()["min"] == min(all_percent_use_values)
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__returns_iteration_time_percentiles_and_histogram(
     mocker,
 ):
-    expected_longest_times = list(range(1, 6))
+    iteration_times = [1] * 98 + [20, 30]
 
     p = generic_infinite_looper()
-
-    iteration_times = [0 for _ in range(p.num_longest_iterations)]
-    iteration_times.extend(expected_longest_times)
     mocker.patch.object(
         parallelism_framework,
         "calculate_iteration_time_ns",
         autospec=True,
         side_effect=iteration_times,
     )
+    mocker.patch.object(time, "sleep", autospec=True)
 
     p.run(num_iterations=len(iteration_times) + 1)
 
     actual = p.reset_performance_tracker()
-    assert actual["longest_iterations"] == expected_longest_times
+    assert actual["iteration_time_percentiles"] == {
+        "p50": 1,
+        "p90": 1,
+        "p99": 20,
+        "p99.9": 30,
+        "max": 30,
+    }
+    actual_histogram = actual["iteration_time_histogram"]
+    assert isinstance(actual_histogram, LogBucketedHistogram)
+    assert actual_histogram.get_total_count() == len(iteration_times)
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__starts_new_iteration_time_histogram():
+    p = generic_infinite_looper()
+    p.run(num_iterations=3)
+    first_histogram = p.reset_performance_tracker()["iteration_time_histogram"]
+    second_histogram = p.reset_performance_tracker()["iteration_time_histogram"]
+    assert first_histogram.get_total_count() == 2
+    assert second_histogram.get_total_count() == 0
+
+
+def test_InfiniteLoopingParallelismMixIn__loop_uses_bound_is_set_methods_of_events_instead_of_public_lifecycle_checks():
+    p = generic_infinite_looper()
+    p.run(num_iterations=3)
+    assert p._is_stop_event_set == p._stop_event.is_set
+    assert p._is_soft_stop_event_set == p._soft_stop_event.is_set
+    assert p._is_pause_event_set == p._pause_event.is_set
+
+
+def test_InfiniteLoopingParallelismMixIn__loop_uses_lifecycle_checks_overridden_by_subclass():
+    class LooperThatStopsAfterTwoChecks(InfiniteLoopingParallelismMixIn):
+        def __init__(self) -> None:
+            super().__init__(
+                queue.Queue(),
+                logging.INFO,
+                threading.Event(),
+                threading.Event(),
+                threading.Event(),
+                threading.Event(),
+                threading.Event(),
+            )
+            self.num_stop_checks = 0
+
+        def is_stopped(self) -> bool:
+            self.num_stop_checks += 1
+            return self.num_stop_checks >= 2
+
+    p = LooperThatStopsAfterTwoChecks()
+    p.run()
+    assert p.num_stop_checks == 2
+
+
+def test_InfiniteLoopingParallelismMixIn__loop_uses_events_replaced_after_init(
+    mocker,
+):
+    p = generic_infinite_looper()
+    spied_commands = mocker.spy(p, "_commands_for_each_run_iteration")
+    replacement_stop_event = threading.Event()
+    replacement_stop_event.set()
+    p._stop_event = replacement_stop_event
+    p.run(num_iterations=5)
+    assert p._is_stop_event_set == replacement_stop_event.is_set
+    spied_commands.assert_called_once()
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_during_init_if_lifecycle_event_is_not_an_event():
+    with pytest.raises(NotImplementedError, match="_pause_event"):
+        InfiniteLoopingParallelismMixIn(
+            queue.Queue(),
+            logging.INFO,
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            None,
+        )
 
 
 def test_InfiniteLoopingParallelismMixIn__pause__does_not_call_commands_for_each_run_iteration_when_paused__and_sets_pause_event_to_true__then_resume_sets_event_to_false_and_commands_are_allowed_again(
@@ -337,6 +513,259 @@ def test_InfiniteLoopingParallelismMixIn__pause__does_not_call_commands_for_each
     assert spied_commands.call_count == 1
 
 
+def test_InfiniteLoopingParallelismMixIn__blocks_while_paused_until_resumed__and_tracks_paused_time(
+    mocker,
+):
+    p = generic_infinite_looper()
+    spied_commands = mocker.spy(p, "_commands_for_each_run_iteration")
+    spied_sleep = mocker.spy(time, "sleep")
+    p.pause()
+
+    def resume_after_delay():
+        assert spied_commands.call_count == 0
+        time.sleep(0.05)
+        p.resume()
+
+    mocked_wait = mocker.patch.object(
+        p._pause_control_event, "wait", autospec=True, side_effect=resume_after_delay
+    )
+
+    p.run(num_iterations=2)
+
+    assert mocked_wait.call_count == 1
+    assert spied_commands.call_count == 1
+    # the only sleep is the one used to delay resuming
+    assert spied_sleep.call_count == 1
+    assert p.get_paused_time_ns() >= 0.05 * 10 ** 9
+    performance_metrics = p.reset_performance_tracker()
+    assert performance_metrics["paused_time_ns"] >= 0.05 * 10 ** 9
+    assert performance_metrics["iteration_time_histogram"].get_total_count() == 1
+    assert p.get_paused_time_ns() == 0
+
+
+@pytest.mark.parametrize("control_method_name", ["stop", "soft_stop"])
+def test_InfiniteLoopingParallelismMixIn__stop_and_soft_stop_end_blocking_pause(
+    control_method_name, mocker
+):
+    p = generic_infinite_looper()
+    spied_commands = mocker.spy(p, "_commands_for_each_run_iteration")
+    p.pause()
+    mocked_wait = mocker.patch.object(
+        p._pause_control_event,
+        "wait",
+        autospec=True,
+        side_effect=getattr(p, control_method_name),
+    )
+
+    p.run(num_iterations=5)
+
+    assert mocked_wait.call_count == 1
+    assert spied_commands.call_count == 0
+    assert p.is_stopped() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__does_not_block_if_resumed_before_waiting(
+    mocker,
+):
+    p = generic_infinite_looper()
+    p.pause()
+    mocker.patch.object(
+        p,
+        "_record_iteration_performance",
+        autospec=True,
+        side_effect=lambda *_: p.resume(),
+    )
+    spied_wait = mocker.spy(p._pause_control_event, "wait")
+
+    p.run(num_iterations=2)
+
+    assert spied_wait.call_count == 0
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__excludes_paused_time_from_percent_use(
+    mocker,
+):
+    p = generic_infinite_looper()
+    p.run(num_iterations=1)
+    mocker.patch.object(
+        p,
+        "get_elapsed_time_since_last_performance_measurement",
+        autospec=True,
+        return_value=100,
+    )
+    p._paused_time_ns = 60
+    p._idle_iteration_time_ns = 20
+
+    performance_metrics = p.reset_performance_tracker()
+
+    assert performance_metrics["paused_time_ns"] == 60
+    assert performance_metrics["percent_use"] == 50
+
+
+def test_InfiniteLoopingParallelismMixIn__fixed_rate_schedule_restarts_after_resume(
+    mocker,
+):
+    p = fixed_rate_infinite_looper("skip")
+    p.pause()
+    mocker.patch.object(
+        p._pause_control_event, "wait", autospec=True, side_effect=p.resume
+    )
+    p.run(num_iterations=1)
+    p._scheduled_timepoint_of_iteration_ns = 5
+
+    p._wait_while_paused()
+
+    assert p._scheduled_timepoint_of_iteration_ns is None
+
+
+def test_InfiniteLoopingParallelismMixIn__records_start_of_each_iteration_as_heartbeat(
+    mocker,
+):
+    p = generic_infinite_looper()
+    assert p.get_heartbeat_timepoint_ns() == 0
+    heartbeats = list()
+    mocker.patch.object(
+        p,
+        "_commands_for_each_run_iteration",
+        autospec=True,
+        side_effect=lambda: heartbeats.append(p.get_heartbeat_timepoint_ns()),
+    )
+    p.run(num_iterations=2)
+    assert len(heartbeats) == 2
+    assert 0 < heartbeats[0] < heartbeats[1]
+
+
+def test_InfiniteLoopingParallelismMixIn__resume__refreshes_heartbeat(mocker):
+    p = generic_infinite_looper()
+    p._record_heartbeat(1)
+    p.pause()
+    mocker.patch.object(
+        parallelism_framework.time, "perf_counter_ns", autospec=True, return_value=5
+    )
+    p.resume()
+    assert p.get_heartbeat_timepoint_ns() == 5
+
+
+def test_InfiniteLoopingParallelismMixIn__stores_heartbeat_in_shared_memory_if_events_are_multiprocessing_events(
+    mocker,
+):
+    spied_raw_value = mocker.spy(parallelism_framework, "RawValue")
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+    )
+    assert p._heartbeat_timepoint_ns is spied_raw_value.spy_return
+
+
+class InfiniteThreadWithTracedWork(InfiniteThread):
+    def _commands_for_each_run_iteration(self):
+        with self.trace_span("work"):
+            pass
+
+
+def test_InfiniteLoopingParallelismMixIn__does_not_record_trace_events_by_default():
+    t = InfiniteThreadWithTracedWork(queue.Queue())
+    t.run(num_iterations=2)
+    assert t.is_tracing_enabled() is False
+    assert t.get_trace_events() == []
+
+
+def test_InfiniteLoopingParallelismMixIn__records_setup_iteration_idle_teardown_and_user_spans_as_chrome_trace_events():
+    t = InfiniteThreadWithTracedWork(
+        queue.Queue(), minimum_iteration_duration_seconds=0.001, use_tracing=True
+    )
+    assert t.is_tracing_enabled() is True
+    t.run(num_iterations=2)
+
+    metadata_event, *events = t.get_trace_events()
+    assert metadata_event == {
+        "name": "thread_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "tid": parallelism_framework.get_thread_id_for_trace(),
+        "args": {"name": t.name},
+    }
+    assert [event["name"] for event in events] == [
+        "setup",
+        "work",
+        "iteration",
+        "idle",
+        "work",
+        "teardown",
+    ]
+    for event in events:
+        assert event["ph"] == "X"
+        assert event["pid"] == os.getpid()
+        assert event["tid"] == metadata_event["tid"]
+    first_work, first_iteration, idle = events[1:4]
+    assert first_iteration["ts"] <= first_work["ts"]
+    assert first_work["ts"] + first_work["dur"] <= idle["ts"]
+    assert idle["ts"] == pytest.approx(first_iteration["ts"] + first_iteration["dur"])
+    assert events[-1]["ts"] >= idle["ts"] + idle["dur"]
+
+
+def test_InfiniteLoopingParallelismMixIn__trace_span__records_span_even_if_error_raised(
+    mocker,
+):
+    p = generic_infinite_looper()
+    p._trace_events = collections.deque()
+    mocker.patch.object(
+        time, "perf_counter_ns", autospec=True, side_effect=[1000, 3000]
+    )
+    with pytest.raises(ValueError):
+        with p.trace_span("failing"):
+            raise ValueError()
+    assert list(p._trace_events) == [("failing", 1000, 2000)]
+
+
+def test_InfiniteLoopingParallelismMixIn__records_pause_as_trace_event(mocker):
+    p = InfiniteThread(queue.Queue(), use_tracing=True)
+    mocker.patch.object(time, "perf_counter_ns", autospec=True, return_value=5000)
+    p._finish_waiting_while_paused(2000)
+    assert p.get_trace_events()[1] == {
+        "name": "pause",
+        "ph": "X",
+        "ts": 2,
+        "dur": 3,
+        "pid": os.getpid(),
+        "tid": parallelism_framework.get_thread_id_for_trace(),
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__keeps_only_the_most_recent_trace_events(
+    mocker,
+):
+    mocker.patch.object(InfiniteLoopingParallelismMixIn, "num_trace_events_to_keep", 3)
+    t = InfiniteThreadWithTracedWork(
+        queue.Queue(), minimum_iteration_duration_seconds=0, use_tracing=True
+    )
+    t.run(num_iterations=5)
+    assert [event["name"] for event in t.get_trace_events()[1:]] == [
+        "iteration",
+        "work",
+        "teardown",
+    ]
+
+
+def test_InfiniteLoopingParallelismMixIn__uses_multiprocessing_event_for_pause_control_if_pause_event_is_multiprocessing_event():
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+    )
+    assert isinstance(p._pause_control_event, multiprocessing.synchronize.Event)
+    assert isinstance(generic_infinite_looper()._pause_control_event, threading.Event)
+
+
 def test_InfiniteLoopingParallelismMixIn__correctly_stores_time_since_initialized__in_setup_before_loop(
     mocker,
 ):
@@ -360,3 +789,1365 @@ def test_InfiniteLoopingParallelismMixIn__correctly_stores_time_since_initialize
         expected_poll_time - expected_init_time
     ) // NANOSECONDS_PER_CENTIMILLISECOND
     assert p.get_cms_since_init() == expected_dur_since_init
+
+
+def wakeup_infinite_looper(minimum_iteration_duration_seconds=0.01):
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+        use_event_driven_wakeup=True,
+    )
+    return p
+
+
+class InfiniteThreadThatEchoesQueue(InfiniteThread):
+    def __init__(self, input_queue, output_queue, fatal_error_reporter, **kwargs):
+        super().__init__(fatal_error_reporter, **kwargs)
+        self._input_queue = input_queue
+        self._output_queue = output_queue
+
+    def _commands_for_each_run_iteration(self):
+        if not self._input_queue.empty():
+            self._output_queue.put_nowait(self._input_queue.get_nowait())
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup_is_disabled_by_default():
+    assert generic_infinite_looper().is_event_driven_wakeup_enabled() is False
+    assert wakeup_infinite_looper().is_event_driven_wakeup_enabled() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__register_wakeup_queue__raises_error_if_event_driven_wakeup_not_enabled():
+    p = generic_infinite_looper()
+    with pytest.raises(EventDrivenWakeupNotEnabledError):
+        p.register_wakeup_queue(queue.Queue())
+
+
+@pytest.mark.timeout(5)
+@pytest.mark.parametrize(
+    "queue_factory,test_description",
+    [
+        (queue.Queue, "wakes up for queue.Queue"),
+        (multiprocessing.Queue, "wakes up for multiprocessing.Queue"),
+        (SimpleMultiprocessingQueue, "wakes up for SimpleMultiprocessingQueue"),
+    ],
+)
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__handles_item_put_into_registered_queue_without_waiting_for_minimum_iteration_duration(
+    queue_factory, test_description
+):
+    input_queue = queue_factory()
+    output_queue = queue.Queue()
+    t = InfiniteThreadThatEchoesQueue(
+        input_queue,
+        output_queue,
+        queue.Queue(),
+        minimum_iteration_duration_seconds=30,
+        use_event_driven_wakeup=True,
+    )
+    t.register_wakeup_queue(input_queue)
+    t.start()
+    while not t.is_start_up_complete():
+        time.sleep(0.01)
+    for expected_item in ("first", "second"):
+        input_queue.put(expected_item)
+        assert output_queue.get(timeout=2) == expected_item
+    t.stop()
+    t.join()
+
+
+@pytest.mark.timeout(5)
+@pytest.mark.parametrize(
+    "control_method_name,test_description",
+    [
+        ("stop", "wakes up when stopped"),
+        ("soft_stop", "wakes up when soft stopped"),
+    ],
+)
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__wakes_up_for_control_signals(
+    control_method_name, test_description
+):
+    t = InfiniteThread(
+        queue.Queue(),
+        minimum_iteration_duration_seconds=30,
+        use_event_driven_wakeup=True,
+    )
+    t.start()
+    while not t.is_start_up_complete():
+        time.sleep(0.01)
+    getattr(t, control_method_name)()
+    t.join(timeout=2)
+    assert t.is_alive() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__only_waits_on_control_signals_if_paused_during_iteration(
+    mocker,
+):
+    p = wakeup_infinite_looper()
+    registered_queue = SimpleMultiprocessingQueue()
+    p.register_wakeup_queue(registered_queue)
+    registered_threading_queue = queue.Queue()
+    p.register_wakeup_queue(registered_threading_queue)
+    registered_threading_queue.put("item that should not cause a wakeup")
+    p.pause()
+    mocked_wait = mocker.patch.object(
+        parallelism_framework, "wait", autospec=True, return_value=[]
+    )
+
+    p._wait_for_wakeup(p._wakeup_receiver, 0.01)
+
+    mocked_wait.assert_called_once_with([p._wakeup_receiver], timeout=0.01)
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__blocks_on_pause_instead_of_registered_queues_and_clears_control_signals_after_resume(
+    mocker,
+):
+    p = wakeup_infinite_looper()
+    registered_queue = queue.Queue()
+    p.register_wakeup_queue(registered_queue)
+    registered_queue.put("item that should not cause a wakeup")
+    p.pause()
+    mocker.patch.object(
+        p._pause_control_event, "wait", autospec=True, side_effect=p.resume
+    )
+    spied_wait = mocker.spy(parallelism_framework, "wait")
+
+    p.run(num_iterations=2)
+
+    assert spied_wait.call_count == 0
+    assert p._wakeup_receiver.poll() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__does_not_wait_if_registered_threading_queue_already_has_items(
+    mocker,
+):
+    p = wakeup_infinite_looper()
+    registered_queue = queue.Queue()
+    p.register_wakeup_queue(registered_queue)
+    registered_queue.put("item")
+    registered_queue.put("another item")
+    spied_wait = mocker.spy(parallelism_framework, "wait")
+
+    p.run(num_iterations=2)
+
+    assert spied_wait.call_count == 0
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__threading_queue_can_be_registered_by_multiple_loops_and_still_behaves_as_a_queue():
+    registered_queue = queue.Queue()
+    p1 = wakeup_infinite_looper()
+    p2 = wakeup_infinite_looper()
+    p1.register_wakeup_queue(registered_queue)
+    p2.register_wakeup_queue(registered_queue)
+
+    registered_queue.put(1)
+    registered_queue.put(2)
+    assert p1._wakeup_receiver.poll() is True
+    assert p2._wakeup_receiver.poll() is True
+    assert registered_queue.get(timeout=1) == 1
+    assert registered_queue.get(timeout=1) == 2
+    assert registered_queue.empty() is True
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__keeps_at_most_one_wakeup_outstanding_while_loop_is_not_running():
+    registered_queue = queue.Queue()
+    p = wakeup_infinite_looper()
+    p.register_wakeup_queue(registered_queue)
+    # enough wakeups to fill the pipe if each one were sent
+    for i in range(100000):
+        registered_queue.put(i)
+        registered_queue.get()
+    p.pause()
+    p.resume()
+
+    assert p._wakeup_receiver.poll() is True
+    p._wakeup_receiver.recv_bytes()
+    assert p._wakeup_receiver.poll() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__sends_a_new_wakeup_once_pending_one_has_been_received():
+    registered_queue = queue.Queue()
+    p = wakeup_infinite_looper()
+    p.register_wakeup_queue(registered_queue)
+    registered_queue.put(1)
+    p._drain_wakeup_receiver(p._wakeup_receiver)
+    registered_queue.get()
+
+    registered_queue.put(2)
+    assert p._wakeup_receiver.poll() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__unregisters_from_threading_queues_after_loop_finishes():
+    registered_queue = queue.Queue()
+    p = wakeup_infinite_looper()
+    p.register_wakeup_queue(registered_queue)
+    p.register_wakeup_queue(multiprocessing.Queue())
+
+    p.run(num_iterations=1)
+
+    assert registered_queue.not_empty.wakeup_callbacks == []
+    registered_queue.put("item that should not cause a wakeup")
+    assert p._wakeup_receiver.poll() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__only_tracks_time_actually_spent_idle(
+    mocker,
+):
+    p = wakeup_infinite_looper()
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        return_value=0,
+    )
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[0, 2 * 10 ** 6, 0],
+    )
+    mocked_wait = mocker.patch.object(
+        parallelism_framework, "wait", autospec=True, return_value=[]
+    )
+
+    p.run(num_iterations=2, perform_setup_before_loop=False)
+
+    mocked_wait.assert_called_once_with([p._wakeup_receiver], timeout=0.01)
+    assert p.get_idle_time_ns() == 2 * 10 ** 6
+
+
+def test_InfiniteLoopingParallelismMixIn__event_driven_wakeup__clears_pending_control_signals_after_waking_up():
+    p = wakeup_infinite_looper(minimum_iteration_duration_seconds=5)
+    p.pause()
+    p.resume()
+
+    p.run(num_iterations=2)
+
+    assert p._wakeup_receiver.poll() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_for_unrecognized_scheduling_policy():
+    with pytest.raises(UnrecognizedSchedulingPolicyError, match="bogus"):
+        InfiniteThread(queue.Queue(), scheduling_policy="bogus")
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_for_unrecognized_wait_strategy():
+    with pytest.raises(UnrecognizedWaitStrategyError, match="bogus"):
+        InfiniteThread(queue.Queue(), wait_strategy="bogus")
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_if_wait_strategy_other_than_sleep_used_with_event_driven_wakeup():
+    with pytest.raises(NotImplementedError, match="'sleep' wait strategy"):
+        InfiniteThread(
+            queue.Queue(), wait_strategy="sleep_then_spin", use_event_driven_wakeup=True
+        )
+
+
+@pytest.mark.parametrize(
+    "idle_time_ns,clock_readings,expected_sleeps,test_description",
+    [
+        (10 ** 6, [999_000, 999_900, 10 ** 6], [0.0008], "sleeps then spins"),
+        (10 ** 5, [999_900, 10 ** 6], [], "only spins if idle time is short"),
+    ],
+)
+def test_InfiniteLoopingParallelismMixIn__sleep_then_spin__sleeps_until_spin_duration_before_deadline_then_busy_waits(
+    idle_time_ns, clock_readings, expected_sleeps, test_description, mocker
+):
+    p = InfiniteThread(
+        queue.Queue(), wait_strategy="sleep_then_spin", spin_duration_seconds=0.0002
+    )
+    assert p.get_wait_strategy() == "sleep_then_spin"
+    mocked_perf_counter_ns = mocker.patch.object(
+        time, "perf_counter_ns", autospec=True, side_effect=clock_readings
+    )
+    mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
+
+    p._wait_until(10 ** 6, idle_time_ns)
+
+    assert [
+        round(call_args[0][0], 9) for call_args in mocked_sleep.call_args_list
+    ] == expected_sleeps
+    assert mocked_perf_counter_ns.call_count == len(clock_readings)
+
+
+def test_InfiniteLoopingParallelismMixIn__yield_spin__yields_until_deadline(mocker):
+    p = InfiniteThread(queue.Queue(), wait_strategy="yield_spin")
+    mocker.patch.object(
+        time, "perf_counter_ns", autospec=True, side_effect=[0, 500, 10 ** 6]
+    )
+    mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
+
+    p._wait_until(10 ** 6, 10 ** 6)
+
+    assert mocked_sleep.call_args_list == [mocker.call(0), mocker.call(0)]
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__returns_sleep_overshoot_measured_from_start_of_next_iteration(
+    mocker,
+):
+    p = generic_infinite_looper()
+    mocker.patch.object(time, "sleep", autospec=True)
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[
+            0,
+            10 ** 6,
+            10_100_000,  # 100 microseconds after the first wait should have ended
+            11_100_000,
+            20_300_000,  # 200 microseconds after the second wait should have ended
+            21_300_000,
+            30_300_000,
+        ]
+        + [40 * 10 ** 6] * 4,
+    )
+    p.run(num_iterations=4, perform_setup_before_loop=False)
+    p._start_timepoint_of_last_performance_measurement = 0
+
+    percentiles = p.reset_performance_tracker()["sleep_overshoot_percentiles"]
+
+    assert percentiles["p50"] == pytest.approx(100_000, rel=0.07)
+    assert percentiles["max"] == 200_000
+    assert p.reset_performance_tracker()["sleep_overshoot_percentiles"]["max"] is None
+
+
+def test_InfiniteLoopingParallelismMixIn__does_not_apply_or_report_scheduling_settings_by_default(
+    mocker,
+):
+    p = generic_infinite_looper()
+    spied_apply = mocker.spy(p, "_apply_scheduling_settings")
+    p.run(num_iterations=1)
+    assert p.get_scheduling_settings() == dict()
+    assert spied_apply.call_count == 0
+    assert "scheduling_settings" not in p.reset_performance_tracker()
+
+
+def test_InfiniteLoopingParallelismMixIn__applies_scheduling_settings_before_setup_and_reports_them(
+    mocker,
+):
+    mocked_setaffinity = mocker.patch.object(os, "sched_setaffinity", create=True)
+    mocker.patch.object(os, "sched_getaffinity", create=True, return_value={3, 2})
+    mocked_setpriority = mocker.patch.object(os, "setpriority", create=True)
+    mocker.patch.object(os, "getpriority", create=True, return_value=-5)
+    mocked_setscheduler = mocker.patch.object(os, "sched_setscheduler", create=True)
+    mocker.patch.object(
+        os, "sched_getparam", create=True, return_value=os.sched_param(10)
+    )
+    t = InfiniteThread(
+        queue.Queue(),
+        cpu_affinity={3, 2},
+        nice_level=-5,
+        scheduling_policy="fifo",
+        scheduling_priority=10,
+    )
+
+    original_setup_before_loop = t._setup_before_loop
+
+    def setup_before_loop():
+        assert mocked_setscheduler.call_count == 1
+        original_setup_before_loop()
+
+    mocker.patch.object(
+        t, "_setup_before_loop", autospec=True, side_effect=setup_before_loop
+    )
+
+    t.run(num_iterations=1)
+
+    assert t.get_scheduling_settings() == {
+        "cpu_affinity": [2, 3],
+        "nice_level": -5,
+        "scheduling_policy": "fifo",
+        "scheduling_priority": 10,
+    }
+    mocked_setaffinity.assert_called_once_with(0, [2, 3])
+    mocked_setpriority.assert_called_once_with(os.PRIO_PROCESS, 0, -5)
+    mocked_setscheduler.assert_called_once_with(0, os.SCHED_FIFO, os.sched_param(10))
+    assert t.reset_performance_tracker()["scheduling_settings"] == {
+        "cpu_affinity": [2, 3],
+        "nice_level": -5,
+        "scheduling_policy": "fifo",
+        "scheduling_priority": 10,
+        "errors": {},
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__logs_and_reports_scheduling_settings_that_cannot_be_applied__and_still_runs(
+    mocker, monkeypatch
+):
+    mocker.patch.object(
+        os, "sched_setaffinity", create=True, side_effect=OSError("invalid cpu")
+    )
+    mocker.patch.object(
+        os, "setpriority", create=True, side_effect=PermissionError("not permitted")
+    )
+    monkeypatch.delattr(os, "sched_setscheduler", raising=False)
+    mocked_warning = mocker.patch.object(logging, "warning", autospec=True)
+    t = InfiniteThreadThatCountsIterations(
+        queue.Queue(), cpu_affinity=[99], nice_level=-20, scheduling_policy="rr"
+    )
+
+    t.run(num_iterations=1)
+
+    assert t.get_num_iterations() == 1
+    errors = t.reset_performance_tracker()["scheduling_settings"]["errors"]
+    assert set(errors) == {"cpu_affinity", "nice_level", "scheduling_policy"}
+    assert "invalid cpu" in errors["cpu_affinity"]
+    assert "not permitted" in errors["nice_level"]
+    assert "AttributeError" in errors["scheduling_policy"]
+    assert mocked_warning.call_count == 3
+    assert "nice_level of -20" in mocked_warning.call_args_list[1][0][0]
+
+
+def test_InfiniteLoopingParallelismMixIn__reports_invalid_scheduling_settings_as_fatal_error_and_does_not_run(
+    mocker,
+):
+    error_queue = queue.Queue()
+    t = InfiniteThreadThatCountsIterations(error_queue, cpu_affinity=[-1])
+    spied_setup = mocker.spy(t, "_setup_before_loop")
+
+    t.run(num_iterations=1)
+
+    assert isinstance(error_queue.get_nowait(), ValueError)
+    assert spied_setup.call_count == 0
+    assert t.get_num_iterations() == 0
+    assert t.is_start_up_complete() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__applies_only_the_requested_scheduling_settings(
+    mocker,
+):
+    mocked_setaffinity = mocker.patch.object(os, "sched_setaffinity", create=True)
+    mocked_setpriority = mocker.patch.object(os, "setpriority", create=True)
+    mocker.patch.object(os, "sched_setscheduler", create=True)
+    mocker.patch.object(
+        os, "sched_getparam", create=True, return_value=os.sched_param(1)
+    )
+    t = InfiniteThread(queue.Queue(), scheduling_policy="rr")
+
+    t.run(num_iterations=1)
+
+    assert mocked_setaffinity.call_count == 0
+    assert mocked_setpriority.call_count == 0
+    assert t.reset_performance_tracker()["scheduling_settings"] == {
+        "scheduling_policy": "rr",
+        "scheduling_priority": 1,
+        "errors": {},
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__does_not_apply_scheduling_settings_if_setup_is_skipped(
+    mocker,
+):
+    t = InfiniteThread(queue.Queue(), nice_level=5)
+    spied_apply = mocker.spy(t, "_apply_scheduling_settings")
+    t.run(num_iterations=1, perform_setup_before_loop=False)
+    assert spied_apply.call_count == 0
+
+
+def control_flags_infinite_looper():
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        multiprocessing.Event(),
+        minimum_iteration_duration_seconds=0,
+        use_shared_control_flags=True,
+    )
+    return p
+
+
+def test_InfiniteLoopingParallelismMixIn__shared_control_flags_disabled_by_default():
+    p = generic_infinite_looper()
+    assert p.is_shared_control_flags_enabled() is False
+    assert control_flags_infinite_looper().is_shared_control_flags_enabled() is True
+
+
+def test_SharedControlFlags__sets_and_clears_each_flag_independently():
+    flags = SharedControlFlags()
+    flags.set_flag(SharedControlFlags.STOP)
+    flags.set_flag(SharedControlFlags.PAUSE)
+    flags.clear_flag(SharedControlFlags.STOP)
+    assert flags.get_flags() == SharedControlFlags.PAUSE
+
+
+def test_InfiniteLoopingParallelismMixIn__control_methods_set_shared_control_flags_and_events():
+    p = control_flags_infinite_looper()
+    flags = p._shared_control_flags
+    p.pause()
+    assert flags.get_flags() == SharedControlFlags.PAUSE
+    assert p.is_paused() is True
+    p.soft_stop()
+    assert flags.get_flags() == SharedControlFlags.PAUSE | SharedControlFlags.SOFT_STOP
+    assert p.is_preparing_for_soft_stop() is True
+    p.resume()
+    assert flags.get_flags() == SharedControlFlags.SOFT_STOP
+    assert p.is_paused() is False
+    p.stop()
+    assert flags.get_flags() == SharedControlFlags.SOFT_STOP | SharedControlFlags.STOP
+    assert p.is_stopped() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__shared_control_flags__loop_does_not_check_events(
+    mocker,
+):
+    p = control_flags_infinite_looper()
+    spied_commands = mocker.spy(p, "_commands_for_each_run_iteration")
+    for event in (p._stop_event, p._soft_stop_event, p._pause_event):
+        mocker.patch.object(event, "is_set", autospec=True, side_effect=AssertionError)
+
+    p.run(num_iterations=3, perform_setup_before_loop=False)
+
+    assert spied_commands.call_count == 3
+
+
+def test_InfiniteLoopingParallelismMixIn__shared_control_flags__pause_skips_commands_and_blocks_until_resumed(
+    mocker,
+):
+    p = control_flags_infinite_looper()
+    spied_commands = mocker.spy(p, "_commands_for_each_run_iteration")
+    p.pause()
+    mocked_wait = mocker.patch.object(
+        p._pause_control_event, "wait", autospec=True, side_effect=p.resume
+    )
+
+    p.run(num_iterations=2)
+
+    assert mocked_wait.call_count == 1
+    assert spied_commands.call_count == 1
+
+
+def test_InfiniteLoopingParallelismMixIn__shared_control_flags__soft_stop_only_stops_when_loop_can_be_soft_stopped(
+    mocker,
+):
+    p = control_flags_infinite_looper()
+    num_iterations_that_cannot_be_soft_stopped = [2]
+
+    def commands():
+        if num_iterations_that_cannot_be_soft_stopped[0] > 0:
+            num_iterations_that_cannot_be_soft_stopped[0] -= 1
+            p._process_can_be_soft_stopped = False
+
+    spied_commands = mocker.patch.object(
+        p, "_commands_for_each_run_iteration", autospec=True, side_effect=commands
+    )
+    p.soft_stop()
+
+    p.run()
+
+    assert spied_commands.call_count == 3
+    assert p.is_stopped() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__shared_control_flags__stops_after_error_in_commands(
+    mocker,
+):
+    error_queue = queue.Queue()
+    p = InfiniteLoopingParallelismMixIn(
+        error_queue,
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        use_shared_control_flags=True,
+    )
+    mocker.patch.object(
+        p,
+        "_commands_for_each_run_iteration",
+        autospec=True,
+        side_effect=ValueError("test message"),
+    )
+
+    p.run()
+
+    assert p.is_stopped() is True
+    assert p._shared_control_flags.get_flags() == SharedControlFlags.STOP
+    assert str(error_queue.get_nowait()) == "test message"
+
+
+def fixed_rate_infinite_looper(fixed_rate_overrun_policy):
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        minimum_iteration_duration_seconds=0.01,
+        fixed_rate_overrun_policy=fixed_rate_overrun_policy,
+    )
+    return p
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_for_unrecognized_fixed_rate_overrun_policy():
+    with pytest.raises(UnrecognizedFixedRateOverrunPolicyError, match="bogus"):
+        fixed_rate_infinite_looper("bogus")
+
+
+def test_InfiniteLoopingParallelismMixIn__fixed_rate_overrun_policy_is_disabled_by_default():
+    p = generic_infinite_looper()
+    assert p.get_fixed_rate_overrun_policy() is None
+    p.run(num_iterations=1)
+    assert "fixed_rate_schedule" not in p.reset_performance_tracker()
+
+
+@pytest.mark.parametrize("fixed_rate_overrun_policy", ["skip", "catch_up", "stretch"])
+def test_InfiniteLoopingParallelismMixIn__fixed_rate_schedule__compensates_for_sleep_overshoot_so_that_ticks_do_not_drift(
+    fixed_rate_overrun_policy, mocker
+):
+    p = fixed_rate_infinite_looper(fixed_rate_overrun_policy)
+    iteration_time_ns = 10 ** 6
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        return_value=iteration_time_ns,
+    )
+    # each iteration starts late because of sleep overshoot
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[0, 10_500_000, 20_200_000, 30_000_000],
+    )
+    mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
+
+    p.run(num_iterations=4, perform_setup_before_loop=False)
+
+    assert [call_args[0][0] for call_args in mocked_sleep.call_args_list] == [
+        0.009,
+        0.0085,
+        0.0088,
+    ]
+
+
+@pytest.mark.parametrize(
+    "fixed_rate_overrun_policy,expected_sleeps,expected_num_missed_ticks,test_description",
+    [
+        ("skip", [0.005, 0.009], 2, "skips missed ticks"),
+        ("catch_up", [0.003], 0, "runs missed ticks back-to-back"),
+        ("stretch", [0.009], 0, "restarts schedule after late iteration"),
+    ],
+)
+def test_InfiniteLoopingParallelismMixIn__fixed_rate_schedule__handles_overrun_according_to_policy(
+    fixed_rate_overrun_policy,
+    expected_sleeps,
+    expected_num_missed_ticks,
+    test_description,
+    mocker,
+):
+    p = fixed_rate_infinite_looper(fixed_rate_overrun_policy)
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        side_effect=[25_000_000, 10 ** 6, 10 ** 6, 10 ** 6],
+    )
+    start_timepoints = {
+        "skip": [0, 30_000_000, 40_000_000],
+        "catch_up": [0, 25_000_000, 26_000_000, 29_000_000],
+        "stretch": [0, 25_000_000, 35_000_000],
+    }[fixed_rate_overrun_policy]
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=start_timepoints + [50_000_000, 50_000_000, 50_000_000],
+    )
+    mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
+
+    p.run(
+        num_iterations=len(start_timepoints),
+        perform_setup_before_loop=False,
+    )
+    assert [
+        round(call_args[0][0], 9) for call_args in mocked_sleep.call_args_list
+    ] == expected_sleeps
+
+    p._start_timepoint_of_last_performance_measurement = 0
+    schedule_metrics = p.reset_performance_tracker()["fixed_rate_schedule"]
+    assert schedule_metrics["num_ticks"] == len(start_timepoints) - 1
+    assert schedule_metrics["num_missed_ticks"] == expected_num_missed_ticks
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__returns_tick_lateness_when_running_on_fixed_rate_schedule(
+    mocker,
+):
+    p = fixed_rate_infinite_looper("skip")
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        return_value=10 ** 6,
+    )
+    mocker.patch.object(time, "sleep", autospec=True)
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[0, 0, 0, 10_400_000, 20_200_000, 30_000_000, 40_000_000, 0],
+    )
+    p.run(num_iterations=4, perform_setup_before_loop=True)
+
+    actual = p.reset_performance_tracker()["fixed_rate_schedule"]
+    assert actual == {
+        "num_ticks": 3,
+        "num_missed_ticks": 0,
+        "mean_tick_lateness_ns": 200_000,
+        "max_tick_lateness_ns": 400_000,
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__get_shared_performance_counters_snapshot__raises_error_if_not_enabled():
+    p = generic_infinite_looper()
+    with pytest.raises(SharedPerformanceCountersNotEnabledError):
+        p.get_shared_performance_counters_snapshot()
+    with pytest.raises(SharedPerformanceCountersNotEnabledError):
+        p.get_shared_performance_counters_snapshot_with_iteration_time_buckets()
+
+
+def test_InfiniteLoopingParallelismMixIn__updates_shared_performance_counters_each_iteration(
+    mocker,
+):
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        minimum_iteration_duration_seconds=0.01,
+        use_shared_performance_counters=True,
+    )
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        side_effect=[2 * 10 ** 6, 12 * 10 ** 6],
+    )
+    mocker.patch.object(time, "sleep", autospec=True)
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[0, 0, 5, 5, 10 ** 7, 3 * 10 ** 7],
+    )
+
+    p.run(num_iterations=3)
+
+    assert p.get_shared_performance_counters_snapshot() == {
+        "start_timepoint_ns": 5,
+        "last_update_timepoint_ns": 22 * 10 ** 6,
+        "num_iterations": 2,
+        "total_iteration_time_ns": 14 * 10 ** 6,
+        "total_idle_time_ns": 8 * 10 ** 6,
+        "last_iteration_time_ns": 12 * 10 ** 6,
+        "max_iteration_time_ns": 12 * 10 ** 6,
+        "num_fatal_errors": 0,
+    }
+
+
+def adaptive_infinite_looper(minimum_iteration_duration_seconds=0.0064):
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        minimum_iteration_duration_seconds=minimum_iteration_duration_seconds,
+        use_adaptive_iteration_duration=True,
+    )
+    return p
+
+
+def test_InfiniteLoopingParallelismMixIn__adaptive_iteration_duration_is_disabled_by_default():
+    p = generic_infinite_looper()
+    assert p.is_adaptive_iteration_duration_enabled() is False
+    p.run(num_iterations=1)
+    assert "adaptive_iteration_duration_ns" not in p.reset_performance_tracker()
+
+
+def test_InfiniteLoopingParallelismMixIn__raises_error_if_adaptive_iteration_duration_combined_with_fixed_rate_schedule():
+    with pytest.raises(NotImplementedError, match="fixed rate"):
+        InfiniteLoopingParallelismMixIn(
+            queue.Queue(),
+            logging.INFO,
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            threading.Event(),
+            fixed_rate_overrun_policy="skip",
+            use_adaptive_iteration_duration=True,
+        )
+
+
+def test_InfiniteLoopingParallelismMixIn__adaptive_iteration_duration__shortens_to_zero_while_there_is_a_backlog_then_backs_off_to_the_minimum_iteration_duration():
+    p = adaptive_infinite_looper()
+    input_queue = queue.Queue()
+    p.register_input_queue(input_queue)
+    assert p.get_adaptive_iteration_duration_ns() == 6_400_000
+
+    input_queue.put_nowait("work")
+    actual_durations = [p._adapt_iteration_duration() for _ in range(8)]
+    assert actual_durations == [
+        3_200_000,
+        1_600_000,
+        800_000,
+        400_000,
+        200_000,
+        100_000,
+        0,
+        0,
+    ]
+
+    input_queue.get_nowait()
+    actual_durations = [p._adapt_iteration_duration() for _ in range(8)]
+    assert actual_durations == [
+        100_000,
+        200_000,
+        400_000,
+        800_000,
+        1_600_000,
+        3_200_000,
+        6_400_000,
+        6_400_000,
+    ]
+    assert p.get_adaptive_iteration_duration_ns() == 6_400_000
+
+
+def test_InfiniteLoopingParallelismMixIn__adaptive_iteration_duration__sleeps_for_the_adapted_duration_and_reports_it_in_performance_tracker(
+    mocker,
+):
+    p = adaptive_infinite_looper(minimum_iteration_duration_seconds=0.01)
+    mocker.patch.object(p, "_get_backlog_size", autospec=True, return_value=5)
+    mocker.patch.object(
+        parallelism_framework,
+        "calculate_iteration_time_ns",
+        autospec=True,
+        return_value=0,
+    )
+    mocked_sleep = mocker.patch.object(time, "sleep", autospec=True)
+
+    p.run(num_iterations=3)
+
+    assert mocked_sleep.call_args_list == [mocker.call(0.005), mocker.call(0.0025)]
+    assert p.reset_performance_tracker()["adaptive_iteration_duration_ns"] == {
+        "current": 2_500_000,
+        "mean": 3_750_000,
+    }
+    assert p.reset_performance_tracker()["adaptive_iteration_duration_ns"] == {
+        "current": 2_500_000,
+        "mean": 0,
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__get_backlog_size__totals_sizes_of_all_kinds_of_registered_input_queues(
+    mocker,
+):
+    p = adaptive_infinite_looper()
+    threading_queue = queue.Queue()
+    multiprocessing_queue = multiprocessing.Queue()
+    simple_queue = SimpleMultiprocessingQueue()
+    for the_queue in (threading_queue, multiprocessing_queue, simple_queue):
+        p.register_input_queue(the_queue)
+    assert p._get_backlog_size() == 0
+
+    for _ in range(3):
+        threading_queue.put_nowait("work")
+        multiprocessing_queue.put_nowait("work")
+        simple_queue.put("work")
+    assert is_queue_eventually_not_empty(multiprocessing_queue) is True
+    mocker.patch.object(multiprocessing_queue, "qsize", return_value=2)
+    assert p._get_backlog_size() == 6
+
+    # multiprocessing.Queue.qsize is not implemented on some platforms, so only whether the queue is empty can be used
+    mocker.patch.object(multiprocessing_queue, "qsize", side_effect=NotImplementedError)
+    assert p._get_backlog_size() == 5
+
+
+def test_InfiniteLoopingParallelismMixIn__register_input_queue__also_registers_wakeup_queue_if_event_driven_wakeup_enabled(
+    mocker,
+):
+    p = adaptive_infinite_looper()
+    spied_register = mocker.spy(p, "register_wakeup_queue")
+    p.register_input_queue(queue.Queue())
+    spied_register.assert_not_called()
+
+    p = wakeup_infinite_looper()
+    spied_register = mocker.spy(p, "register_wakeup_queue")
+    input_queue = queue.Queue()
+    p.register_input_queue(input_queue)
+    spied_register.assert_called_once_with(input_queue)
+
+
+def batched_infinite_looper(**kwargs):
+    p = InfiniteLoopingParallelismMixIn(
+        queue.Queue(),
+        logging.INFO,
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        threading.Event(),
+        minimum_iteration_duration_seconds=0.01,
+        **kwargs,
+    )
+    return p
+
+
+def test_InfiniteLoopingParallelismMixIn__handles_at_most_max_input_items_per_iteration__and_prevents_soft_stop_until_all_items_handled():
+    p = batched_infinite_looper(max_input_items_per_iteration=2)
+    input_queue = queue.Queue()
+    for i in range(5):
+        input_queue.put_nowait(i)
+    handled_items = list()
+    p.register_input_queue(input_queue, item_handler=handled_items.append)
+    p.soft_stop()
+
+    p.run(num_iterations=1)
+    assert handled_items == [0, 1]
+    assert p.is_stopped() is False
+
+    p.run(num_iterations=1)
+    assert handled_items == [0, 1, 2, 3]
+    assert p.is_stopped() is False
+
+    p.run(num_iterations=1)
+    assert handled_items == [0, 1, 2, 3, 4]
+    assert p.is_stopped() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__stops_handling_input_items_once_time_budget_for_iteration_is_used(
+    mocker,
+):
+    p = batched_infinite_looper(max_input_item_handling_seconds_per_iteration=10e-9)
+    input_queue = queue.Queue()
+    for i in range(5):
+        input_queue.put_nowait(i)
+    handled_items = list()
+    p.register_input_queue(input_queue, item_handler=handled_items.append)
+    mocker.patch.object(
+        time, "perf_counter_ns", autospec=True, side_effect=[0, 4, 8, 12]
+    )
+
+    p._handle_items_from_input_queues()
+
+    assert handled_items == [0, 1, 2]
+    assert p._process_can_be_soft_stopped is False
+
+
+def test_InfiniteLoopingParallelismMixIn__handles_input_items_from_all_kinds_of_queues_in_order_of_registration():
+    p = batched_infinite_looper()
+    handled_items = list()
+    simple_queue = SimpleMultiprocessingQueue()
+    multiprocessing_queue = multiprocessing.Queue()
+    threading_queue = queue.Queue()
+    for the_queue in (simple_queue, multiprocessing_queue, threading_queue):
+        p.register_input_queue(the_queue, item_handler=handled_items.append)
+    # a queue without a handler is only used to measure backlog
+    p.register_input_queue(queue.Queue())
+    for name, the_queue in (
+        ("threading", threading_queue),
+        ("multiprocessing", multiprocessing_queue),
+    ):
+        for i in range(2):
+            the_queue.put_nowait(f"{name} {i}")
+    simple_queue.put("simple 0")
+    assert is_queue_eventually_not_empty(multiprocessing_queue) is True
+    # the first item being visible does not mean the feeder thread has also flushed the second one
+    time.sleep(0.5)
+
+    p.run(num_iterations=1)
+
+    assert handled_items == [
+        "simple 0",
+        "multiprocessing 0",
+        "multiprocessing 1",
+        "threading 0",
+        "threading 1",
+    ]
+    assert p._process_can_be_soft_stopped is True
+
+
+def test_InfiniteLoopingParallelismMixIn__reports_error_raised_by_input_item_handler_and_stops():
+    p = batched_infinite_looper()
+    expected_error = ValueError("bad item")
+
+    def raise_error(item):
+        raise expected_error
+
+    input_queue = queue.Queue()
+    input_queue.put_nowait("item")
+    p.register_input_queue(input_queue, item_handler=raise_error)
+
+    p.run(num_iterations=1, perform_teardown_after_loop=False)
+
+    assert p.is_stopped() is True
+    assert p.get_fatal_error_reporter().get_nowait() is expected_error
+
+
+def test_InfiniteLoopingParallelismMixIn__reset_performance_tracker__returns_input_item_throughput_and_handling_times(
+    mocker,
+):
+    p = batched_infinite_looper()
+    p.run(num_iterations=1)
+    assert "input_items" not in p.reset_performance_tracker()
+    input_queue = queue.Queue()
+    input_queue.put_nowait("item 0")
+    input_queue.put_nowait("item 1")
+    p.register_input_queue(input_queue, item_handler=lambda item: None)
+    mocker.patch.object(
+        time,
+        "perf_counter_ns",
+        autospec=True,
+        side_effect=[0, 0, 10, 30, 10 ** 9, 10 ** 9, 10 ** 9, 2 * 10 ** 9, 2 * 10 ** 9],
+    )
+    p._reset_performance_measurements()
+    p._handle_items_from_input_queues()
+
+    assert p.reset_performance_tracker()["input_items"] == {
+        "num_handled": 2,
+        "items_per_second": 2.0,
+        "handling_time_percentiles": {
+            "p50": 10,
+            "p90": 20,
+            "p99": 20,
+            "p99.9": 20,
+            "max": 20,
+        },
+    }
+    p._handle_items_from_input_queues()
+    assert p.reset_performance_tracker()["input_items"]["num_handled"] == 0
+
+
+def test_InfiniteLoopingParallelismMixIn__does_not_send_performance_reports_unless_enabled():
+    p = generic_infinite_looper()
+    p.run(num_iterations=3)
+    with pytest.raises(NotImplementedError, match="must be enabled"):
+        p._send_performance_report(0)
+
+
+def test_InfiniteLoopingParallelismMixIn__periodic_performance_reports__are_put_into_queue_each_interval():
+    report_queue = queue.Queue()
+    p = batched_infinite_looper()
+    p._minimum_iteration_duration_seconds = 0
+    p.enable_periodic_performance_reports(report_queue, 0)
+    p.run(num_iterations=3)
+
+    reports = [report_queue.get_nowait() for _ in range(3)]
+    assert report_queue.empty() is True
+    assert reports[0]["communication_type"] == "performance_report"
+    assert [report["num_iterations"] for report in reports] == [0, 1, 1]
+    assert set(reports[2].keys()) == {
+        "communication_type",
+        "start_timepoint_of_measurements",
+        "measurement_duration_ns",
+        "num_iterations",
+        "percent_use",
+        "iteration_time_percentiles",
+    }
+    assert reports[2]["measurement_duration_ns"] > 0
+    assert (
+        reports[2]["start_timepoint_of_measurements"]
+        > reports[1]["start_timepoint_of_measurements"]
+    )
+
+
+def test_InfiniteLoopingParallelismMixIn__periodic_performance_reports__are_not_sent_until_interval_has_elapsed():
+    report_queue = queue.Queue()
+    p = generic_infinite_looper()
+    p.enable_periodic_performance_reports(report_queue, 60)
+    p.run(num_iterations=3)
+    assert report_queue.empty() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__periodic_performance_reports__are_passed_to_callback_with_input_items_and_queue_depths(
+    mocker,
+):
+    mocked_callback = mocker.Mock()
+    input_queue = queue.Queue()
+    for item in ("item 0", "item 1"):
+        input_queue.put_nowait(item)
+    p = batched_infinite_looper()
+    p.register_input_queue(input_queue, item_handler=lambda item: None)
+    p.enable_periodic_performance_reports(
+        mocked_callback,
+        0.5,
+        queues_to_report={
+            "input": input_queue,
+            "simple": SimpleMultiprocessingQueue(),
+        },
+    )
+    p.run(num_iterations=1)
+    mocked_callback.assert_not_called()
+
+    p._begin_iteration(p._next_performance_report_timepoint_ns)
+
+    report = mocked_callback.call_args[0][0]
+    assert report["num_input_items_handled"] == 2
+    assert report["input_items_per_second"] > 0
+    assert report["queue_depths"] == {"input": 0, "simple": None}
+    assert p._next_performance_report_timepoint_ns == (
+        p.get_heartbeat_timepoint_ns() + int(0.5 * 10 ** 9)
+    )
+
+
+def test_InfiniteLoopingParallelismMixIn__periodic_performance_reports__are_dropped_while_destination_queue_is_full(
+    mocker,
+):
+    spied_warning = mocker.spy(parallelism_framework.logging, "warning")
+    report_queue = queue.Queue(maxsize=1)
+    p = batched_infinite_looper()
+    p._minimum_iteration_duration_seconds = 0
+    p.enable_periodic_performance_reports(report_queue, 0)
+    p.run(num_iterations=3)
+
+    assert report_queue.get_nowait()["num_iterations"] == 0
+    assert p.get_fatal_error_reporter().empty() is True
+    assert p.is_stopped() is False
+    assert spied_warning.call_count == 2
+    assert "destination queue is full" in spied_warning.call_args[0][0]
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteLoopingParallelismMixIn__periodic_performance_reports__error_in_callback_is_reported_and_stops_loop():
+    error_queue = queue.Queue()
+    t = InfiniteThread(error_queue, minimum_iteration_duration_seconds=0)
+
+    def raise_error(report):
+        raise ValueError("bad report")
+
+    t.enable_periodic_performance_reports(raise_error, 0)
+    t.start()
+    t.join(timeout=5)
+
+    assert t.is_alive() is False
+    assert t.is_stopped() is True
+    assert t.is_teardown_complete() is True
+    assert str(error_queue.get_nowait()) == "bad report"
+    assert error_queue.empty() is True
+
+
+def test_InfiniteLoopingParallelismMixIn__take_memory_measurement__raises_error_unless_memory_monitoring_enabled():
+    p = generic_infinite_looper()
+    p.run(num_iterations=1)
+    assert "memory" not in p.reset_performance_tracker()
+    with pytest.raises(NotImplementedError, match="must be enabled"):
+        p._take_memory_measurement(0)
+
+
+def test_InfiniteLoopingParallelismMixIn__memory_monitoring__measures_each_interval_and_returns_latest_measurement_in_performance_tracker():
+    p = batched_infinite_looper()
+    p._minimum_iteration_duration_seconds = 0
+    p.enable_memory_monitoring(interval_seconds=0, num_top_allocation_sites=2)
+    p.run(num_iterations=2)
+
+    assert tracemalloc.is_tracing() is False
+    memory = p.reset_performance_tracker()["memory"]
+    assert memory["rss_bytes"] > 0
+    assert len(memory["top_allocation_sites"]) <= 2
+    assert p.reset_performance_tracker()["memory"] is memory
+
+
+def test_InfiniteLoopingParallelismMixIn__memory_monitoring__growth_warning_turned_into_error_is_reported_and_stops_loop():
+    p = batched_infinite_looper()
+    p._minimum_iteration_duration_seconds = 0
+    p.enable_memory_monitoring(
+        interval_seconds=0, growth_warning_threshold_bytes_per_second=-1
+    )
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        p.run(num_iterations=3)
+
+    assert isinstance(p.get_fatal_error_reporter().get_nowait(), MemoryGrowthWarning)
+    assert p.is_stopped() is True
+    assert p.is_teardown_complete() is True
+    assert tracemalloc.is_tracing() is False
+
+
+def test_InfiniteLoopingParallelismMixIn__memory_monitoring__is_included_in_periodic_performance_reports_once_measured():
+    report_queue = queue.Queue()
+    p = batched_infinite_looper()
+    p.enable_memory_monitoring(interval_seconds=60, use_tracemalloc=False)
+    p.enable_periodic_performance_reports(report_queue, 30)
+    p.run(num_iterations=1, perform_teardown_after_loop=False)
+    assert p._next_periodic_task_timepoint_ns == p._next_performance_report_timepoint_ns
+
+    p._begin_iteration(p._next_performance_report_timepoint_ns)
+    assert "memory" not in report_queue.get_nowait()
+    assert p._next_periodic_task_timepoint_ns == p._next_memory_measurement_timepoint_ns
+
+    p._begin_iteration(p._next_memory_measurement_timepoint_ns)
+    assert set(report_queue.get_nowait()["memory"].keys()) == {
+        "rss_bytes",
+        "rss_growth_bytes_per_second",
+        "traced_growth_bytes_per_second",
+    }
+    p._finish_running()
+
+
+class InfiniteThreadThatSpendsIterationsOnCpuOrBlocked(InfiniteThread):
+    def __init__(self, *args, block=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._block = block
+
+    def _commands_for_each_run_iteration(self):
+        if self._block:
+            time.sleep(0.005)
+            return
+        end_timepoint = time.perf_counter() + 0.005
+        while time.perf_counter() < end_timepoint:
+            pass
+
+
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking_is_disabled_by_default():
+    p = generic_infinite_looper()
+    assert p.is_cpu_time_tracking_enabled() is False
+    p.run(num_iterations=2)
+    metrics = p.reset_performance_tracker()
+    assert "cpu_time" not in metrics
+    assert "resource_usage" not in metrics
+
+
+@pytest.mark.parametrize("block", [False, True])
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking__splits_busy_time_of_iterations_into_on_cpu_and_off_cpu_time(
+    block,
+):
+    t = InfiniteThreadThatSpendsIterationsOnCpuOrBlocked(
+        queue.Queue(),
+        minimum_iteration_duration_seconds=0,
+        use_cpu_time_tracking=True,
+        block=block,
+    )
+    assert t.is_cpu_time_tracking_enabled() is True
+    t.run(num_iterations=5, perform_teardown_after_loop=False)
+    metrics = t.reset_performance_tracker()
+
+    cpu_time = metrics["cpu_time"]
+    # no idle time is recorded after the final iteration
+    assert cpu_time["busy_time_ns"] >= 4 * 5 * 10 ** 6
+    assert (
+        cpu_time["on_cpu_time_ns"]
+        + cpu_time["descheduled_time_ns"]
+        + cpu_time["blocked_time_ns"]
+        == cpu_time["busy_time_ns"]
+    )
+    if block:
+        assert cpu_time["blocked_time_ns"] > cpu_time["busy_time_ns"] / 2
+        assert metrics["resource_usage"]["voluntary_context_switches"] >= 4
+    else:
+        assert cpu_time["on_cpu_time_ns"] > cpu_time["busy_time_ns"] / 2
+    assert all(value >= 0 for value in metrics["resource_usage"].values())
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking__reports_statistics_of_loop_thread_when_reset_from_another_thread(
+    mocker,
+):
+    spied_get_usage = mocker.spy(parallelism_framework, "get_thread_resource_usage")
+    t = InfiniteThreadThatSpendsIterationsOnCpuOrBlocked(
+        queue.Queue(),
+        minimum_iteration_duration_seconds=0,
+        use_cpu_time_tracking=True,
+        block=True,
+    )
+    t.start()
+    # this thread only blocks once while the loop thread blocks on every iteration
+    time.sleep(0.2)
+    metrics = t.reset_performance_tracker()
+    t.stop()
+    t.join()
+
+    spied_get_usage.assert_called_with(t.native_id)
+    assert metrics["resource_usage"]["voluntary_context_switches"] >= 10
+    assert metrics["cpu_time"]["descheduled_time_ns"] is not None
+
+
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking__caps_descheduled_time_at_busy_time_not_on_cpu(
+    mocker,
+):
+    mocked_get_stats = mocker.patch.object(
+        parallelism_framework,
+        "get_thread_scheduler_stats",
+        autospec=True,
+        side_effect=[
+            {"on_cpu_time_ns": 0, "run_queue_wait_time_ns": 100},
+            {"on_cpu_time_ns": 0, "run_queue_wait_time_ns": 130},
+            {"on_cpu_time_ns": 0, "run_queue_wait_time_ns": 130},
+            {"on_cpu_time_ns": 0, "run_queue_wait_time_ns": 10 ** 6},
+            None,
+            None,
+            None,
+        ],
+    )
+    p = batched_infinite_looper(use_cpu_time_tracking=True)
+    p._reset_performance_measurements()
+    for expected_cpu_time in (
+        {
+            "busy_time_ns": 100,
+            "on_cpu_time_ns": 60,
+            "descheduled_time_ns": 30,
+            "blocked_time_ns": 10,
+        },
+        {
+            "busy_time_ns": 100,
+            "on_cpu_time_ns": 60,
+            "descheduled_time_ns": 40,
+            "blocked_time_ns": 0,
+        },
+    ):
+        p._iteration_time_histogram.record_value(100)
+        p._cpu_time_during_iterations_ns = 60
+        assert p.reset_performance_tracker()["cpu_time"] == expected_cpu_time
+    mocked_get_stats.assert_called_with(p._trace_thread_id)
+
+    p._iteration_time_histogram.record_value(100)
+    p._cpu_time_during_iterations_ns = 200
+    assert p.reset_performance_tracker()["cpu_time"] == {
+        "busy_time_ns": 100,
+        "on_cpu_time_ns": 100,
+        "descheduled_time_ns": None,
+        "blocked_time_ns": 0,
+    }
+
+
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking__only_reports_on_cpu_time_if_platform_has_no_thread_statistics(
+    mocker,
+):
+    for function_name in ("get_thread_scheduler_stats", "get_thread_resource_usage"):
+        mocker.patch.object(
+            parallelism_framework, function_name, autospec=True, return_value=None
+        )
+    p = batched_infinite_looper(use_cpu_time_tracking=True)
+    p.run(num_iterations=2)
+    metrics = p.reset_performance_tracker()
+    assert metrics["cpu_time"]["descheduled_time_ns"] is None
+    assert "resource_usage" not in metrics
+
+
+def test_InfiniteLoopingParallelismMixIn__cpu_time_tracking__is_included_in_periodic_performance_reports():
+    report_queue = queue.Queue()
+    p = batched_infinite_looper(use_cpu_time_tracking=True)
+    p._minimum_iteration_duration_seconds = 0
+    p.enable_periodic_performance_reports(report_queue, 0)
+    p.run(num_iterations=2)
+    report_queue.get_nowait()
+    report = report_queue.get_nowait()
+    assert report["num_iterations"] == 1
+    assert report["cpu_time"]["busy_time_ns"] > 0
+    assert "voluntary_context_switches" in report["resource_usage"]
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+import io
+import math
+import queue
+from statistics import mean
+from statistics import stdev
+import threading
+import time
+
+import pytest
+from stdlib_utils import get_thread_resource_usage
+from stdlib_utils import get_thread_scheduler_stats
+from stdlib_utils import LogBucketedHistogram
+from stdlib_utils import performance_tracking
+from stdlib_utils import RunningStatistics
+from stdlib_utils import SharedPerformanceCounters
+
+
+def test_LogBucketedHistogram__counts_small_values_exactly():
+    histogram = LogBucketedHistogram()
+    for value in range(32):
+        histogram.record_value(value)
+    assert histogram.get_nonzero_buckets() == [(i, i, 1) for i in range(32)]
+    assert histogram.get_total_count() == 32
+    assert histogram.get_max_value() == 31
+    assert histogram.get_mean() == 15.5
+    assert histogram.get_sum_of_values() == 496
+
+
+def test_LogBucketedHistogram__records_negative_values_as_zero():
+    histogram = LogBucketedHistogram()
+    histogram.record_value(-5)
+    assert histogram.get_nonzero_buckets() == [(0, 0, 1)]
+
+
+@pytest.mark.parametrize("value", [32, 33, 63, 64, 1000, 123_456_789, 2 ** 39 - 1])
+def test_LogBucketedHistogram__places_large_values_in_bucket_with_bounded_relative_error(
+    value,
+):
+    histogram = LogBucketedHistogram()
+    histogram.record_value(value)
+    ((lowest, highest, count),) = histogram.get_nonzero_buckets()
+    assert count == 1
+    assert lowest <= value <= highest
+    assert (highest - lowest + 1) / lowest <= 2 ** -4
+
+
+def test_LogBucketedHistogram__values_above_max_trackable_value_are_counted_in_highest_bucket():
+    histogram = LogBucketedHistogram(max_value_bits=10)
+    histogram.record_value(2 ** 10 - 1)
+    histogram.record_value(2 ** 20)
+    ((lowest, highest, count),) = histogram.get_nonzero_buckets()
+    assert count == 2
+    assert highest == 2 ** 10 - 1
+    assert histogram.get_max_value() == 2 ** 20
+
+
+def test_LogBucketedHistogram__uses_constant_memory():
+    histogram = LogBucketedHistogram()
+    initial_num_buckets = len(histogram._counts)
+    for value in range(0, 2 ** 45, 2 ** 35):
+        histogram.record_value(value)
+    assert len(histogram._counts) == initial_num_buckets
+
+
+def test_LogBucketedHistogram__get_percentiles__returns_None_when_empty():
+    histogram = LogBucketedHistogram()
+    assert histogram.get_mean() is None
+    assert histogram.get_percentiles() == {
+        "p50": None,
+        "p90": None,
+        "p99": None,
+        "p99.9": None,
+        "max": None,
+    }
+
+
+def test_LogBucketedHistogram__get_value_at_percentile__is_within_precision_and_never_exceeds_max():
+    histogram = LogBucketedHistogram()
+    for value in range(1, 10_001):
+        histogram.record_value(value * 1000)
+    assert histogram.get_value_at_percentile(50) == pytest.approx(5_000_000, rel=0.07)
+    assert histogram.get_value_at_percentile(99) == pytest.approx(9_900_000, rel=0.07)
+    assert histogram.get_value_at_percentile(100) == 10_000_000
+    assert histogram.get_percentiles()["max"] == 10_000_000
+
+
+def test_RunningStatistics__get_metrics__matches_statistics_computed_over_all_values():
+    values = [3.5, 1.25, 8.0, 4.75, 2.0, 9.5]
+    running_statistics = RunningStatistics(num_recent_values_to_keep=2)
+    for value in values:
+        running_statistics.add_value(value, 1)
+
+    actual = running_statistics.get_metrics()
+    assert actual["max"] == max(values)
+    assert actual["min"] == min(values)
+    assert actual["mean"] == pytest.approx(mean(values))
+    assert actual["stdev"] == pytest.approx(stdev(values))
+    assert running_statistics.get_count() == len(values)
+
+
+def test_RunningStatistics__keeps_only_the_most_recent_values():
+    running_statistics = RunningStatistics(num_recent_values_to_keep=3)
+    for value in range(10):
+        running_statistics.add_value(value, 1)
+    assert list(running_statistics.get_recent_values()) == [7, 8, 9]
+
+
+def test_RunningStatistics__get_metrics__returns_None_and_zero_stdev_when_empty():
+    running_statistics = RunningStatistics()
+    assert running_statistics.get_metrics() == {
+        "max": None,
+        "min": None,
+        "stdev": 0.0,
+        "mean": None,
+        "ewma_1_minute": None,
+        "ewma_5_minute": None,
+        "ewma_15_minute": None,
+    }
+
+
+def test_RunningStatistics__exponentially_weighted_averages_decay_according_to_elapsed_time():
+    running_statistics = RunningStatistics()
+    running_statistics.add_value(100, 5)
+    running_statistics.add_value(0, 60)
+
+    actual = running_statistics.get_metrics()
+    assert actual["ewma_1_minute"] == pytest.approx(100 * math.exp(-1))
+    assert actual["ewma_5_minute"] == pytest.approx(100 * math.exp(-60 / 300))
+    assert actual["ewma_15_minute"] == pytest.approx(100 * math.exp(-60 / 900))
+
+
+def test_SharedPerformanceCounters__get_snapshot__returns_cumulative_counters():
+    counters = SharedPerformanceCounters()
+    counters.mark_start(100)
+    counters.record_iteration(30, 70, 130)
+    counters.record_iteration(50, 50, 280)
+    counters.record_iteration(10, 90, 390)
+
+    assert counters.get_snapshot() == {
+        "start_timepoint_ns": 100,
+        "last_update_timepoint_ns": 390,
+        "num_iterations": 3,
+        "total_iteration_time_ns": 90,
+        "total_idle_time_ns": 210,
+        "last_iteration_time_ns": 10,
+        "max_iteration_time_ns": 50,
+        "num_fatal_errors": 0,
+    }
+
+
+def test_SharedPerformanceCounters__get_snapshot_with_iteration_time_buckets__counts_iteration_times_in_fixed_buckets():
+    counters = SharedPerformanceCounters()
+    bounds = performance_tracking.SHARED_ITERATION_TIME_BUCKET_BOUNDS_NS
+    counters.record_iteration(bounds[0], 0, 100)
+    counters.record_iteration(bounds[0] + 1, 0, 200)
+    counters.record_iteration(bounds[-1] + 1, 0, 300)
+    counters.record_iteration(bounds[-1] + 1, 0, 400)
+
+    snapshot, bucket_counts = counters.get_snapshot_with_iteration_time_buckets()
+
+    assert snapshot == counters.get_snapshot()
+    assert bucket_counts == [1, 1] + [0] * (len(bounds) - 2) + [2]
+
+
+def test_SharedPerformanceCounters__record_fatal_error__counts_errors():
+    counters = SharedPerformanceCounters()
+    counters.record_fatal_error()
+    counters.record_fatal_error()
+    snapshot = counters.get_snapshot()
+    assert snapshot["num_fatal_errors"] == 2
+    assert snapshot["num_iterations"] == 0
+    assert counters._values[0] % 2 == 0
+
+
+def test_SharedPerformanceCounters__get_snapshot__retries_while_a_write_is_in_progress(
+    mocker,
+):
+    counters = SharedPerformanceCounters()
+    counters.record_iteration(30, 70, 130)
+    counters._values[0] += 1  # simulate the writer being partway through an update
+    counters._values[3] = 999
+
+    def finish_write(*args):
+        counters._values[3] = 2
+        counters._values[0] += 1
+
+    mocked_sleep = mocker.patch.object(
+        performance_tracking.time, "sleep", autospec=True, side_effect=finish_write
+    )
+
+    assert counters.get_snapshot()["num_iterations"] == 2
+    mocked_sleep.assert_called_once_with(0)
+
+
+def test_SharedPerformanceCounters__calculate_percent_use__between_snapshots():
+    counters = SharedPerformanceCounters()
+    counters.record_iteration(30, 70, 100)
+    earlier_snapshot = counters.get_snapshot()
+    counters.record_iteration(60, 40, 200)
+    later_snapshot = counters.get_snapshot()
+
+    assert SharedPerformanceCounters.calculate_percent_use(
+        earlier_snapshot, later_snapshot
+    ) == pytest.approx(60)
+    assert (
+        SharedPerformanceCounters.calculate_percent_use(later_snapshot, later_snapshot)
+        is None
+    )
+
+
+def block_repeatedly(native_thread_id_queue, release_event):
+    for _ in range(20):
+        time.sleep(0.001)
+    native_thread_id_queue.put(threading.get_native_id())
+    release_event.wait()
+
+
+@pytest.mark.timeout(10)
+def test_get_thread_resource_usage__returns_counters_of_given_thread():
+    native_thread_id_queue = queue.Queue()
+    release_event = threading.Event()
+    t = threading.Thread(
+        target=block_repeatedly, args=(native_thread_id_queue, release_event)
+    )
+    t.start()
+    usage = get_thread_resource_usage(native_thread_id_queue.get())
+    release_event.set()
+    t.join()
+
+    assert set(usage.keys()) == {
+        "voluntary_context_switches",
+        "involuntary_context_switches",
+        "minor_page_faults",
+        "major_page_faults",
+    }
+    assert usage["voluntary_context_switches"] >= 20
+    assert all(value >= 0 for value in usage.values())
+
+
+def test_get_thread_resource_usage__returns_none_if_counters_are_not_available(
+    mocker,
+):
+    assert get_thread_resource_usage(-1) is None
+    mocker.patch.object(
+        performance_tracking,
+        "open",
+        create=True,
+        side_effect=[io.StringIO("Name:\tpython\n"), io.StringIO("1 (python) R")],
+    )
+    assert get_thread_resource_usage(threading.get_native_id()) is None
+
+
+def test_get_thread_scheduler_stats__returns_cpu_and_run_queue_wait_time_of_thread():
+    stats = get_thread_scheduler_stats(threading.get_native_id())
+    assert stats["on_cpu_time_ns"] > 0
+    assert stats["run_queue_wait_time_ns"] >= 0
+
+
+@pytest.mark.parametrize(
+    "test_description,side_effect",
+    [
+        ("thread does not exist", OSError),
+        ("unexpected format", ValueError),
+    ],
+)
+def test_get_thread_scheduler_stats__returns_none_if_not_available(
+    test_description, side_effect, mocker
+):
+    mocker.patch.object(
+        performance_tracking, "open", create=True, side_effect=side_effect
+    )
+    assert get_thread_scheduler_stats(threading.get_native_id()) is None
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+
+import pytest
+from stdlib_utils import InfiniteProcess
+from stdlib_utils import InfiniteProcessPool
+from stdlib_utils import is_queue_eventually_not_empty
+from stdlib_utils import process_pool
+from stdlib_utils import put_object_into_queue_and_raise_error_if_eventually_still_empty
+from stdlib_utils import UnrecognizedWorkDistributionStrategyError
+
+
+class InfiniteProcessThatEchoesInputItems(InfiniteProcess):
+    def __init__(self, input_queue, output_queue, fatal_error_reporter, **kwargs):
+        super().__init__(fatal_error_reporter, **kwargs)
+        self._output_queue = output_queue
+        self.register_input_queue(input_queue, item_handler=self._echo_item)
+
+    def _echo_item(self, item):
+        self._output_queue.put_nowait(item)
+
+
+class InfiniteProcessThatRaisesErrorForItems(InfiniteProcessThatEchoesInputItems):
+    def _echo_item(self, item):
+        raise ValueError(f"bad item {item}")
+
+
+def drain_worker_input_queues(pool):
+    items_in_each_queue = list()
+    for the_queue in pool.get_worker_input_queues():
+        items = list()
+        while is_queue_eventually_not_empty(the_queue):
+            items.append(the_queue.get_nowait())
+        items_in_each_queue.append(items)
+    return items_in_each_queue
+
+
+def test_InfiniteProcessPool__raises_error_for_unrecognized_distribution_strategy():
+    with pytest.raises(UnrecognizedWorkDistributionStrategyError, match="bogus"):
+        InfiniteProcessPool(
+            InfiniteProcessThatEchoesInputItems,
+            num_workers=1,
+            distribution_strategy="bogus",
+        )
+
+
+def test_InfiniteProcessPool__raises_error_if_key_hash_used_without_key_function():
+    with pytest.raises(NotImplementedError, match="key_function"):
+        InfiniteProcessPool(
+            InfiniteProcessThatEchoesInputItems,
+            num_workers=1,
+            distribution_strategy="key_hash",
+        )
+
+
+def test_InfiniteProcessPool__creates_one_worker_per_cpu_by_default_sharing_output_queue_and_fatal_error_reporter(
+    mocker,
+):
+    mocker.patch.object(multiprocessing, "cpu_count", autospec=True, return_value=3)
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        worker_kwargs={"minimum_iteration_duration_seconds": 0.5},
+    )
+    workers = pool.get_workers()
+    assert len(workers) == 3
+    assert len(pool.get_worker_input_queues()) == 3
+    assert pool.get_distribution_strategy() == "round_robin"
+    for worker in workers:
+        assert worker.get_fatal_error_reporter() is pool.get_fatal_error_reporter()
+        assert worker._output_queue is pool.get_output_queue()
+        assert worker.get_minimum_iteration_duration_seconds() == 0.5
+
+
+def test_InfiniteProcessPool__round_robin__sends_items_to_each_worker_in_turn():
+    pool = InfiniteProcessPool(InfiniteProcessThatEchoesInputItems, num_workers=3)
+    for item in range(7):
+        pool._dispatcher._dispatch_item(item)
+    assert drain_worker_input_queues(pool) == [[0, 3, 6], [1, 4], [2, 5]]
+
+
+def test_InfiniteProcessPool__key_hash__sends_items_with_same_key_to_same_worker():
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        num_workers=3,
+        distribution_strategy="key_hash",
+        key_function=lambda item: item[0],
+    )
+    items = [(key, value) for value in range(3) for key in range(5)]
+    for item in items:
+        pool._dispatcher._dispatch_item(item)
+    items_in_each_queue = drain_worker_input_queues(pool)
+
+    assert sum(len(items) for items in items_in_each_queue) == len(items)
+    for key in range(5):
+        expected_worker_index = hash(key) % 3
+        assert [
+            item
+            for item in items_in_each_queue[expected_worker_index]
+            if item[0] == key
+        ] == [(key, 0), (key, 1), (key, 2)]
+
+
+def test_InfiniteProcessPool__least_loaded__enables_shared_performance_counters_and_sends_items_to_workers_with_lowest_percent_use(
+    mocker,
+):
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        num_workers=2,
+        distribution_strategy="least_loaded",
+    )
+    busy_worker, idle_worker = pool.get_workers()
+    snapshots = {
+        busy_worker: [
+            {"total_iteration_time_ns": 0, "total_idle_time_ns": 0},
+            {"total_iteration_time_ns": 90, "total_idle_time_ns": 10},
+            {"total_iteration_time_ns": 90, "total_idle_time_ns": 10},
+        ],
+        idle_worker: [
+            {"total_iteration_time_ns": 0, "total_idle_time_ns": 0},
+            {"total_iteration_time_ns": 10, "total_idle_time_ns": 90},
+            {"total_iteration_time_ns": 10, "total_idle_time_ns": 90},
+        ],
+    }
+    for worker, worker_snapshots in snapshots.items():
+        worker.get_shared_performance_counters_snapshot()  # confirm counters are enabled
+        mocker.patch.object(
+            worker,
+            "get_shared_performance_counters_snapshot",
+            autospec=True,
+            side_effect=worker_snapshots,
+        )
+    dispatcher = pool._dispatcher
+    dispatcher._commands_for_each_run_iteration()
+    dispatcher._commands_for_each_run_iteration()
+    for item in range(3):
+        dispatcher._dispatch_item(item)
+    assert drain_worker_input_queues(pool) == [[], [0, 1, 2]]
+
+    # loads are kept when no iterations completed since the last refresh, but the items sent are reset
+    dispatcher._commands_for_each_run_iteration()
+    for item in range(10):
+        dispatcher._dispatch_item(item)
+    assert [len(items) for items in drain_worker_input_queues(pool)] == [1, 9]
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcessPool__handles_every_item_then_soft_stops_all_workers():
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        num_workers=2,
+        dispatcher_iteration_duration_seconds=0.01,
+    )
+    pool.start()
+    assert pool.is_alive() is True
+    expected_items = list(range(50))
+    for item in expected_items:
+        pool.get_input_queue().put_nowait(item)
+    assert is_queue_eventually_not_empty(pool.get_output_queue()) is True
+    pool.soft_stop()
+    pool.join(timeout=10)
+
+    assert pool.is_alive() is False
+    items = pool.hard_stop(timeout=1)
+    assert sorted(items["output_queue"]) == expected_items
+    assert items["input_queue"] == []
+    assert items["fatal_error_reporter"] == []
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcessPool__merges_fatal_errors_from_workers_and_dispatcher():
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatRaisesErrorForItems,
+        num_workers=2,
+        distribution_strategy="key_hash",
+        key_function=lambda item: 1 / item,
+    )
+    for item in (1, 0):
+        put_object_into_queue_and_raise_error_if_eventually_still_empty(
+            item, pool.get_input_queue()
+        )
+        pool._dispatcher.run(num_iterations=1, perform_teardown_after_loop=False)
+    worker_index = hash(1.0) % 2
+    assert is_queue_eventually_not_empty(pool.get_worker_input_queues()[worker_index])
+    pool.get_workers()[worker_index].run(
+        num_iterations=1, perform_teardown_after_loop=False
+    )
+
+    items = pool.hard_stop(timeout=1)
+
+    errors = items["fatal_error_reporter"]
+    assert sorted(str(err) for err, _ in errors) == ["bad item 1", "division by zero"]
+    for err, formatted_stack_trace in errors:
+        assert str(err) in formatted_stack_trace
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcessPool__hard_stop__returns_items_that_were_not_handled_by_a_worker():
+    pool = InfiniteProcessPool(InfiniteProcessThatEchoesInputItems, num_workers=2)
+    pool._dispatcher._dispatch_item("dispatched 0")
+    pool._dispatcher._dispatch_item("dispatched 1")
+    pool.get_input_queue().put_nowait("not dispatched")
+    pool.get_output_queue().put_nowait("output")
+
+    items = pool.hard_stop(timeout=1)
+
+    assert sorted(items["input_queue"]) == [
+        "dispatched 0",
+        "dispatched 1",
+        "not dispatched",
+    ]
+    assert items["output_queue"] == ["output"]
+    assert items["fatal_error_reporter"] == []
+
+
+def test_InfiniteProcessPool__hard_stop__includes_items_from_hard_stop_of_each_worker(
+    mocker,
+):
+    pool = InfiniteProcessPool(InfiniteProcessThatEchoesInputItems, num_workers=2)
+    mocker.patch.object(
+        pool.get_workers()[1],
+        "_drain_all_queues",
+        autospec=True,
+        return_value={"other_queue": ["other item"]},
+    )
+    mocker.patch.object(
+        process_pool,
+        "bulk_drain_queues",
+        autospec=True,
+        side_effect=lambda queues: {name: [] for name in queues},
+    )
+
+    items = pool.hard_stop(timeout=1)
+
+    assert "worker_0" not in items
+    assert items["worker_1"] == {"other_queue": ["other item"]}
+
+
+def test_InfiniteProcessPool__hard_stop__drains_queues_of_every_worker_and_shared_fatal_error_reporter_in_a_single_pass(
+    mocker,
+):
+    pool = InfiniteProcessPool(InfiniteProcessThatEchoesInputItems, num_workers=3)
+    results_queue = multiprocessing.Queue()
+    pool.get_workers()[2].register_queue_to_drain("results", results_queue)
+    put_object_into_queue_and_raise_error_if_eventually_still_empty(
+        "result", results_queue
+    )
+    pool.get_workers()[0]._report_fatal_error(ValueError("worker error"))
+    spied_bulk_drain = mocker.spy(process_pool, "bulk_drain_queues")
+
+    items = pool.hard_stop(timeout=1)
+
+    assert spied_bulk_drain.call_count == 1
+    assert items["worker_2"] == {"results": ["result"]}
+    assert "worker_0" not in items
+    assert [str(err) for err, _ in items["fatal_error_reporter"]] == ["worker error"]
+    for worker in pool.get_workers():
+        assert worker.is_stopped() is True
+
+
+@pytest.mark.timeout(30)
+def test_InfiniteProcessPool__creates_queues_and_workers_using_given_context():
+    context = multiprocessing.get_context("spawn")
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        num_workers=2,
+        dispatcher_iteration_duration_seconds=0.01,
+        context=context,
+    )
+    for worker in pool.get_workers():
+        assert worker.get_context() is context
+    pool.start()
+    pool.get_input_queue().put_nowait("item")
+    assert pool.get_output_queue().get(timeout=20) == "item"
+    pool.soft_stop()
+    pool.join(timeout=20)
+
+    assert pool.is_alive() is False
+    assert pool.hard_stop(timeout=1)["fatal_error_reporter"] == []
+
+
+@pytest.mark.timeout(15)
+def test_InfiniteProcessPool__stop__stops_dispatcher_and_all_workers():
+    pool = InfiniteProcessPool(
+        InfiniteProcessThatEchoesInputItems,
+        num_workers=2,
+        worker_kwargs={"minimum_iteration_duration_seconds": 0.01},
+    )
+    pool.start()
+    pool.stop()
+    pool.join()
+    assert pool.is_alive() is False
+    for worker in pool.get_workers():
+        assert worker.is_stopped() is True
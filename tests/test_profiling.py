@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import sys
+import threading
+
+import pytest
+from stdlib_utils import profiling
+from stdlib_utils import StackSampleAggregator
+from stdlib_utils import ThreadStackSampler
+from stdlib_utils import write_folded_stacks_file
+
+
+def innermost_function():
+    return sys._getframe()
+
+
+def outer_function():
+    return innermost_function()
+
+
+def get_frame_name(function):
+    code = function.__code__
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def test_StackSampleAggregator__counts_stacks_in_folded_format_from_outermost_to_innermost_frame():
+    aggregator = StackSampleAggregator()
+    frame = outer_function()
+    aggregator.add_sample(frame)
+    aggregator.add_sample(frame)
+    aggregator.add_sample(innermost_function())
+
+    folded_stacks = aggregator.get_folded_stacks()
+    assert len(folded_stacks) == 2
+    stack, count = max(folded_stacks.items(), key=lambda item: item[1])
+    assert count == 2
+    assert stack.endswith(
+        f";{get_frame_name(outer_function)};{get_frame_name(innermost_function)}"
+    )
+    assert get_frame_name(
+        test_StackSampleAggregator__counts_stacks_in_folded_format_from_outermost_to_innermost_frame
+    ) in stack.split(";")
+    assert aggregator.get_num_dropped_samples() == 0
+
+
+def test_StackSampleAggregator__keeps_only_innermost_frames_of_deep_stacks():
+    aggregator = StackSampleAggregator(max_stack_depth=2)
+    aggregator.add_sample(outer_function())
+    assert list(aggregator.get_folded_stacks().keys()) == [
+        f"{profiling.TRUNCATED_STACK_ROOT_NAME};{get_frame_name(outer_function)};{get_frame_name(innermost_function)}"
+    ]
+
+
+def test_StackSampleAggregator__drops_samples_of_new_stacks_once_max_number_of_stacks_reached():
+    aggregator = StackSampleAggregator(max_num_stacks=1)
+    aggregator.add_sample(outer_function())
+    aggregator.add_sample(innermost_function())
+    aggregator.add_sample(outer_function())
+    assert list(aggregator.get_folded_stacks().values()) == [2]
+    assert aggregator.get_num_dropped_samples() == 1
+
+
+def test_StackSampleAggregator__get_folded_stacks__returns_a_copy():
+    aggregator = StackSampleAggregator()
+    folded_stacks = aggregator.get_folded_stacks()
+    aggregator.add_sample(outer_function())
+    assert folded_stacks == {}
+
+
+def wait_in_distinctive_function(event):
+    event.wait()
+
+
+@pytest.mark.timeout(10)
+def test_ThreadStackSampler__samples_stack_of_other_thread_until_stopped():
+    release_event = threading.Event()
+    t = threading.Thread(target=wait_in_distinctive_function, args=(release_event,))
+    t.start()
+    sampler = ThreadStackSampler(t, sampling_interval_seconds=0.001)
+    sampler.start()
+    while sum(sampler.get_aggregator().get_folded_stacks().values()) < 3:
+        release_event.wait(0.01)
+
+    folded_stacks = sampler.stop()
+    release_event.set()
+    t.join()
+
+    assert sampler.is_alive() is False
+    assert all("wait_in_distinctive_function" in stack for stack in folded_stacks)
+
+
+@pytest.mark.timeout(10)
+def test_ThreadStackSampler__stops_sampling_once_sampled_thread_exits():
+    t = threading.Thread(target=innermost_function)
+    t.start()
+    t.join()
+    # a new thread is likely to be given the ident of the exited one
+    release_event = threading.Event()
+    other_thread = threading.Thread(
+        target=wait_in_distinctive_function, args=(release_event,)
+    )
+    other_thread.start()
+    sampler = ThreadStackSampler(t, sampling_interval_seconds=0.001)
+    sampler.start()
+    sampler.join()
+    release_event.set()
+    other_thread.join()
+
+    assert sampler.get_aggregator().get_folded_stacks() == {}
+
+
+@pytest.mark.timeout(10)
+def test_ThreadStackSampler__skips_samples_taken_while_thread_has_no_frame(mocker):
+    num_samples_taken_event = threading.Event()
+    num_samples_taken = 0
+
+    def get_no_frames():
+        nonlocal num_samples_taken
+        num_samples_taken += 1
+        if num_samples_taken == 3:
+            num_samples_taken_event.set()
+        return {}
+
+    mocker.patch.object(profiling.sys, "_current_frames", side_effect=get_no_frames)
+    sampler = ThreadStackSampler(
+        threading.current_thread(), sampling_interval_seconds=0.001
+    )
+    sampler.start()
+    num_samples_taken_event.wait()
+    assert sampler.stop() == {}
+
+
+def test_write_folded_stacks_file__writes_each_stack_and_count_on_a_line(tmp_path):
+    file_path = str(tmp_path / "profile.folded")
+    write_folded_stacks_file(file_path, {"main;run;work": 3, "main;run": 1})
+    with open(file_path) as folded_stacks_file:
+        assert folded_stacks_file.read() == "main;run 1\nmain;run;work 3\n"
+
+
+def test_ThreadStackSampler__counts_samples_in_given_aggregator():
+    aggregator = StackSampleAggregator(max_num_stacks=5)
+    sampler = ThreadStackSampler(threading.current_thread(), aggregator=aggregator)
+    assert sampler.get_aggregator() is aggregator
@@ -3,9 +3,11 @@ import multiprocessing
 import queue
 from queue import Queue
 import sys
+import threading
 import time
 
 import pytest
+from stdlib_utils import bulk_drain_queues
 from stdlib_utils import confirm_queue_is_eventually_empty
 from stdlib_utils import confirm_queue_is_eventually_of_size
 from stdlib_utils import drain_queue
@@ -565,3 +567,48 @@ def test_confirm_queue_is_eventually_empty__passes_args_to_is_queue_eventually_o
     mocked_is_queue_eventually_of_size.assert_called_once_with(
         test_queue, 0, timeout_seconds=expected_timeout
     )
+
+
+def test_bulk_drain_queues__drains_items_from_all_types_of_queues():
+    queues = {
+        "threading": Queue(),
+        "multiprocessing": multiprocessing.Queue(),
+        "simple": SimpleMultiprocessingQueue(),
+        "plain_simple": multiprocessing.SimpleQueue(),
+    }
+    for name, the_queue in queues.items():
+        the_queue.put(f"{name} 1")
+        the_queue.put(f"{name} 2")
+
+    actual = bulk_drain_queues(queues, grace_period_seconds=0.1)
+    assert actual == {name: [f"{name} 1", f"{name} 2"] for name in queues}
+    for the_queue in queues.values():
+        assert the_queue.empty() is True
+
+
+def test_bulk_drain_queues__does_not_wait_if_no_queues_have_feeder_threads(mocker):
+    spied_wait = mocker.spy(queue_utils, "wait")
+    the_queue = Queue()
+    the_queue.put("item")
+
+    actual = bulk_drain_queues({"the_queue": the_queue}, grace_period_seconds=10)
+    assert actual == {"the_queue": ["item"]}
+    spied_wait.assert_not_called()
+
+
+@pytest.mark.timeout(5)
+def test_bulk_drain_queues__collects_items_arriving_in_multiprocessing_queues_during_single_shared_grace_period():
+    queues = {"first": multiprocessing.Queue(), "second": multiprocessing.Queue()}
+
+    def put_items_later():
+        time.sleep(0.05)
+        queues["first"].put("late first")
+        queues["second"].put("late second")
+
+    threading.Thread(target=put_items_later).start()
+    start = time.perf_counter()
+    actual = bulk_drain_queues(queues, grace_period_seconds=0.5)
+    elapsed = time.perf_counter() - start
+
+    assert actual == {"first": ["late first"], "second": ["late second"]}
+    assert 0.5 <= elapsed < 1
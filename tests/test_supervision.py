@@ -0,0 +1,272 @@
+# -*- coding: utf-8 -*-
+import queue
+import threading
+import time
+
+import pytest
+from stdlib_utils import InfiniteProcess
+from stdlib_utils import InfiniteThread
+from stdlib_utils import Supervisor
+from stdlib_utils import SupervisorRestartLimitExceededError
+from stdlib_utils import UnrecognizedRestartStrategyError
+
+from .fixtures_parallelism import InfiniteProcessThatRaisesError
+from .fixtures_parallelism import InfiniteThreadThatRaisesError
+
+
+class InfiniteThreadThatCrashesOnRequest(InfiniteThread):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._crash_event = threading.Event()
+
+    def crash(self):
+        self._crash_event.set()
+
+    def _commands_for_each_run_iteration(self):
+        if self._crash_event.is_set():
+            raise ValueError("crash requested")
+
+
+class InfiniteThreadThatExitsWithoutStopping(InfiniteThread):
+    def run(self, *args, **kwargs):
+        pass
+
+
+def thread_factory(thread_class=InfiniteThreadThatCrashesOnRequest):
+    def factory():
+        return thread_class(queue.Queue(), minimum_iteration_duration_seconds=0.001)
+
+    return factory
+
+
+def crash_child_and_wait(supervisor, name):
+    child = supervisor.get_children()[name]
+    child.crash()
+    child.join(timeout=5)
+    return child
+
+
+def test_Supervisor__raises_error_for_unrecognized_restart_strategy():
+    with pytest.raises(UnrecognizedRestartStrategyError, match="bogus"):
+        Supervisor(queue.Queue(), restart_strategy="bogus")
+
+
+def test_Supervisor__add_child__raises_error_if_supervisor_already_started(mocker):
+    supervisor = Supervisor(queue.Queue())
+    mocker.patch.object(supervisor, "is_alive", autospec=True, return_value=True)
+    with pytest.raises(NotImplementedError, match="before the supervisor is started"):
+        supervisor.add_child("child", thread_factory())
+
+
+@pytest.mark.timeout(10)
+def test_Supervisor__one_for_one__restarts_only_the_crashed_child_and_records_metrics():
+    supervisor = Supervisor(queue.Queue(), initial_backoff_seconds=0)
+    supervisor.add_child("crashy", thread_factory())
+    supervisor.add_child("healthy", thread_factory())
+    supervisor._setup_before_loop()
+    original_healthy = supervisor.get_children()["healthy"]
+    original_crashy = crash_child_and_wait(supervisor, "crashy")
+
+    supervisor._commands_for_each_run_iteration()
+
+    new_crashy = supervisor.get_children()["crashy"]
+    assert new_crashy is not original_crashy
+    assert new_crashy.is_alive() is True
+    assert supervisor.get_children()["healthy"] is original_healthy
+    metrics = supervisor.get_restart_metrics()
+    assert metrics["healthy"]["num_restarts"] == 0
+    assert metrics["crashy"]["num_restarts"] == 1
+    assert [str(err) for err in metrics["crashy"]["last_fatal_errors"]] == [
+        "crash requested"
+    ]
+
+    while not new_crashy.is_start_up_complete():
+        pass
+    supervisor._commands_for_each_run_iteration()
+    assert metrics["crashy"]["num_recoveries"] == 1
+    assert metrics["crashy"]["last_time_to_recovery_seconds"] > 0
+
+    supervisor._teardown_after_loop()
+    assert supervisor.get_children() == dict()
+    assert new_crashy.is_alive() is False
+    assert original_healthy.is_alive() is False
+
+
+@pytest.mark.timeout(10)
+def test_Supervisor__one_for_all__restarts_every_child_when_one_crashes():
+    supervisor = Supervisor(
+        queue.Queue(), restart_strategy="one_for_all", initial_backoff_seconds=0
+    )
+    supervisor.add_child("crashy", thread_factory())
+    supervisor.add_child("sibling", thread_factory())
+    supervisor._setup_before_loop()
+    original_children = dict(supervisor.get_children())
+    crash_child_and_wait(supervisor, "crashy")
+
+    supervisor._commands_for_each_run_iteration()
+
+    for name, original_child in original_children.items():
+        assert original_child.is_alive() is False
+        assert supervisor.get_children()[name] is not original_child
+        assert supervisor.get_restart_metrics()[name]["num_restarts"] == 1
+    supervisor._teardown_after_loop()
+
+
+@pytest.mark.timeout(10)
+def test_Supervisor__keeps_fatal_errors_of_children_it_stops():
+    supervisor = Supervisor(
+        queue.Queue(), restart_strategy="one_for_all", initial_backoff_seconds=0
+    )
+    supervisor.add_child("crashy", thread_factory())
+    supervisor.add_child("sibling", thread_factory())
+    supervisor._setup_before_loop()
+    supervisor.get_children()["sibling"]._report_fatal_error(
+        ValueError("sibling error")
+    )
+    crash_child_and_wait(supervisor, "crashy")
+
+    supervisor._commands_for_each_run_iteration()
+
+    metrics = supervisor.get_restart_metrics()
+    assert [str(err) for err in metrics["sibling"]["last_fatal_errors"]] == [
+        "sibling error"
+    ]
+    assert [str(err) for err in metrics["crashy"]["last_fatal_errors"]] == [
+        "crash requested"
+    ]
+
+    supervisor.get_children()["crashy"]._report_fatal_error(
+        ValueError("error while stopping")
+    )
+    supervisor._teardown_after_loop()
+    assert [str(err) for err in metrics["crashy"]["last_fatal_errors"]] == [
+        "error while stopping"
+    ]
+    assert [str(err) for err in metrics["sibling"]["last_fatal_errors"]] == [
+        "sibling error"
+    ]
+
+
+@pytest.mark.timeout(10)
+def test_Supervisor__restarts_child_that_exits_without_being_stopped__but_not_child_that_finished_after_being_stopped():
+    supervisor = Supervisor(queue.Queue(), initial_backoff_seconds=0)
+    supervisor.add_child(
+        "exits", thread_factory(InfiniteThreadThatExitsWithoutStopping)
+    )
+    supervisor.add_child("finishes", thread_factory())
+    supervisor._setup_before_loop()
+    finishing_child = supervisor.get_children()["finishes"]
+    finishing_child.soft_stop()
+    finishing_child.join(timeout=5)
+    supervisor.get_children()["exits"].join(timeout=5)
+
+    supervisor._commands_for_each_run_iteration()
+
+    assert list(supervisor.get_children()) == ["exits"]
+    metrics = supervisor.get_restart_metrics()
+    assert metrics["exits"]["num_restarts"] == 1
+    assert metrics["exits"]["last_fatal_errors"] == []
+    assert metrics["finishes"]["num_restarts"] == 0
+    supervisor._teardown_after_loop()
+
+
+def test_Supervisor__waits_for_exponential_backoff_before_restarting_each_child():
+    supervisor = Supervisor(
+        queue.Queue(),
+        max_restarts=10,
+        max_restarts_window_seconds=10,
+        initial_backoff_seconds=1,
+        max_backoff_seconds=3,
+    )
+    supervisor.add_child("child", thread_factory())
+    supervisor.add_child("other child", thread_factory())
+    expected_backoffs_seconds = [1, 2, 3, 3]
+    for crash_time_seconds, expected_backoff_seconds in zip(
+        range(4), expected_backoffs_seconds
+    ):
+        supervisor._handle_crash("child", crash_time_seconds * 10 ** 9)
+        assert (
+            supervisor._pending_restart_timepoints["child"]
+            == (crash_time_seconds + expected_backoff_seconds) * 10 ** 9
+        )
+
+    # the backoff is tracked separately for each child
+    supervisor._handle_crash("other child", 4 * 10 ** 9)
+    assert supervisor._pending_restart_timepoints["other child"] == 5 * 10 ** 9
+
+    # restarts that have left the window no longer increase the backoff
+    supervisor._handle_crash("child", 20 * 10 ** 9)
+    assert supervisor._pending_restart_timepoints["child"] == 21 * 10 ** 9
+
+
+def test_Supervisor__does_not_restart_child_until_its_backoff_has_elapsed(mocker):
+    supervisor = Supervisor(queue.Queue(), initial_backoff_seconds=60)
+    factory = mocker.Mock(side_effect=thread_factory())
+    supervisor.add_child("child", factory)
+    supervisor._handle_crash("child", time.perf_counter_ns())
+
+    supervisor._commands_for_each_run_iteration()
+
+    factory.assert_not_called()
+    assert supervisor.get_children() == dict()
+
+
+def test_Supervisor__raises_error_if_max_restarts_exceeded_within_window():
+    supervisor = Supervisor(
+        queue.Queue(), max_restarts=2, max_restarts_window_seconds=10
+    )
+    supervisor.add_child("child", thread_factory())
+    supervisor._handle_crash("child", 0)
+    supervisor._handle_crash("child", 9 * 10 ** 9)
+    # the first restart has left the window
+    supervisor._handle_crash("child", 11 * 10 ** 9)
+    with pytest.raises(SupervisorRestartLimitExceededError, match="'child'"):
+        supervisor._handle_crash("child", 12 * 10 ** 9)
+
+
+def test_Supervisor___record_recovery__tracks_last_max_and_mean_time_to_recovery():
+    supervisor = Supervisor(queue.Queue())
+    supervisor.add_child("child", thread_factory())
+    for crash_timepoint, recovery_timepoint in ((0, 3 * 10 ** 9), (10, 10 + 10 ** 9)):
+        supervisor._crash_timepoints["child"] = crash_timepoint
+        supervisor._record_recovery("child", recovery_timepoint)
+
+    metrics = supervisor.get_restart_metrics()["child"]
+    assert metrics["num_recoveries"] == 2
+    assert metrics["last_time_to_recovery_seconds"] == 1
+    assert metrics["max_time_to_recovery_seconds"] == 3
+    assert metrics["mean_time_to_recovery_seconds"] == 2
+
+
+@pytest.mark.timeout(15)
+def test_Supervisor__stops_itself_and_all_children_and_reports_error_when_restart_limit_exceeded():
+    error_queue = queue.Queue()
+    supervisor = Supervisor(
+        error_queue,
+        max_restarts=2,
+        initial_backoff_seconds=0,
+        minimum_iteration_duration_seconds=0.01,
+    )
+    supervisor.add_child("crashy_thread", thread_factory(InfiniteThreadThatRaisesError))
+    supervisor.add_child(
+        "crashy_process", lambda: InfiniteProcessThatRaisesError(queue_factory())
+    )
+    supervisor.add_child("healthy", lambda: InfiniteProcess(queue_factory()))
+    supervisor.start()
+    supervisor.join(timeout=10)
+
+    assert supervisor.is_alive() is False
+    assert isinstance(error_queue.get(timeout=1), SupervisorRestartLimitExceededError)
+    assert supervisor.get_children() == dict()
+    metrics = supervisor.get_restart_metrics()
+    assert (
+        metrics["crashy_thread"]["num_restarts"]
+        + metrics["crashy_process"]["num_restarts"]
+        == 2
+    )
+
+
+def queue_factory():
+    import multiprocessing  # pylint: disable=import-outside-toplevel
+
+    return multiprocessing.Queue()
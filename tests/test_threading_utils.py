@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 import logging
+import os
 import queue
 import threading
 import time
 
 import pytest
+from stdlib_utils import CooperativeLoopScheduler
 from stdlib_utils import get_formatted_stack_trace
 from stdlib_utils import InfiniteLoopingParallelismMixIn
 from stdlib_utils import InfiniteThread
@@ -12,6 +14,7 @@ from stdlib_utils import InfiniteThread
 from .fixtures_parallelism import InfiniteThreadThatCannotBeSoftStopped
 from .fixtures_parallelism import InfiniteThreadThatCountsIterations
 from .fixtures_parallelism import InfiniteThreadThatRaisesError
+from .fixtures_parallelism import InfiniteThreadThatRaisesErrorInSetup
 from .fixtures_parallelism import InfiniteThreadThatTracksSetup
 from .fixtures_parallelism import init_test_args_InfiniteLoopingParallelismMixIn
 
@@ -41,6 +44,21 @@ def test_InfiniteThread__init__calls_InfiniteLoopingParallelismMixIn_super(mocke
         error_queue,
         *init_test_args_InfiniteLoopingParallelismMixIn,
         minimum_iteration_duration_seconds=0.01,
+        use_event_driven_wakeup=False,
+        fixed_rate_overrun_policy=None,
+        use_shared_performance_counters=False,
+        use_adaptive_iteration_duration=False,
+        max_input_items_per_iteration=100,
+        max_input_item_handling_seconds_per_iteration=None,
+        use_shared_control_flags=False,
+        cpu_affinity=None,
+        nice_level=None,
+        scheduling_policy=None,
+        scheduling_priority=1,
+        wait_strategy="sleep",
+        spin_duration_seconds=0.0002,
+        use_tracing=False,
+        use_cpu_time_tracking=False,
     )
 
 
@@ -172,6 +190,48 @@ def test_InfiniteThread_can_set_minimum_iteration_duration():
 
 @pytest.mark.timeout(5)
 @pytest.mark.slow
+@pytest.mark.timeout(5)
+def test_InfiniteThread__does_not_iterate_while_paused__until_stopped():
+    t = InfiniteThread(queue.Queue(), minimum_iteration_duration_seconds=0.001)
+    t.pause()
+    t.start()
+    while not t.is_start_up_complete():
+        time.sleep(0.01)
+    time.sleep(0.2)
+    # only the iteration that started before blocking
+    assert t._iteration_time_histogram.get_total_count() == 1
+    t.stop()
+    t.join(timeout=2)
+    assert t.is_alive() is False
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "sched_setaffinity"),
+    reason="CPU affinity can only be set on Linux",
+)
+@pytest.mark.timeout(5)
+def test_InfiniteThread__applies_cpu_affinity_and_nice_level_to_its_own_thread_only():
+    original_cpus = os.sched_getaffinity(0)
+    original_nice_level = os.getpriority(os.PRIO_PROCESS, 0)
+    expected_cpu = min(original_cpus)
+    t = InfiniteThread(
+        queue.Queue(),
+        cpu_affinity=[expected_cpu],
+        nice_level=original_nice_level + 1,
+    )
+    t.start()
+    t.soft_stop()
+    t.join(timeout=2)
+
+    assert t.reset_performance_tracker()["scheduling_settings"] == {
+        "cpu_affinity": [expected_cpu],
+        "nice_level": original_nice_level + 1,
+        "errors": {},
+    }
+    assert os.sched_getaffinity(0) == original_cpus
+    assert os.getpriority(os.PRIO_PROCESS, 0) == original_nice_level
+
+
 def test_InfiniteThread__pause_and_resume_work_while_running():
     test_dict = {"value": 0}
     error_queue = queue.Queue()
@@ -193,3 +253,199 @@ def test_InfiniteThread__pause_and_resume_work_while_running():
 
     value_after_stop = test_dict["value"]
     assert value_after_stop > value_at_pause
+
+
+@pytest.mark.timeout(10)
+def test_InfiniteThread__start_profiling__samples_stack_of_running_thread_until_stop_profiling():
+    t = InfiniteThreadThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0.001
+    )
+    t.start()
+    t.start_profiling(sampling_interval_seconds=0.001)
+    with pytest.raises(NotImplementedError, match="already being profiled"):
+        t.start_profiling()
+    while sum(t._stack_sampler.get_aggregator().get_folded_stacks().values()) < 3:
+        time.sleep(0.01)
+
+    folded_stacks = t.stop_profiling()
+    t.stop()
+    t.join()
+
+    assert any(
+        "_sleep_for_idle_time_during_iteration" in stack for stack in folded_stacks
+    )
+    with pytest.raises(NotImplementedError, match="not being profiled"):
+        t.stop_profiling()
+
+
+def test_InfiniteThread__start_profiling__raises_error_if_thread_is_not_running():
+    t = InfiniteThread(queue.Queue())
+    with pytest.raises(NotImplementedError, match="must be running"):
+        t.start_profiling()
+    t.run(num_iterations=1)
+    with pytest.raises(NotImplementedError, match="must be running"):
+        t.start_profiling()
+
+
+class InfiniteThreadThatRecordsIterations(InfiniteThread):
+    def __init__(self, name, record, num_iterations_before_stopping, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loop_name = name
+        self._record = record
+        self._num_iterations_before_stopping = num_iterations_before_stopping
+
+    def _commands_for_each_run_iteration(self):
+        self._record.append((self._loop_name, time.perf_counter_ns()))
+        self._num_iterations_before_stopping -= 1
+        if self._num_iterations_before_stopping == 0:
+            self.stop()
+
+
+def patch_clock_that_only_advances_during_sleep(mocker):
+    current_time_ns = [0]
+
+    def fake_sleep(seconds):
+        current_time_ns[0] += round(seconds * 10 ** 9)
+
+    mocker.patch.object(
+        time, "perf_counter_ns", autospec=True, side_effect=lambda: current_time_ns[0]
+    )
+    mocker.patch.object(time, "sleep", autospec=True, side_effect=fake_sleep)
+
+
+def test_CooperativeLoopScheduler__runs_each_loop_according_to_its_own_minimum_iteration_duration_until_all_loops_stop(
+    mocker,
+):
+    patch_clock_that_only_advances_during_sleep(mocker)
+    record = list()
+    fast_loop = InfiniteThreadThatRecordsIterations(
+        "fast", record, 4, queue.Queue(), minimum_iteration_duration_seconds=0.01
+    )
+    slow_loop = InfiniteThreadThatRecordsIterations(
+        "slow", record, 2, queue.Queue(), minimum_iteration_duration_seconds=0.03
+    )
+    scheduler = CooperativeLoopScheduler([fast_loop, slow_loop])
+    assert scheduler.get_loops() == [fast_loop, slow_loop]
+
+    scheduler.run()
+
+    assert record == [
+        ("fast", 0),
+        ("slow", 0),
+        ("fast", 10 ** 7),
+        ("fast", 2 * 10 ** 7),
+        ("fast", 3 * 10 ** 7),
+        ("slow", 3 * 10 ** 7),
+    ]
+    for loop in (fast_loop, slow_loop):
+        assert loop.is_start_up_complete() is True
+        assert loop.is_teardown_complete() is True
+    assert (
+        fast_loop.reset_performance_tracker()["idle_iteration_time_ns"] == 3 * 10 ** 7
+    )
+
+
+def test_CooperativeLoopScheduler__respects_pause_and_soft_stop_of_each_loop(mocker):
+    patch_clock_that_only_advances_during_sleep(mocker)
+    record = list()
+    paused_loop = InfiniteThreadThatRecordsIterations(
+        "paused", record, 1, queue.Queue()
+    )
+    paused_loop.pause()
+    paused_loop.soft_stop()
+    other_loop = InfiniteThreadThatRecordsIterations("other", record, 2, queue.Queue())
+
+    CooperativeLoopScheduler([paused_loop, other_loop]).run()
+
+    assert record == [("other", 0), ("other", 10 ** 7)]
+    assert paused_loop.is_teardown_complete() is True
+
+
+def test_CooperativeLoopScheduler__reports_errors_to_each_loop_and_keeps_running_other_loops(
+    mocker,
+):
+    patch_clock_that_only_advances_during_sleep(mocker)
+    record = list()
+    setup_error_queue = queue.Queue()
+    loop_that_fails_setup = InfiniteThreadThatRaisesErrorInSetup(setup_error_queue)
+    run_error_queue = queue.Queue()
+    loop_that_fails_iteration = InfiniteThreadThatRaisesError(run_error_queue)
+    healthy_loop = InfiniteThreadThatRecordsIterations(
+        "healthy", record, 3, queue.Queue()
+    )
+
+    CooperativeLoopScheduler(
+        [loop_that_fails_setup, loop_that_fails_iteration, healthy_loop]
+    ).run()
+
+    assert str(setup_error_queue.get_nowait()) == "error during setup"
+    assert str(run_error_queue.get_nowait()) == "test message"
+    assert loop_that_fails_iteration.is_teardown_complete() is True
+    assert len(record) == 3
+
+
+def test_CooperativeLoopScheduler__keeps_running_other_loops_if_sending_a_performance_report_fails(
+    mocker,
+):
+    patch_clock_that_only_advances_during_sleep(mocker)
+    record = list()
+    report_error_queue = queue.Queue()
+    loop_with_bad_report = InfiniteThreadThatRecordsIterations(
+        "bad report", record, 3, report_error_queue
+    )
+
+    def raise_error(report):
+        raise ValueError("bad report")
+
+    loop_with_bad_report.enable_periodic_performance_reports(raise_error, 0)
+    healthy_loop = InfiniteThreadThatRecordsIterations(
+        "healthy", record, 3, queue.Queue()
+    )
+
+    CooperativeLoopScheduler([loop_with_bad_report, healthy_loop]).run()
+
+    assert str(report_error_queue.get_nowait()) == "bad report"
+    assert loop_with_bad_report.is_teardown_complete() is True
+    assert [name for name, _ in record].count("healthy") == 3
+
+
+def test_CooperativeLoopScheduler__add_loop__raises_error_for_loops_using_event_driven_wakeup():
+    scheduler = CooperativeLoopScheduler()
+    with pytest.raises(NotImplementedError, match="event driven wakeup"):
+        scheduler.add_loop(InfiniteThread(queue.Queue(), use_event_driven_wakeup=True))
+
+
+def test_CooperativeLoopScheduler__add_loop__raises_error_for_loops_with_scheduling_settings():
+    scheduler = CooperativeLoopScheduler()
+    with pytest.raises(NotImplementedError, match="scheduling settings"):
+        scheduler.add_loop(InfiniteThread(queue.Queue(), nice_level=5))
+
+
+def test_CooperativeLoopScheduler__add_loop__raises_error_for_loops_not_using_sleep_wait_strategy():
+    scheduler = CooperativeLoopScheduler()
+    with pytest.raises(NotImplementedError, match="'sleep' wait strategy"):
+        scheduler.add_loop(InfiniteThread(queue.Queue(), wait_strategy="yield_spin"))
+
+
+def test_CooperativeLoopScheduler__add_loop__raises_error_if_scheduler_already_started(
+    mocker,
+):
+    scheduler = CooperativeLoopScheduler()
+    mocker.patch.object(scheduler, "is_alive", autospec=True, return_value=True)
+    with pytest.raises(NotImplementedError, match="before the scheduler is started"):
+        scheduler.add_loop(InfiniteThread(queue.Queue()))
+
+
+@pytest.mark.timeout(5)
+def test_CooperativeLoopScheduler__can_be_run_in_its_own_thread_and_soft_stopped():
+    loops = [InfiniteThreadThatCountsIterations(queue.Queue()) for _ in range(10)]
+    scheduler = CooperativeLoopScheduler(loops)
+    scheduler.start()
+    while not all(loop.get_num_iterations() > 1 for loop in loops):
+        time.sleep(0.01)
+    for loop in loops:
+        assert loop.is_alive() is False
+        loop.soft_stop()
+    scheduler.join()
+    for loop in loops:
+        assert loop.is_teardown_complete() is True
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import json
+import multiprocessing
+import os
+import queue
+
+import pytest
+from stdlib_utils import merge_trace_events
+from stdlib_utils import write_chrome_trace_file
+
+from .fixtures_parallelism import InfiniteProcessThatCountsIterations
+from .fixtures_parallelism import InfiniteThreadThatCountsIterations
+
+
+def test_merge_trace_events__combines_events_of_each_loop():
+    loops = [
+        InfiniteThreadThatCountsIterations(queue.Queue(), use_tracing=True)
+        for _ in range(2)
+    ]
+    for loop in loops:
+        loop.run(num_iterations=2)
+    expected_events = loops[0].get_trace_events() + loops[1].get_trace_events()
+    assert merge_trace_events(loops) == expected_events
+
+
+@pytest.mark.timeout(15)
+def test_write_chrome_trace_file__writes_timeline_of_threads_and_processes_on_a_shared_clock(
+    tmp_path,
+):
+    thread = InfiniteThreadThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0.001, use_tracing=True
+    )
+    process = InfiniteProcessThatCountsIterations(
+        multiprocessing.Queue(),
+        minimum_iteration_duration_seconds=0.001,
+        use_tracing=True,
+    )
+    process.start()
+    assert process._start_up_complete_event.wait(timeout=10) is True
+    thread.start()
+    for loop in (thread, process):
+        loop.soft_stop()
+    thread.join()
+    assert process._teardown_complete_event.wait(timeout=10) is True
+    file_path = os.path.join(tmp_path, "trace.json")
+
+    write_chrome_trace_file(file_path, [thread, process])
+    process.join(timeout=5)
+
+    with open(file_path) as trace_file:
+        trace = json.load(trace_file)
+    assert trace["displayTimeUnit"] == "ms"
+    events = trace["traceEvents"]
+    assert {event["pid"] for event in events} == {os.getpid(), process.pid}
+    thread_names = {
+        event["args"]["name"] for event in events if event["name"] == "thread_name"
+    }
+    assert thread_names == {thread.name, process.name}
+
+    def get_span(pid, name):
+        return next(
+            event for event in events if event["pid"] == pid and event["name"] == name
+        )
+
+    # the thread was only started after the setup of the process completed
+    assert get_span(process.pid, "setup")["ts"] < get_span(os.getpid(), "setup")["ts"]
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+
+import pytest
+from stdlib_utils import InfiniteProcess
+from stdlib_utils import InfiniteThread
+from stdlib_utils import watchdog
+from stdlib_utils import Watchdog
+
+from .fixtures_parallelism import InfiniteThreadThatCountsIterations
+
+
+class InfiniteThreadThatHangsOnRequest(InfiniteThread):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hang_event = threading.Event()
+        self._release_event = threading.Event()
+
+    def hang(self):
+        self._hang_event.set()
+
+    def release(self):
+        self._release_event.set()
+
+    def _commands_for_each_run_iteration(self):
+        if self._hang_event.is_set():
+            self._hang_event.clear()
+            wait_for_release_of_hung_loop(self._release_event)
+
+
+class InfiniteProcessThatHangsOnRequest(InfiniteProcess):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._hang_event = multiprocessing.Event()
+
+    def hang(self):
+        self._hang_event.set()
+
+    def _commands_for_each_run_iteration(self):
+        if self._hang_event.is_set():
+            wait_for_release_of_hung_loop(multiprocessing.Event())
+
+
+def wait_for_release_of_hung_loop(release_event):
+    release_event.wait()
+
+
+def create_watchdog(**kwargs):
+    return Watchdog(
+        queue.Queue(),
+        queue.Queue(),
+        stall_threshold_multiple=10,
+        minimum_stall_threshold_seconds=0.05,
+        **kwargs,
+    )
+
+
+def wait_for_heartbeat_older_than(loop, age_seconds):
+    while loop.get_heartbeat_timepoint_ns() == 0:
+        watchdog.time.sleep(0.01)
+    while (
+        watchdog.time.perf_counter_ns() - loop.get_heartbeat_timepoint_ns()
+        <= age_seconds * 10 ** 9
+    ):
+        watchdog.time.sleep(0.01)
+
+
+@pytest.mark.timeout(10)
+def test_Watchdog__reports_stalled_thread_once_with_its_stack(mocker):
+    mocked_warning = mocker.patch.object(watchdog.logging, "warning", autospec=True)
+    w = create_watchdog()
+    t = InfiniteThreadThatHangsOnRequest(
+        queue.Queue(), minimum_iteration_duration_seconds=0.001
+    )
+    w.add_loop("hung thread", t)
+    t.start()
+    while t.get_heartbeat_timepoint_ns() == 0:
+        watchdog.time.sleep(0.01)
+    w._commands_for_each_run_iteration()
+    assert w._stall_reporter.empty() is True
+
+    t.hang()
+    while t._hang_event.is_set():
+        pass
+    wait_for_heartbeat_older_than(t, 0.1)
+    w._commands_for_each_run_iteration()
+    w._commands_for_each_run_iteration()
+
+    report = w._stall_reporter.get_nowait()
+    assert w._stall_reporter.empty() is True
+    assert report["name"] == "hung thread"
+    assert report["heartbeat_age_seconds"] > 0.05
+    assert "wait_for_release_of_hung_loop" in report["stack_trace"]
+    assert w.get_stall_counts() == {"hung thread": 1}
+    assert "hung thread" in mocked_warning.call_args[0][0]
+
+    t.release()
+    t.stop()
+    t.join()
+
+
+def test_Watchdog__uses_minimum_iteration_duration_of_loop_for_threshold_unless_below_minimum():
+    w = create_watchdog()
+    slow_loop = InfiniteThreadThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=1
+    )
+    fast_loop = InfiniteThreadThatCountsIterations(
+        queue.Queue(), minimum_iteration_duration_seconds=0
+    )
+    for name, loop in (("slow", slow_loop), ("fast", fast_loop)):
+        w.add_loop(name, loop)
+        loop._start_up_complete_event.set()
+        loop.is_alive = lambda: True
+        loop._record_heartbeat(watchdog.time.perf_counter_ns() - int(0.5 * 10 ** 9))
+    w._capture_stack_trace = lambda loop: None
+
+    w._commands_for_each_run_iteration()
+
+    assert w.get_stall_counts() == {"slow": 0, "fast": 1}
+
+
+@pytest.mark.parametrize(
+    "test_description,prepare_loop",
+    [
+        ("not started", lambda loop: None),
+        ("paused", lambda loop: loop.pause()),
+        ("teardown complete", lambda loop: loop._teardown_complete_event.set()),
+        (
+            "start up not complete",
+            lambda loop: loop._start_up_complete_event.clear(),
+        ),
+        ("no heartbeat yet", lambda loop: loop._record_heartbeat(0)),
+    ],
+)
+def test_Watchdog__does_not_report_loops_that_are_not_running(
+    test_description, prepare_loop
+):
+    w = create_watchdog()
+    loop = InfiniteThreadThatCountsIterations(queue.Queue())
+    w.add_loop("loop", loop)
+    loop._start_up_complete_event.set()
+    loop._record_heartbeat(1)
+    if test_description != "not started":
+        loop.is_alive = lambda: True
+    prepare_loop(loop)
+
+    w._commands_for_each_run_iteration()
+
+    assert w.get_stall_counts() == {"loop": 0}
+    assert w._stall_reporter.empty() is True
+
+
+def test_Watchdog___capture_stack_trace__returns_none_for_thread_without_a_frame_and_for_other_loops(
+    mocker,
+):
+    w = create_watchdog()
+    mocker.patch.object(
+        watchdog.sys, "_current_frames", autospec=True, return_value=dict()
+    )
+    assert w._capture_stack_trace(InfiniteThread(queue.Queue())) is None
+    assert w._capture_stack_trace(mocker.Mock()) is None
+
+
+def test_Watchdog___capture_stack_trace__returns_none_for_process_without_stack_dumps(
+    monkeypatch,
+):
+    monkeypatch.delattr(watchdog.signal, "SIGUSR1")
+    w = create_watchdog()
+    p = InfiniteProcess(multiprocessing.Queue())
+    w.add_loop("process", p)
+    assert p.get_stack_dump_file_path() is None
+    assert w._capture_stack_trace(p) is None
+
+
+def test_Watchdog___capture_stack_trace__gives_up_waiting_for_stack_dump_after_timeout(
+    mocker,
+):
+    mocked_kill = mocker.patch.object(watchdog.os, "kill", autospec=True)
+    w = create_watchdog(stack_dump_timeout_seconds=0.05)
+    p = InfiniteProcess(multiprocessing.Queue())
+    w.add_loop("process", p)
+    mocker.patch.object(
+        type(p), "pid", new_callable=mocker.PropertyMock, return_value=1234
+    )
+
+    assert w._capture_stack_trace(p) is None
+    mocked_kill.assert_called_once_with(1234, watchdog.signal.SIGUSR1)
+    w._teardown_after_loop()
+
+
+@pytest.mark.timeout(20)
+def test_Watchdog__reports_stalled_process_with_stack_dumped_by_faulthandler_and_deletes_dump_file_during_teardown():
+    w = create_watchdog()
+    p = InfiniteProcessThatHangsOnRequest(
+        multiprocessing.Queue(), minimum_iteration_duration_seconds=0.001
+    )
+    w.add_loop("hung process", p)
+    file_path = p.get_stack_dump_file_path()
+    assert os.path.isfile(file_path) is True
+    p.start()
+    try:
+        assert p._start_up_complete_event.wait(timeout=10) is True
+        p.hang()
+        wait_for_heartbeat_older_than(p, 0.2)
+
+        w._commands_for_each_run_iteration()
+
+        report = w._stall_reporter.get_nowait()
+        assert report["name"] == "hung process"
+        assert "wait_for_release_of_hung_loop" in report["stack_trace"]
+    finally:
+        p.terminate()
+        p.join(timeout=5)
+    w._teardown_after_loop()
+    assert os.path.isfile(file_path) is False
+
+
+@pytest.mark.timeout(10)
+def test_Watchdog__teardown__ignores_dump_files_that_cannot_be_deleted(mocker):
+    w = create_watchdog(logging_level=logging.DEBUG)
+    w.add_loop("process", InfiniteProcess(multiprocessing.Queue()))
+    mocker.patch.object(watchdog.os, "remove", autospec=True, side_effect=OSError)
+    w._teardown_after_loop()
+    assert w._stack_dump_file_paths == []
+
+
+@pytest.mark.timeout(10)
+def test_Watchdog__runs_as_thread_and_stops_cleanly():
+    error_queue = queue.Queue()
+    w = Watchdog(error_queue, queue.Queue(), minimum_iteration_duration_seconds=0.01)
+    w.add_loop("counter", InfiniteThreadThatCountsIterations(queue.Queue()))
+    w.start()
+    w.stop()
+    w.join()
+    assert error_queue.empty() is True